@@ -1,10 +1,16 @@
 from App.abstract_factory.servicos.SustainabilityFactory import (
     SustainabilityFactory, ActionLogger, TokenCalculator, RewardIssuer
 )
+from App.logs import obter_logger, registrar_evento
+
+logger = obter_logger("fabrica.energia")
 
 class EnergySavingLogger(ActionLogger):
     def logAction(self, userId: str, payload: dict) -> bool:
-        print(f"[ENERGIA] Ação registrada: {payload}")
+        registrar_evento(
+            logger, "fabrica.acao_registrada", "[ENERGIA] Ação registrada: %s", payload,
+            categoria="energia", usuario=userId, payload=payload,
+        )
         return True
 
 
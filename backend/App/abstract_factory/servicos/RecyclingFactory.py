@@ -1,10 +1,16 @@
 from App.abstract_factory.servicos.SustainabilityFactory import (
     SustainabilityFactory, ActionLogger, TokenCalculator, RewardIssuer
 )
+from App.logs import obter_logger, registrar_evento
+
+logger = obter_logger("fabrica.reciclagem")
 
 class RecyclingLogger(ActionLogger):
     def logAction(self, userId: str, payload: dict) -> bool:
-        print(f"[RECICLAGEM] Usuário {userId} registrou: {payload}")
+        registrar_evento(
+            logger, "fabrica.acao_registrada", "[RECICLAGEM] Usuário %s registrou: %s", userId, payload,
+            categoria="reciclagem", usuario=userId, payload=payload,
+        )
         return True
 
 
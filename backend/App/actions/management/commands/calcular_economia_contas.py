@@ -0,0 +1,57 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from App.actions.models import BillRecord
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula a economia de todas as contas de um mês em relação ao mês anterior, '
+        'em uma única consulta (LAG sobre usuário e tipo de conta).'
+    )
+
+    UNIDADES = {BillRecord.BILL_TYPE_WATER: 'm³', BillRecord.BILL_TYPE_ENERGY: 'kWh'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mês de referência AAAA-MM (padrão: mês atual).')
+        parser.add_argument('--detalhes', action='store_true',
+                            help='Lista a economia de cada conta com economia.')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                ano, mes = (int(parte) for parte in options['mes'].split('-'))
+            except ValueError:
+                raise CommandError('Mês inválido; use o formato AAAA-MM.')
+            if not 1 <= mes <= 12:
+                raise CommandError('Mês inválido; use o formato AAAA-MM.')
+        else:
+            hoje = timezone.localdate()
+            ano, mes = hoje.year, hoje.month
+
+        contas, com_economia = defaultdict(int), defaultdict(int)
+        totais = defaultdict(Decimal)
+        inicio = time.perf_counter()
+        for conta in BillRecord.objects.select_related('user').order_by(
+            'type', 'user_id'
+        ).do_mes_com_economia(ano, mes):
+            contas[conta.type] += 1
+            if conta.economia_mensal > 0:
+                com_economia[conta.type] += 1
+                totais[conta.type] += conta.economia_mensal
+                if options['detalhes']:
+                    self.stdout.write(f'  {conta}: {conta.economia_mensal:.2f} {self.UNIDADES[conta.type]}')
+        duracao = time.perf_counter() - inicio
+
+        for tipo in sorted(contas):
+            self.stdout.write(
+                f'{tipo}: {contas[tipo]} conta(s), {com_economia[tipo]} com economia, '
+                f'{totais[tipo]:.2f} {self.UNIDADES[tipo]} economizados'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(contas.values())} conta(s) de {mes:02d}/{ano} calculada(s) em {duracao:.2f}s.'
+        ))
@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from App.actions.servicos.importacao_contas import ImportacaoContasService
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa contas de água e energia de um arquivo CSV (campos: username, tipo, mes, ano, '
+        'consumo, valor), em lotes. Contas já registradas para o mesmo usuário, tipo e mês são '
+        'atualizadas. Com --checkpoint, a importação interrompida continua de onde parou.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Arquivo CSV com as contas.')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Linhas por transação (padrão: 1000).')
+        parser.add_argument('--checkpoint',
+                            help='Arquivo onde a posição é gravada após cada lote e lida ao recomeçar.')
+        parser.add_argument('--recomecar', action='store_true',
+                            help='Ignora o checkpoint existente e importa desde o início.')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        tamanho_lote = options['tamanho_lote']
+        if tamanho_lote < 1:
+            raise CommandError('--tamanho-lote deve ser maior que zero.')
+        checkpoint = options['checkpoint']
+        retomado = None if options['recomecar'] else self.ler_checkpoint(checkpoint, caminho)
+
+        servico = ImportacaoContasService()
+        resumo = {'linhas': 0, 'criadas': 0, 'atualizadas': 0, 'invalidas': 0, 'usuarios_nao_encontrados': 0}
+        inicio = time.perf_counter()
+        try:
+            with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+                cabecalho = next(csv.reader([arquivo.readline()]), None)
+                if not cabecalho or set(servico.CAMPOS) - set(cabecalho):
+                    raise CommandError(f'O cabeçalho deve ter os campos: {", ".join(servico.CAMPOS)}.')
+                ja_importadas = 0
+                if retomado:
+                    arquivo.seek(retomado['posicao'])
+                    ja_importadas = retomado['linhas']
+                    self.stdout.write(f'Retomando após {ja_importadas} linha(s) já importadas.')
+
+                # readline (e não a iteração do arquivo) mantém tell() disponível entre os lotes
+                linhas = csv.DictReader(iter(arquivo.readline, ''), fieldnames=cabecalho)
+                while True:
+                    lote = list(islice(linhas, tamanho_lote))
+                    if not lote:
+                        break
+                    resumo['linhas'] += len(lote)
+                    for chave, valor in servico.importar_lote(lote).items():
+                        resumo[chave] += valor
+                    if checkpoint:
+                        self.gravar_checkpoint(checkpoint, caminho, arquivo.tell(), ja_importadas + resumo['linhas'])
+                    if options['verbosity'] >= 2:
+                        duracao = time.perf_counter() - inicio
+                        self.stdout.write(f"  {resumo['linhas']} linhas ({resumo['linhas'] / duracao:.0f} linhas/s)")
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler "{caminho}": {e}')
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['linhas']} linhas em {duracao:.2f}s "
+            f"({resumo['linhas'] / duracao if duracao else 0:.0f} linhas/s): "
+            f"{resumo['criadas']} criadas, {resumo['atualizadas']} atualizadas, "
+            f"{resumo['usuarios_nao_encontrados']} com usuário não encontrado, {resumo['invalidas']} inválidas."
+        ))
+
+    def ler_checkpoint(self, checkpoint, caminho):
+        """Posição salva para este arquivo, ou None."""
+        if not checkpoint or not os.path.exists(checkpoint):
+            return None
+        try:
+            with open(checkpoint, encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+            posicao, linhas = int(dados['posicao']), int(dados['linhas'])
+        except (OSError, ValueError, KeyError, TypeError):
+            raise CommandError(f'Checkpoint "{checkpoint}" ilegível; use --recomecar.')
+        if dados.get('arquivo') != os.path.abspath(caminho):
+            raise CommandError(f'O checkpoint "{checkpoint}" é de outro arquivo; use --recomecar.')
+        return {'posicao': posicao, 'linhas': linhas}
+
+    def gravar_checkpoint(self, checkpoint, caminho, posicao, linhas):
+        """Grava a posição do próximo lote num arquivo temporário e o renomeia, para não ficar pela metade."""
+        temporario = f'{checkpoint}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({'arquivo': os.path.abspath(caminho), 'posicao': posicao, 'linhas': linhas}, arquivo)
+        os.replace(temporario, checkpoint)
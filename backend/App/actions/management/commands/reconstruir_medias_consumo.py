@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from App.actions.servicos.media_consumo import MediaConsumoService
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula do zero as médias de consumo por usuário e tipo de conta a partir de BillRecord. '
+        'Necessário na implantação e depois de alterações em massa (bulk_create/update) nas contas.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        historicos = MediaConsumoService().reconstruir()
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{historicos} histórico(s) de consumo recalculado(s) em {duracao:.2f}s."
+        ))
@@ -1,5 +1,11 @@
+import csv
+import json
+import time
+from itertools import islice
+
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from App.actions.servicos.AcaoProxy import AcaoProxy
 from App.actions.servicos.AcaoReal import AcaoReal
 from App.actions.servicos.AcessoNegadoException import AcessoNegadoException
@@ -8,16 +14,32 @@ from App.tokens.models import TokenLedger # Para integração real de recompensa
 User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Registra uma ação sustentável usando o padrão Proxy.'
+    help = (
+        'Registra uma ação sustentável usando o padrão Proxy. '
+        'Com --from-file, registra em lote as ações de um arquivo CSV ou JSONL '
+        '(campos: username, tipo, descricao, impacto, tokens).'
+    )
+
+    CAMPOS = ('username', 'tipo', 'descricao', 'impacto', 'tokens')
+    TENTATIVAS_POR_LOTE = 3
 
     def add_arguments(self, parser):
-        parser.add_argument('username', type=str, help='Nome de usuário que está registrando a ação.')
-        parser.add_argument('tipo', type=str, help='Tipo da ação (ex: Reciclagem).')
-        parser.add_argument('descricao', type=str, help='Descrição da ação.')
-        parser.add_argument('impacto', type=float, help='Impacto ambiental da ação (Float).')
-        parser.add_argument('tokens', type=int, help='Tokens de recompensa para esta ação.')
+        parser.add_argument('username', type=str, nargs='?', help='Nome de usuário que está registrando a ação.')
+        parser.add_argument('tipo', type=str, nargs='?', help='Tipo da ação (ex: Reciclagem).')
+        parser.add_argument('descricao', type=str, nargs='?', help='Descrição da ação.')
+        parser.add_argument('impacto', type=float, nargs='?', help='Impacto ambiental da ação (Float).')
+        parser.add_argument('tokens', type=int, nargs='?', help='Tokens de recompensa para esta ação.')
+        parser.add_argument('--from-file', dest='arquivo', help='Arquivo CSV ou JSONL com as ações a registrar.')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Formato do arquivo (padrão: pela extensão).')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Linhas por transação (padrão: 1000).')
 
     def handle(self, *args, **options):
+        if options['arquivo']:
+            return self.registrar_arquivo(options)
+
+        if any(options[campo] is None for campo in self.CAMPOS):
+            raise CommandError('Informe username, tipo, descricao, impacto e tokens, ou use --from-file.')
+
         username = options['username']
         tipo = options['tipo']
         descricao = options['descricao']
@@ -56,6 +78,86 @@ class Command(BaseCommand):
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'ERRO INESPERADO: {e}'))
+
+    # --- Modo em lote (--from-file) ---
+
+    def registrar_arquivo(self, options):
+        """Processa o arquivo em lotes, cada um em uma transação, e imprime o resumo."""
+        caminho = options['arquivo']
+        formato = options['formato'] or ('jsonl' if caminho.endswith(('.jsonl', '.json')) else 'csv')
+        tamanho_lote = options['tamanho_lote']
+        if tamanho_lote < 1:
+            raise CommandError('--tamanho-lote deve ser maior que zero.')
+
+        resumo = {'linhas': 0, 'registradas': 0, 'duplicadas': 0, 'negadas': 0,
+                  'usuarios_nao_encontrados': 0, 'invalidas': 0}
+        inicio = time.perf_counter()
+        try:
+            with open(caminho, newline='', encoding='utf-8') as arquivo:
+                linhas = self.ler_linhas(arquivo, formato)
+                while True:
+                    lote = list(islice(linhas, tamanho_lote))
+                    if not lote:
+                        break
+                    resumo['linhas'] += len(lote)
+                    for chave, valor in self.registrar_lote(lote).items():
+                        resumo[chave] += valor
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler "{caminho}": {e}')
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['linhas']} linhas em {duracao:.2f}s "
+            f"({resumo['linhas'] / duracao if duracao else 0:.0f} linhas/s): "
+            f"{resumo['registradas']} registradas, {resumo['duplicadas']} duplicadas, "
+            f"{resumo['negadas']} negadas, {resumo['usuarios_nao_encontrados']} com usuário "
+            f"não encontrado, {resumo['invalidas']} inválidas."
+        ))
+
+    def ler_linhas(self, arquivo, formato):
+        """Gera um dicionário por linha do arquivo, sem carregá-lo inteiro na memória."""
+        if formato == 'jsonl':
+            for linha in arquivo:
+                if linha.strip():
+                    try:
+                        yield json.loads(linha)
+                    except json.JSONDecodeError:
+                        yield {}
+        else:
+            yield from csv.DictReader(arquivo)
+
+    def registrar_lote(self, lote):
+        """Resolve os usuários do lote com uma consulta e registra as ações numa transação."""
+        resumo = {'usuarios_nao_encontrados': 0, 'invalidas': 0}
+        validas = []
+        for linha in lote:
+            try:
+                validas.append((
+                    str(linha['username']), str(linha['tipo']), str(linha.get('descricao') or ''),
+                    float(linha['impacto']), int(linha['tokens'])
+                ))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                resumo['invalidas'] += 1
+
+        usuarios = User.objects.in_bulk({username for username, *_ in validas}, field_name='username')
+        proxies = []
+        for username, tipo, descricao, impacto, tokens in validas:
+            usuario = usuarios.get(username)
+            if usuario is None:
+                resumo['usuarios_nao_encontrados'] += 1
+                continue
+            proxies.append(AcaoProxy(usuario, tipo, descricao, impacto, tokens))
+
+        # Registros concorrentes da mesma ação violam a chave única: o lote é
+        # desfeito e repetido, e as ações já gravadas passam a contar como duplicadas
+        for tentativa in range(self.TENTATIVAS_POR_LOTE):
+            try:
+                with transaction.atomic():
+                    resumo.update(AcaoProxy.registrar_em_lote(proxies))
+                return resumo
+            except IntegrityError:
+                if tentativa == self.TENTATIVAS_POR_LOTE - 1:
+                    raise
             
 # Ajuste final no AcaoProxy para usar a lógica de TokenLedger
 # O AcaoProxy.py já foi ajustado na iteração anterior para usar o TokenLedger.
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actions', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('Água', 'Água'), ('Energia', 'Energia')], max_length=20, verbose_name='Tipo de Conta')),
+                ('monthly_values', models.JSONField(default=dict, help_text="Consumo dos últimos meses registrados, por 'AAAA-MM'", verbose_name='Consumo por Mês')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Soma do Consumo')),
+                ('count', models.IntegerField(default=0, verbose_name='Meses Considerados')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bill_baselines', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Média de Consumo',
+                'verbose_name_plural': 'Médias de Consumo',
+                'db_table': 'bill_baselines',
+                'unique_together': {('user', 'type')},
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, Value, When, Window
+from django.db.models.functions import Greatest, Lag
 from django.conf import settings
 
+from App.actions.signals import acoes_aprovadas
+
 
 class ActionType(models.Model):
     """
@@ -168,14 +172,45 @@ class UserAction(models.Model):
         """Verifica se a ação está pendente de aprovação."""
         return self.status == self.STATUS_PENDENTE
 
-    def aprovar(self, aprovador):
-        """Aprova a ação e atribui os pontos."""
+    def aprovar(self, aprovador) -> bool:
+        """
+        Aprova a ação pendente e credita os pontos no TokenLedger, com os mesmos
+        pontos e lançamento da aprovação em lote. O UPDATE só afeta a ação se
+        ela ainda estiver pendente, então aprovações concorrentes creditam uma
+        vez. Retorna se a ação foi aprovada por esta chamada.
+        """
         from django.utils import timezone
+        from App.actions.servicos.aprovacao_lote import AprovacaoEmLoteService
+        from App.tokens.models import TokenLedger
+        from App.tokens.servicos.token_servico import TokenService
+
+        # Pontos e nome do tipo vêm da tabela de estratégias em memória (sem consulta por aprovação)
+        tipos = TokenService().tabela.tipos_por_id
+        if self.action_type_id in tipos:
+            nome, base_points = tipos[self.action_type_id], None
+        else:
+            nome, base_points = self.action_type.name, self.action_type.base_points
+        pontos = AprovacaoEmLoteService.pontos_do_tipo(self.action_type_id, base_points)
+        agora = timezone.now()
+        with transaction.atomic():
+            if not UserAction.objects.filter(pk=self.pk, status=self.STATUS_PENDENTE).update(
+                status=self.STATUS_APROVADA, approved_by=aprovador, approved_at=agora, points_awarded=pontos
+            ):
+                return False
+            TokenLedger.lancar_em_lote([(
+                self.user_id,
+                pontos,
+                TokenLedger.TYPE_CREDIT,
+                TokenLedger.SOURCE_ACTION,
+                self.pk,
+                AprovacaoEmLoteService.descricao_credito(nome),
+            )])
+            acoes_aprovadas.send(sender=UserAction, aprovacoes=[(self.pk, self.user_id, pontos)])
         self.status = self.STATUS_APROVADA
         self.approved_by = aprovador
-        self.approved_at = timezone.now()
-        self.points_awarded = self.action_type.base_points
-        self.save()
+        self.approved_at = agora
+        self.points_awarded = pontos
+        return True
 
     def rejeitar(self, aprovador):
         """Rejeita a ação."""
@@ -186,6 +221,55 @@ class UserAction(models.Model):
         self.save()
 
 
+class BillRecordQuerySet(models.QuerySet):
+    """Consultas de contas com a economia em relação ao mês anterior calculada no banco."""
+
+    def com_economia(self):
+        """
+        Anota em cada conta `consumo_anterior` (consumo da conta do mesmo
+        usuário e tipo no mês imediatamente anterior, ou None) e
+        `economia_mensal` (o mesmo valor de `calcular_economia`), com LAG sobre
+        (user, type) ordenado por (year, month), em uma única consulta.
+
+        Filtros aplicados antes da anotação também cortam as contas usadas
+        como mês anterior; para um mês específico use `do_mes_com_economia`.
+        """
+        janela = {'partition_by': [F('user_id'), F('type')], 'order_by': [F('year').asc(), F('month').asc()]}
+        ordinal = F('year') * 12 + F('month')
+        decimal = DecimalField(max_digits=10, decimal_places=2)
+        return self.annotate(
+            ordinal_anterior=Window(Lag(ordinal), **janela),
+            valor_anterior=Window(Lag('consumption_value'), **janela),
+        ).annotate(
+            consumo_anterior=Case(
+                When(ordinal_anterior=ordinal - 1, then=F('valor_anterior')),
+                default=None,
+                output_field=decimal,
+            ),
+        ).annotate(
+            economia_mensal=Case(
+                When(
+                    consumo_anterior__isnull=False,
+                    then=Greatest(F('consumo_anterior') - F('consumption_value'), Value(0, output_field=decimal)),
+                ),
+                default=Value(0, output_field=decimal),
+                output_field=decimal,
+            ),
+        )
+
+    def do_mes_com_economia(self, ano, mes):
+        """
+        Contas de `mes`/`ano` anotadas por `com_economia` (um iterador; filtros
+        e ordenação vêm antes). Busca esse mês e o anterior em uma consulta e
+        descarta as contas do anterior.
+        """
+        ordinal = ano * 12 + mes
+        contas = self.annotate(ordinal=F('year') * 12 + F('month')).filter(
+            ordinal__in=[ordinal - 1, ordinal]
+        ).com_economia()
+        return (conta for conta in contas if conta.ordinal == ordinal)
+
+
 class BillRecord(models.Model):
     """
     Registro de contas de água e energia para cálculo de economia.
@@ -256,6 +340,8 @@ class BillRecord(models.Model):
         verbose_name="Data de Registro"
     )
 
+    objects = BillRecordQuerySet.as_manager()
+
     class Meta:
         db_table = 'bill_records'
         verbose_name = 'Registro de Conta'
@@ -271,7 +357,13 @@ class BillRecord(models.Model):
         return f"{self.month:02d}/{self.year}"
 
     def calcular_economia(self):
-        """Calcula a economia em relação ao mês anterior."""
+        """
+        Calcula a economia em relação ao mês anterior. Contas vindas de
+        `BillRecord.objects.com_economia()` já trazem o valor, sem consulta.
+        """
+        if hasattr(self, 'economia_mensal'):
+            return self.economia_mensal
+
         # Busca a conta do mês anterior
         mes_anterior = self.month - 1 if self.month > 1 else 12
         ano_anterior = self.year if self.month > 1 else self.year - 1
@@ -289,6 +381,64 @@ class BillRecord(models.Model):
             return 0
 
 
+class BillBaseline(models.Model):
+    """
+    Histórico recente de consumo de um usuário por tipo de conta: os valores
+    dos últimos meses registrados, com soma e quantidade já calculadas, para
+    que a média saia sem agregar BillRecord. Mantido pelo MediaConsumoService
+    a cada conta gravada ou removida.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='bill_baselines',
+        verbose_name="Usuário"
+    )
+
+    type = models.CharField(
+        max_length=20,
+        choices=BillRecord.BILL_TYPE_CHOICES,
+        verbose_name="Tipo de Conta"
+    )
+
+    monthly_values = models.JSONField(
+        default=dict,
+        verbose_name="Consumo por Mês",
+        help_text="Consumo dos últimos meses registrados, por 'AAAA-MM'"
+    )
+
+    total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Soma do Consumo"
+    )
+
+    count = models.IntegerField(
+        default=0,
+        verbose_name="Meses Considerados"
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Atualizado em"
+    )
+
+    class Meta:
+        db_table = 'bill_baselines'
+        verbose_name = 'Média de Consumo'
+        verbose_name_plural = 'Médias de Consumo'
+        unique_together = ['user', 'type']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.type}: média {self.media()} ({self.count} meses)"
+
+    def media(self):
+        """Média de consumo dos meses considerados, ou None sem histórico."""
+        return self.total / self.count if self.count else None
+
+
 # Mantém a classe AcaoSustentavel original para compatibilidade com testes
 class AcaoSustentavel:
     """Classe legada para compatibilidade com testes."""
@@ -1,8 +1,14 @@
 from .Iacao import IAcao
 from .AcaoReal import AcaoReal
 from .AcessoNegadoException import AcessoNegadoException
+from .cache_acoes import CacheAcoes, CacheAcoesLRU
+from App.logs import obter_logger, registrar_evento
 # from django.contrib.auth.models import User # Assumindo Django User model para autenticação
-from datetime import datetime
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+import logging
+
+logger = obter_logger("acoes.proxy")
 
 class AcaoProxy(IAcao):
     """
@@ -11,12 +17,12 @@ class AcaoProxy(IAcao):
     Funcionalidades:
     - Controle de Acesso: Apenas usuários autenticados podem registrar ações.
     - Lazy Loading: A AcaoReal é instanciada apenas no momento do registro.
-    - Cache: Armazena ações registradas para evitar registros duplicados (simulação).
+    - Cache: Armazena ações registradas para evitar registros duplicados sem ir ao banco.
     - Recompensa: Adiciona tokens ao usuário após o registro bem-sucedido.
     """
     
-    # Cache estático para simular o armazenamento de ações já registradas (Map)
-    _acoes_cache = {}
+    # Cache estático das ações já registradas (LRU com TTL, trocável por configurar_cache)
+    _acoes_cache: CacheAcoes = CacheAcoesLRU()
     
     def __init__(self, usuario, tipo: str, descricao: str, impactoAmbiental: float, tokens_recompensa: int):
         self.usuario = usuario
@@ -32,47 +38,144 @@ class AcaoProxy(IAcao):
         if not getattr(self.usuario, 'is_authenticated', True):
             raise AcessoNegadoException(f"[Proxy] Acesso negado. Usuário '{getattr(self.usuario, 'username', 'Desconhecido')}' não está autenticado.")
 
-        # 2. Verificação de Cache Persistente (Usando TokenLedger como registro de histórico)
-        from App.tokens.models import TokenLedger
-        
+        # 2. Verificação de Cache em memória
         # Cria uma chave única para a ação
-        cache_key = f"{getattr(self.usuario, 'username', 'Desconhecido')}_{self.tipo}_{self.descricao}"
-        
-        # Verifica se já existe um crédito de tokens para esta ação
-        acao_existente = TokenLedger.objects.filter(
-            user=self.usuario,
-            source=TokenLedger.SOURCE_ACTION,
-            description=f"Recompensa por ação sustentável: {self.tipo}"
-        ).exists()
+        cache_key = self.gerar_chave_idempotencia()
+
+        if self._acoes_cache.contem(cache_key):
+            return self._resultado_acao_existente("Cache")
+
+        # 3. Verificação de Cache Persistente (Usando TokenLedger como registro de histórico)
+        from App.tokens.models import TokenLedger
+
+        # Verifica se já existe um crédito de tokens para esta ação (consulta pelo índice único)
+        acao_existente = TokenLedger.objects.filter(idempotency_key=cache_key).exists()
 
         if acao_existente:
-            resultado = f"[AcaoReal] Ação '{self.tipo}' registrada com sucesso. Impacto: {self.impactoAmbiental}."
-            print(f"[Proxy] Ação '{self.tipo}' já registrada anteriormente por '{getattr(self.usuario, 'username', 'Desconhecido')}'. Usando Cache Persistente (TokenLedger).")
-            # O Proxy retorna o resultado sem chamar AcaoReal e sem dar nova recompensa
-            return resultado
+            self._acoes_cache.registrar(cache_key)
+            return self._resultado_acao_existente()
 
-        # 3. Lazy Loading: Instancia AcaoReal apenas agora
+        # 4. Lazy Loading: Instancia AcaoReal apenas agora
         if self.acao_real is None:
-            print("[Proxy] Lazy Loading: Instanciando AcaoReal.")
+            registrar_evento(logger, "proxy.lazy_loading", "[Proxy] Lazy Loading: Instanciando AcaoReal.",
+                             nivel=logging.DEBUG, tipo=self.tipo)
             self.acao_real = AcaoReal(self.tipo, self.descricao, self.impactoAmbiental)
 
-        # 4. Execução da Ação Real
+        # 5. Execução da Ação Real
         resultado = self.acao_real.registrarAcao()
 
-        # 5. Recompensa (Integração com o modelo TokenLedger)
-        # Cria o registro no TokenLedger, que agora também serve como "cache"
-        TokenLedger.objects.create(
-            user=self.usuario,
-            amount=self.tokens_recompensa,
-            type=TokenLedger.TYPE_CREDIT,
-            source=TokenLedger.SOURCE_ACTION,
-            description=f"Recompensa por ação sustentável: {self.tipo}"
+        # 6. Recompensa (Integração com o modelo TokenLedger)
+        # Cria o registro no TokenLedger, que agora também serve como "cache".
+        # A restrição única da chave barra registros concorrentes da mesma ação.
+        try:
+            TokenLedger.objects.create(
+                user=self.usuario,
+                amount=self.tokens_recompensa,
+                type=TokenLedger.TYPE_CREDIT,
+                source=TokenLedger.SOURCE_ACTION,
+                description=f"Recompensa por ação sustentável: {self.tipo}",
+                idempotency_key=cache_key
+            )
+        except IntegrityError:
+            if not TokenLedger.objects.filter(idempotency_key=cache_key).exists():
+                raise
+            self._acoes_cache.registrar(cache_key)
+            return self._resultado_acao_existente()
+        # Só entra no cache depois do commit, para não guardar ações desfeitas
+        transaction.on_commit(lambda: self._acoes_cache.registrar(cache_key))
+        username = getattr(self.usuario, 'username', 'Desconhecido')
+        registrar_evento(
+            logger, "acao.recompensada",
+            "[Proxy] Recompensa: %s tokens creditados ao usuário '%s' via TokenLedger.", self.tokens_recompensa, username,
+            usuario=username, tipo=self.tipo, tokens=self.tokens_recompensa,
+        )
+
+        # 7. Logging
+        registrar_evento(
+            logger, "acao.registrada",
+            "[LOG] Usuário '%s' registrou '%s'", username, self.tipo,
+            usuario=username, tipo=self.tipo,
         )
-        print(f"[Proxy] Recompensa: {self.tokens_recompensa} tokens creditados ao usuário '{getattr(self.usuario, 'username', 'Desconhecido')}' via TokenLedger.")
-            
-        # 6. Logging
-        from datetime import datetime
-        print(f"[LOG] Usuário '{getattr(self.usuario, 'username', 'Desconhecido')}' registrou '{self.tipo}' em {datetime.now()}")
 
         return resultado
 
+    @classmethod
+    def registrar_em_lote(cls, acoes, tamanho_bloco: int = 500) -> dict:
+        """
+        Registra várias ações (instâncias de AcaoProxy) com a mesma semântica de
+        `registrarAcao`: controle de acesso, descarte de duplicadas pelo cache e
+        pela chave de idempotência, e recompensa no TokenLedger, com uma consulta
+        por bloco de chaves e um lançamento em lote. Deve ser chamado dentro de
+        uma transação; retorna a contagem de registradas, duplicadas e negadas.
+        """
+        from App.tokens.models import TokenLedger
+
+        resumo = {"registradas": 0, "duplicadas": 0, "negadas": 0}
+        novas = {}
+        for acao in acoes:
+            if not getattr(acao.usuario, 'is_authenticated', True):
+                resumo["negadas"] += 1
+                continue
+            chave = acao.gerar_chave_idempotencia()
+            if chave in novas or cls._acoes_cache.contem(chave):
+                resumo["duplicadas"] += 1
+                continue
+            novas[chave] = acao
+
+        chaves = list(novas)
+        for inicio in range(0, len(chaves), tamanho_bloco):
+            existentes = TokenLedger.objects.filter(
+                idempotency_key__in=chaves[inicio:inicio + tamanho_bloco]
+            ).values_list('idempotency_key', flat=True)
+            for chave in existentes:
+                del novas[chave]
+                cls._acoes_cache.registrar(chave)
+                resumo["duplicadas"] += 1
+
+        TokenLedger.lancar_em_lote(
+            (
+                acao.usuario,
+                acao.tokens_recompensa,
+                TokenLedger.TYPE_CREDIT,
+                TokenLedger.SOURCE_ACTION,
+                None,
+                f"Recompensa por ação sustentável: {acao.tipo}",
+                chave,
+            )
+            for chave, acao in novas.items()
+        )
+        chaves_novas = list(novas)
+
+        def registrar_no_cache():
+            for chave in chaves_novas:
+                cls._acoes_cache.registrar(chave)
+
+        transaction.on_commit(registrar_no_cache)
+        resumo["registradas"] = len(novas)
+        return resumo
+
+    @classmethod
+    def configurar_cache(cls, cache: CacheAcoes) -> None:
+        """Troca o cache de ações (ex.: CacheAcoesDjango para compartilhar entre processos)."""
+        cls._acoes_cache = cache
+
+    def gerar_chave_idempotencia(self) -> str:
+        """Chave da ação: mesmo usuário, tipo e descrição no mesmo dia contam uma vez."""
+        from App.tokens.models import TokenLedger
+
+        return TokenLedger.gerar_chave_idempotencia(
+            getattr(self.usuario, 'pk', None),
+            self.tipo,
+            self.descricao,
+            timezone.localdate().isoformat()
+        )
+
+    def _resultado_acao_existente(self, origem: str = "Cache Persistente (TokenLedger)") -> str:
+        """Resultado devolvido sem chamar AcaoReal e sem dar nova recompensa."""
+        username = getattr(self.usuario, 'username', 'Desconhecido')
+        registrar_evento(
+            logger, "acao.duplicada",
+            "[Proxy] Ação '%s' já registrada anteriormente por '%s'. Usando %s.", self.tipo, username, origem,
+            usuario=username, tipo=self.tipo, origem=origem,
+        )
+        return f"[AcaoReal] Ação '{self.tipo}' registrada com sucesso. Impacto: {self.impactoAmbiental}."
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Case, IntegerField, QuerySet, Value, When
+from django.utils import timezone
+
+from App.actions.models import ActionType, UserAction
+from App.actions.signals import acoes_aprovadas
+from App.tokens.models import TokenLedger
+
+
+class AprovacaoEmLoteService:
+    """
+    Aprova ações pendentes em lote: um UPDATE por bloco de ações, pontos da
+    tabela de estratégias em memória (`pontos_do_tipo`, a mesma regra da
+    aprovação individual) e créditos lançados no TokenLedger em lote, tudo na
+    mesma transação.
+    """
+
+    TAMANHO_BLOCO = 500
+
+    def aprovar(self, acoes, aprovador) -> int:
+        """
+        Aprova as ações pendentes de `acoes` (queryset de UserAction ou lista de ids).
+        Ações que não estão pendentes são ignoradas. Retorna quantas foram aprovadas.
+        """
+        if isinstance(acoes, QuerySet):
+            consultas = [acoes]
+        else:
+            ids = list(acoes)
+            consultas = [
+                UserAction.objects.filter(pk__in=ids[inicio:inicio + self.TAMANHO_BLOCO])
+                for inicio in range(0, len(ids), self.TAMANHO_BLOCO)
+            ]
+
+        agora = timezone.now()
+        aprovadas = 0
+        with transaction.atomic():
+            for consulta in consultas:
+                pendentes = list(
+                    consulta.filter(status=UserAction.STATUS_PENDENTE)
+                    .select_for_update(of=('self',))
+                    .order_by('pk')
+                    .values_list('pk', 'user_id', 'action_type_id', 'action_type__name', 'action_type__base_points')
+                )
+                pendentes = [
+                    (pk, user_id, tipo_id, nome, self.pontos_do_tipo(tipo_id, base_points))
+                    for pk, user_id, tipo_id, nome, base_points in pendentes
+                ]
+                for inicio in range(0, len(pendentes), self.TAMANHO_BLOCO):
+                    aprovadas += self._aprovar_bloco(
+                        pendentes[inicio:inicio + self.TAMANHO_BLOCO], aprovador, agora
+                    )
+        return aprovadas
+
+    @staticmethod
+    def pontos_do_tipo(action_type_id, base_points) -> int:
+        """
+        Pontos da aprovação de uma ação do tipo: os da tabela de estratégias em
+        memória (inclusive substituições de `trocar_estrategia`), ou
+        `base_points` para tipos fora dela.
+        """
+        from App.tokens.servicos.token_servico import TokenService
+
+        pontos = TokenService().obter_pontos_por_tipo_id(action_type_id)
+        return base_points if pontos is None else pontos
+
+    def _aprovar_bloco(self, pendentes, aprovador, agora) -> int:
+        """Atualiza um bloco de ações já travadas e lança os créditos correspondentes."""
+        pontos_por_tipo = {tipo_id: pontos for _, _, tipo_id, _, pontos in pendentes}
+        UserAction.objects.filter(pk__in=[pk for pk, *_ in pendentes]).update(
+            status=UserAction.STATUS_APROVADA,
+            approved_by=aprovador,
+            approved_at=agora,
+            points_awarded=Case(
+                *[When(action_type_id=tipo_id, then=Value(pontos)) for tipo_id, pontos in sorted(pontos_por_tipo.items())],
+                output_field=IntegerField(),
+            ),
+        )
+        TokenLedger.lancar_em_lote(
+            (
+                user_id,
+                pontos,
+                TokenLedger.TYPE_CREDIT,
+                TokenLedger.SOURCE_ACTION,
+                pk,
+                self.descricao_credito(nome),
+            )
+            for pk, user_id, _, nome, pontos in pendentes
+        )
+        acoes_aprovadas.send(
+            sender=UserAction,
+            aprovacoes=[(pk, user_id, pontos) for pk, user_id, _, _, pontos in pendentes],
+        )
+        return len(pendentes)
+
+    @staticmethod
+    def descricao_credito(nome_tipo) -> str:
+        return f"Recompensa por ação sustentável: {nome_tipo}"
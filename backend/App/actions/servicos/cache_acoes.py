@@ -0,0 +1,144 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class CacheAcoes(ABC):
+    """
+    Interface do cache de ações já registradas usado pelo AcaoProxy.
+    Guarda apenas as chaves de idempotência das ações recompensadas.
+    """
+
+    def __init__(self):
+        self._lock_estatisticas = threading.Lock()
+        self._acertos = 0
+        self._falhas = 0
+
+    def contem(self, chave: str) -> bool:
+        """Verifica se a ação está no cache, contabilizando acerto ou falha."""
+        encontrado = self._contem(chave)
+        with self._lock_estatisticas:
+            if encontrado:
+                self._acertos += 1
+            else:
+                self._falhas += 1
+        return encontrado
+
+    def __contains__(self, chave):
+        return self._contem(chave)
+
+    @abstractmethod
+    def _contem(self, chave: str) -> bool:
+        """Consulta o armazenamento sem alterar as estatísticas."""
+        pass
+
+    @abstractmethod
+    def registrar(self, chave: str) -> None:
+        """Marca a ação como registrada."""
+        pass
+
+    @abstractmethod
+    def limpar(self) -> None:
+        """Remove todas as entradas e zera as estatísticas."""
+        pass
+
+    def estatisticas(self) -> dict:
+        """Retorna os contadores do cache."""
+        with self._lock_estatisticas:
+            return {"acertos": self._acertos, "falhas": self._falhas}
+
+    def _zerar_estatisticas(self):
+        with self._lock_estatisticas:
+            self._acertos = 0
+            self._falhas = 0
+
+
+class CacheAcoesLRU(CacheAcoes):
+    """
+    Cache em memória do processo, limitado por tamanho (LRU) e com expiração (TTL).
+    """
+
+    def __init__(self, max_itens: int = 10000, ttl_segundos: float = 3600, relogio=time.monotonic):
+        super().__init__()
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._relogio = relogio
+        self._itens = OrderedDict()  # chave -> instante de expiração
+        self._lock = threading.Lock()
+        self._remocoes = 0
+        self._expiracoes = 0
+
+    def _contem(self, chave: str) -> bool:
+        with self._lock:
+            expira_em = self._itens.get(chave)
+            if expira_em is None:
+                return False
+            if expira_em <= self._relogio():
+                del self._itens[chave]
+                self._expiracoes += 1
+                return False
+            self._itens.move_to_end(chave)
+            return True
+
+    def registrar(self, chave: str) -> None:
+        with self._lock:
+            self._itens[chave] = self._relogio() + self.ttl_segundos
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._remocoes += 1
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self._remocoes = 0
+            self._expiracoes = 0
+        self._zerar_estatisticas()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def estatisticas(self) -> dict:
+        estatisticas = super().estatisticas()
+        with self._lock:
+            estatisticas.update(
+                remocoes=self._remocoes,
+                expiracoes=self._expiracoes,
+                tamanho=len(self._itens),
+            )
+        return estatisticas
+
+
+class CacheAcoesDjango(CacheAcoes):
+    """
+    Cache sobre o framework de cache do Django (compartilhável entre processos).
+    Tamanho máximo e remoções ficam a cargo do backend configurado em CACHES;
+    `limpar` apenas troca a versão das chaves usada por este processo.
+    """
+
+    PREFIXO = "acao_registrada"
+
+    def __init__(self, alias: str = "default", ttl_segundos: float = 3600):
+        super().__init__()
+        self.alias = alias
+        self.ttl_segundos = ttl_segundos
+        self._versao = 1
+
+    @property
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def _chave(self, chave: str) -> str:
+        return f"{self.PREFIXO}:{chave}"
+
+    def _contem(self, chave: str) -> bool:
+        return self._cache.get(self._chave(chave), version=self._versao) is not None
+
+    def registrar(self, chave: str) -> None:
+        self._cache.set(self._chave(chave), True, timeout=self.ttl_segundos, version=self._versao)
+
+    def limpar(self) -> None:
+        self._versao += 1
+        self._zerar_estatisticas()
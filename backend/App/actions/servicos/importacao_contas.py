@@ -0,0 +1,110 @@
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+
+from App.actions.models import BillRecord
+from App.actions.signals import contas_importadas
+
+
+class ImportacaoContasService:
+    """
+    Importa contas de água e energia em lote (linhas com username, tipo, mes,
+    ano, consumo e valor). Cada lote é validado de uma vez, tem os usuários
+    resolvidos com uma consulta e é gravado com um INSERT ... ON CONFLICT
+    sobre (user, type, month, year): reimportar a mesma conta a corrige em
+    vez de violar a chave única.
+    """
+
+    CAMPOS = ('username', 'tipo', 'mes', 'ano', 'consumo', 'valor')
+    TIPOS = {
+        'agua': BillRecord.BILL_TYPE_WATER,
+        'energia': BillRecord.BILL_TYPE_ENERGY,
+    }
+    CENTAVOS = Decimal('0.01')
+    VALOR_MAXIMO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+    @staticmethod
+    def normalizar_tipo(tipo) -> str:
+        sem_acento = unicodedata.normalize('NFKD', str(tipo).strip().lower())
+        return ''.join(letra for letra in sem_acento if not unicodedata.combining(letra))
+
+    def _decimal(self, valor) -> Decimal:
+        numero = Decimal(str(valor).strip().replace(',', '.')).quantize(self.CENTAVOS)
+        if not Decimal(0) <= numero <= self.VALOR_MAXIMO:
+            raise ValueError(valor)
+        return numero
+
+    def validar(self, linhas):
+        """
+        Converte as linhas do lote. Retorna ({(username, tipo, mes, ano):
+        (consumo, valor)}, inválidas); a mesma conta repetida no lote fica com
+        a última linha.
+        """
+        validas, invalidas = {}, 0
+        for linha in linhas:
+            try:
+                tipo = self.TIPOS[self.normalizar_tipo(linha['tipo'])]
+                mes, ano = int(linha['mes']), int(linha['ano'])
+                if not 1 <= mes <= 12 or not 1 <= ano <= 9999:
+                    raise ValueError(linha)
+                username = str(linha['username']).strip()
+                if not username:
+                    raise ValueError(linha)
+                validas[(username, tipo, mes, ano)] = (self._decimal(linha['consumo']), self._decimal(linha['valor']))
+            except (KeyError, TypeError, ValueError, AttributeError, InvalidOperation):
+                invalidas += 1
+        return validas, invalidas
+
+    def importar_lote(self, linhas) -> dict:
+        """Valida e grava um lote numa transação. Retorna o resumo do lote."""
+        validas, invalidas = self.validar(linhas)
+        resumo = {'criadas': 0, 'atualizadas': 0, 'invalidas': invalidas, 'usuarios_nao_encontrados': 0}
+
+        usuarios = dict(get_user_model().objects.filter(
+            username__in={username for username, *_ in validas}
+        ).values_list('username', 'pk'))
+        contas = {}
+        for (username, tipo, mes, ano), (consumo, valor) in validas.items():
+            user_id = usuarios.get(username)
+            if user_id is None:
+                resumo['usuarios_nao_encontrados'] += 1
+                continue
+            contas[(user_id, tipo, mes, ano)] = BillRecord(
+                user_id=user_id, type=tipo, month=mes, year=ano, consumption_value=consumo, value_rs=valor
+            )
+        if not contas:
+            return resumo
+
+        user_ids = {user_id for user_id, *_ in contas}
+        ordinais = {ano * 12 + mes for _, _, mes, ano in contas}
+        with transaction.atomic():
+            existentes = set(
+                BillRecord.objects.annotate(ordinal=F('year') * 12 + F('month')).filter(
+                    user_id__in=user_ids, ordinal__in=ordinais
+                ).values_list('user_id', 'type', 'month', 'year')
+            ) & contas.keys()
+            BillRecord.objects.bulk_create(
+                [contas[chave] for chave in sorted(contas)],  # ordem fixa de travamento
+                update_conflicts=True,
+                unique_fields=['user', 'type', 'month', 'year'],
+                update_fields=['consumption_value', 'value_rs'],
+            )
+            novas = contas.keys() - existentes
+            criadas = []
+            if novas:
+                # As criadas voltam anotadas com a economia (o mês anterior entra na janela)
+                criadas = [
+                    conta for conta in BillRecord.objects.annotate(ordinal=F('year') * 12 + F('month')).filter(
+                        user_id__in={user_id for user_id, *_ in novas},
+                        ordinal__in=ordinais | {ordinal - 1 for ordinal in ordinais},
+                    ).com_economia()
+                    if (conta.user_id, conta.type, conta.month, conta.year) in novas
+                ]
+            contas_importadas.send(sender=BillRecord, contas=list(contas.values()), criadas=criadas)
+
+        resumo['criadas'] = len(novas)
+        resumo['atualizadas'] = len(existentes)
+        return resumo
@@ -0,0 +1,195 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from App.actions.models import BillBaseline, BillRecord
+
+
+class MediaConsumoService:
+    """
+    Mantém a média de consumo de cada usuário por tipo de conta sobre os
+    últimos MESES meses registrados. Cada conta gravada, alterada ou removida
+    ajusta só a linha de BillBaseline do usuário (soma, quantidade e valores
+    por mês), então ler a média é uma consulta por chave única. Remoções que
+    esvaziam um lugar da janela cheia e contas que mudam de mês refazem o
+    histórico daquele usuário e tipo (até MESES contas).
+    """
+
+    MESES = 12
+    CENTAVOS = Decimal('0.01')
+
+    # Limite de parâmetros SQL por consulta de médias em lote
+    IDS_POR_CONSULTA = 900
+    # Limite de linhas por INSERT em lote (6 parâmetros SQL por linha)
+    LINHAS_POR_INSERT = 150
+
+    @staticmethod
+    def chave_mes(conta) -> str:
+        return f"{conta.year:04d}-{conta.month:02d}"
+
+    def registrar(self, conta) -> None:
+        """Inclui ou substitui o mês da conta no histórico do usuário."""
+        self._alterar(conta, conta.consumption_value)
+
+    def remover(self, conta) -> None:
+        """
+        Retira o mês da conta do histórico do usuário. A janela cheia que perde
+        um mês é refeita a partir de BillRecord, para trazer o mês mais antigo
+        que estava fora dela.
+        """
+        with transaction.atomic():
+            historico = BillBaseline.objects.select_for_update().filter(
+                user_id=conta.user_id, type=conta.type
+            ).first()
+            if historico is None or self.chave_mes(conta) not in historico.monthly_values:
+                return
+            if historico.count >= self.MESES:
+                self.recalcular(conta.user_id, conta.type)
+            elif self._aplicar(historico, {self.chave_mes(conta): None}):
+                historico.save(update_fields=['monthly_values', 'total', 'count', 'updated_at'])
+
+    def recalcular(self, user_id, tipo) -> None:
+        """Refaz o histórico de um usuário e tipo a partir dos últimos MESES meses de BillRecord."""
+        with transaction.atomic():
+            BillBaseline.objects.get_or_create(user_id=user_id, type=tipo)
+            historico = BillBaseline.objects.select_for_update().get(user_id=user_id, type=tipo)
+            meses = {
+                f"{ano:04d}-{mes:02d}": str(valor.quantize(self.CENTAVOS))
+                for ano, mes, valor in BillRecord.objects.filter(user_id=user_id, type=tipo).order_by(
+                    '-year', '-month'
+                ).values_list('year', 'month', 'consumption_value')[:self.MESES]
+            }
+            historico.monthly_values = meses
+            historico.total = sum((Decimal(valor) for valor in meses.values()), Decimal(0))
+            historico.count = len(meses)
+            historico.save(update_fields=['monthly_values', 'total', 'count', 'updated_at'])
+
+    def _alterar(self, conta, valor) -> None:
+        with transaction.atomic():
+            BillBaseline.objects.get_or_create(user_id=conta.user_id, type=conta.type)
+            historico = BillBaseline.objects.select_for_update().get(user_id=conta.user_id, type=conta.type)
+            if self._aplicar(historico, {self.chave_mes(conta): valor}):
+                historico.save(update_fields=['monthly_values', 'total', 'count', 'updated_at'])
+
+    def registrar_lote(self, contas) -> None:
+        """
+        Versão em lote de `registrar` (importações com bulk_create não disparam
+        post_save): lê os históricos envolvidos com uma consulta e grava os
+        alterados com INSERT ... ON CONFLICT DO UPDATE.
+        """
+        novos = {}
+        for conta in contas:
+            novos.setdefault((conta.user_id, conta.type), {})[self.chave_mes(conta)] = conta.consumption_value
+        if not novos:
+            return
+        with transaction.atomic():
+            existentes = {
+                (historico.user_id, historico.type): historico
+                for historico in BillBaseline.objects.select_for_update().filter(
+                    user_id__in={user_id for user_id, _ in novos}, type__in={tipo for _, tipo in novos}
+                ).order_by('pk')
+            }
+            alterados = []
+            for (user_id, tipo), meses in sorted(novos.items()):
+                historico = existentes.get((user_id, tipo)) or BillBaseline(user_id=user_id, type=tipo)
+                if self._aplicar(historico, meses):
+                    alterados.append(historico)
+            agora = timezone.now()
+            for inicio in range(0, len(alterados), self.LINHAS_POR_INSERT):
+                self._gravar(alterados[inicio:inicio + self.LINHAS_POR_INSERT], agora)
+
+    @staticmethod
+    def _gravar(historicos, agora) -> None:
+        """Cria ou substitui os históricos com um único INSERT ... ON CONFLICT DO UPDATE."""
+        ops = connection.ops
+        campos = [
+            BillBaseline._meta.get_field(nome)
+            for nome in ('user', 'type', 'monthly_values', 'total', 'count', 'updated_at')
+        ]
+        colunas = [ops.quote_name(campo.column) for campo in campos]
+        sql = f"""
+            INSERT INTO {ops.quote_name(BillBaseline._meta.db_table)} ({', '.join(colunas)})
+            VALUES {', '.join(['(' + ', '.join(['%s'] * len(campos)) + ')'] * len(historicos))}
+            ON CONFLICT ({colunas[0]}, {colunas[1]})
+            DO UPDATE SET {', '.join(f'{coluna} = excluded.{coluna}' for coluna in colunas[2:])}
+        """
+        parametros = []
+        for historico in historicos:
+            historico.updated_at = agora
+            parametros += [
+                campo.get_db_prep_save(getattr(historico, campo.attname), connection) for campo in campos
+            ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+
+    def _aplicar(self, historico, valores) -> bool:
+        """
+        Aplica {mês: valor} ao histórico (valor None remove o mês), mantendo só
+        os MESES mais recentes. Retorna se algo mudou.
+        """
+        meses = dict(historico.monthly_values)
+        alterado = False
+        for chave, valor in sorted(valores.items()):
+            if valor is None:
+                alterado |= meses.pop(chave, None) is not None
+                continue
+            if chave not in meses and len(meses) >= self.MESES and chave < min(meses):
+                continue  # mais antigo que a janela
+            valor = str(Decimal(str(valor)).quantize(self.CENTAVOS))
+            if meses.get(chave) == valor:
+                continue
+            meses[chave] = valor
+            for antigo in sorted(meses)[:-self.MESES]:
+                del meses[antigo]
+            alterado = True
+        if alterado:
+            historico.monthly_values = meses
+            historico.total = sum((Decimal(valor) for valor in meses.values()), Decimal(0))
+            historico.count = len(meses)
+        return alterado
+
+    def obter_media(self, tipo, user_id=None, email=None):
+        """
+        Média de consumo do usuário (por id ou, mais lento, por e-mail) no tipo
+        de conta, ou None sem histórico.
+        """
+        historicos = BillBaseline.objects.filter(type=tipo)
+        if user_id is not None:
+            historicos = historicos.filter(user_id=user_id)
+        else:
+            historicos = historicos.filter(user__email=email)
+        historico = historicos.only('total', 'count').first()
+        return historico.media() if historico else None
+
+    def obter_medias(self, tipo, user_ids) -> dict:
+        """{user_id: média} dos usuários com histórico no tipo de conta, uma consulta a cada IDS_POR_CONSULTA."""
+        user_ids = list(user_ids)
+        medias = {}
+        for inicio in range(0, len(user_ids), self.IDS_POR_CONSULTA):
+            for historico in BillBaseline.objects.filter(
+                type=tipo, user_id__in=user_ids[inicio:inicio + self.IDS_POR_CONSULTA]
+            ).only('user_id', 'total', 'count'):
+                medias[historico.user_id] = historico.media()
+        return medias
+
+    def reconstruir(self) -> int:
+        """Refaz os históricos a partir de BillRecord. Retorna quantos foram gerados."""
+        historicos = {}
+        contas = BillRecord.objects.order_by('user_id', 'type', '-year', '-month').values_list(
+            'user_id', 'type', 'year', 'month', 'consumption_value'
+        )
+        for user_id, tipo, ano, mes, valor in contas.iterator(chunk_size=5000):
+            meses = historicos.setdefault((user_id, tipo), {})
+            if len(meses) < self.MESES:
+                meses[f"{ano:04d}-{mes:02d}"] = str(valor.quantize(self.CENTAVOS))
+
+        with transaction.atomic():
+            BillBaseline.objects.all().delete()
+            BillBaseline.objects.bulk_create(
+                [BillBaseline(user_id=user_id, type=tipo, monthly_values=meses, count=len(meses),
+                              total=sum((Decimal(valor) for valor in meses.values()), Decimal(0)))
+                 for (user_id, tipo), meses in historicos.items()],
+                batch_size=1000,
+            )
+        return len(historicos)
@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+# Enviado quando ações de usuários são aprovadas, individualmente ou em lote.
+# Argumento: aprovacoes, lista de (user_action_id, user_id, pontos).
+acoes_aprovadas = Signal()
+
+# Enviado na transação de uma importação de contas em lote, que não dispara post_save.
+# Argumentos: contas, todas as BillRecord gravadas; criadas, só as novas (com
+# economia_mensal anotada).
+contas_importadas = Signal()
+
+
+CAMPOS_MES_CONTA = {'user', 'user_id', 'type', 'month', 'year'}
+
+
+@receiver(pre_save, sender='actions.BillRecord')
+def guardar_mes_anterior_conta(sender, instance, update_fields=None, **kwargs):
+    """Guarda (user_id, type, month, year) gravados antes da edição, para tirar o mês antigo do histórico."""
+    instance._mes_anterior = None
+    if instance.pk is None or (update_fields is not None and not CAMPOS_MES_CONTA & set(update_fields)):
+        return
+    instance._mes_anterior = sender.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'type', 'month', 'year'
+    ).first()
+
+
+@receiver(post_save, sender='actions.BillRecord')
+def atualizar_media_consumo(sender, instance, update_fields=None, **kwargs):
+    """Conta nova ou corrigida entra no histórico de consumo do usuário."""
+    from App.actions.servicos.media_consumo import MediaConsumoService
+
+    if update_fields is not None and not (CAMPOS_MES_CONTA | {'consumption_value'}) & set(update_fields):
+        return
+
+    servico = MediaConsumoService()
+    anterior = getattr(instance, '_mes_anterior', None)
+    if anterior and anterior != (instance.user_id, instance.type, instance.month, instance.year):
+        # Mês, tipo ou usuário mudou: o histórico antigo é refeito sem o mês que saiu
+        user_id, tipo, _, _ = anterior
+        servico.recalcular(user_id, tipo)
+        if (user_id, tipo) == (instance.user_id, instance.type):
+            return
+    servico.registrar(instance)
+
+
+@receiver(post_delete, sender='actions.BillRecord')
+def remover_media_consumo(sender, instance, **kwargs):
+    from App.actions.servicos.media_consumo import MediaConsumoService
+    MediaConsumoService().remover(instance)
+
+
+@receiver(contas_importadas)
+def atualizar_medias_importadas(sender, contas, **kwargs):
+    from App.actions.servicos.media_consumo import MediaConsumoService
+    MediaConsumoService().registrar_lote(contas)
@@ -1,3 +1,643 @@
+import datetime
+import json
+from decimal import Decimal
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from App.benchmark import benchmark, relatar
+from App.tokens.models import TokenLedger
+from App.tokens.servicos import PlantioArvoreStrategy, TokenService
+from App.consumo.servicos.consumo_template import ConsumoAgua, ConsumoEnergia
+from .models import ActionType, BillBaseline, BillRecord, UserAction
+from .signals import contas_importadas
+from .servicos.AcaoProxy import AcaoProxy
+from .servicos.aprovacao_lote import AprovacaoEmLoteService
+from .servicos.cache_acoes import CacheAcoesDjango, CacheAcoesLRU
+from .servicos.importacao_contas import ImportacaoContasService
+from .servicos.media_consumo import MediaConsumoService
+
+User = get_user_model()
+
+
+class AcaoProxyIdempotenciaTests(TestCase):
+    """Testes da detecção de ações duplicadas pela chave de idempotência."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='ana')
+        AcaoProxy._acoes_cache.limpar()
+
+    def registrar(self, descricao='Reciclagem de 5kg de plástico', tipo='Reciclagem'):
+        return AcaoProxy(self.usuario, tipo, descricao, 0.5, 10).registrarAcao()
+
+    def test_mesma_acao_no_mesmo_dia_credita_uma_vez(self):
+        self.registrar()
+        self.registrar()
+
+        self.assertEqual(TokenLedger.objects.count(), 1)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.total_points, 10)
+
+    def test_segunda_acao_do_mesmo_tipo_com_outra_descricao_e_creditada(self):
+        self.registrar('Reciclagem de garrafas')
+        self.registrar('Reciclagem de papelão')
+
+        self.assertEqual(TokenLedger.objects.count(), 2)
+
+    def test_mesma_acao_em_outro_dia_e_creditada(self):
+        self.registrar()
+        amanha = datetime.date.today() + datetime.timedelta(days=1)
+        with mock.patch('App.actions.servicos.AcaoProxy.timezone.localdate', return_value=amanha):
+            self.registrar()
+
+        self.assertEqual(TokenLedger.objects.count(), 2)
+
+    def test_restricao_unica_barra_chave_repetida(self):
+        chave = AcaoProxy(self.usuario, 'Reciclagem', 'x', 0.5, 10).gerar_chave_idempotencia()
+        TokenLedger.objects.create(
+            user=self.usuario, amount=10, type=TokenLedger.TYPE_CREDIT,
+            source=TokenLedger.SOURCE_ACTION, idempotency_key=chave
+        )
+
+        with self.assertRaises(IntegrityError):
+            TokenLedger.objects.create(
+                user=self.usuario, amount=10, type=TokenLedger.TYPE_CREDIT,
+                source=TokenLedger.SOURCE_ACTION, idempotency_key=chave
+            )
+
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.total_points, 10)
+
+
+class CacheAcoesLRUTests(TestCase):
+    """Testes do cache LRU/TTL de ações registradas."""
+
+    def setUp(self):
+        self.agora = 0.0
+        self.cache = CacheAcoesLRU(max_itens=2, ttl_segundos=10, relogio=lambda: self.agora)
+
+    def test_remove_item_menos_usado_ao_exceder_limite(self):
+        self.cache.registrar('a')
+        self.cache.registrar('b')
+        self.assertTrue(self.cache.contem('a'))  # 'b' passa a ser o menos usado
+        self.cache.registrar('c')
+
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertEqual(self.cache.estatisticas()['remocoes'], 1)
+
+    def test_item_expira_apos_ttl(self):
+        self.cache.registrar('a')
+        self.agora = 10.0
+
+        self.assertFalse(self.cache.contem('a'))
+        self.assertEqual(self.cache.estatisticas()['expiracoes'], 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_contadores_de_acerto_e_falha(self):
+        self.cache.registrar('a')
+        self.cache.contem('a')
+        self.cache.contem('x')
+
+        estatisticas = self.cache.estatisticas()
+        self.assertEqual((estatisticas['acertos'], estatisticas['falhas']), (1, 1))
+
+
+class AcaoProxyCacheTests(TestCase):
+    """Repetições da mesma ação são respondidas pelo cache, sem consultar o banco."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='bia')
+        self.cache_original = AcaoProxy._acoes_cache
+
+    def tearDown(self):
+        AcaoProxy.configurar_cache(self.cache_original)
+
+    def verificar_repeticao_sem_banco(self, cache):
+        AcaoProxy.configurar_cache(cache)
+        proxy = AcaoProxy(self.usuario, 'Transporte', 'Ônibus', 1.0, 15)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            proxy.registrarAcao()
+        with self.assertNumQueries(0):
+            AcaoProxy(self.usuario, 'Transporte', 'Ônibus', 1.0, 15).registrarAcao()
+
+        self.assertEqual(cache.estatisticas()['acertos'], 1)
+        self.assertEqual(TokenLedger.objects.count(), 1)
+
+    def test_repeticao_usa_cache_lru(self):
+        self.verificar_repeticao_sem_banco(CacheAcoesLRU())
+
+    def test_repeticao_usa_cache_do_django(self):
+        cache = CacheAcoesDjango()
+        cache.limpar()
+        self.verificar_repeticao_sem_banco(cache)
+
+
+class AprovacaoEmLoteTests(TestCase):
+    """Testes da aprovação de ações pendentes em lote."""
+
+    def setUp(self):
+        self.moderador = User.objects.create(username='moderador')
+        self.alunos = User.objects.bulk_create([User(username=f'aluno{i}') for i in range(3)])
+        self.reciclagem = ActionType.objects.create(name=ActionType.RECICLAGEM, base_points=10)
+        self.plantio = ActionType.objects.create(name=ActionType.PLANTIO_ARVORE, base_points=25)
+
+    def criar_acoes(self, quantidade):
+        return UserAction.objects.bulk_create([
+            UserAction(
+                user=self.alunos[i % len(self.alunos)],
+                action_type=self.reciclagem if i % 2 else self.plantio
+            )
+            for i in range(quantidade)
+        ])
+
+    def test_aprova_pendentes_e_lanca_creditos(self):
+        acoes = self.criar_acoes(4)
+        UserAction.objects.filter(pk=acoes[0].pk).update(status=UserAction.STATUS_REJEITADA)
+
+        aprovadas = AprovacaoEmLoteService().aprovar([acao.pk for acao in acoes], self.moderador)
+
+        self.assertEqual(aprovadas, 3)
+        for acao in UserAction.objects.filter(pk__in=[a.pk for a in acoes[1:]]):
+            self.assertEqual(acao.status, UserAction.STATUS_APROVADA)
+            self.assertEqual(acao.approved_by, self.moderador)
+            self.assertIsNotNone(acao.approved_at)
+            self.assertEqual(acao.points_awarded, acao.action_type.base_points)
+        self.assertEqual(
+            UserAction.objects.get(pk=acoes[0].pk).status, UserAction.STATUS_REJEITADA
+        )
+        self.assertEqual(
+            sorted(TokenLedger.objects.values_list('reference_id', 'amount')),
+            [(acoes[1].pk, 10), (acoes[2].pk, 25), (acoes[3].pk, 10)]
+        )
+        self.assertEqual(
+            sum(User.objects.filter(pk__in=[u.pk for u in self.alunos])
+                .values_list('total_points', flat=True)),
+            45
+        )
+
+    def test_aceita_queryset_e_nao_aprova_duas_vezes(self):
+        self.criar_acoes(6)
+        servico = AprovacaoEmLoteService()
+
+        self.assertEqual(servico.aprovar(UserAction.objects.all(), self.moderador), 6)
+        self.assertEqual(servico.aprovar(UserAction.objects.all(), self.moderador), 0)
+        self.assertEqual(TokenLedger.objects.count(), 6)
+
+    def test_numero_de_consultas_nao_cresce_com_o_lote(self):
+        servico = AprovacaoEmLoteService()
+        TokenService().tabela  # carrega a tabela de estratégias uma vez por processo
+
+        self.criar_acoes(5)
+        with CaptureQueriesContext(connection) as poucas:
+            servico.aprovar(UserAction.objects.all(), self.moderador)
+
+        self.criar_acoes(100)
+        with CaptureQueriesContext(connection) as muitas:
+            servico.aprovar(UserAction.objects.all(), self.moderador)
+
+        self.assertEqual(len(poucas), len(muitas))
+
+    def test_instancia_desatualizada_nao_credita_de_novo(self):
+        acao, = self.criar_acoes(1)
+        copia = UserAction.objects.get(pk=acao.pk)
+
+        self.assertTrue(acao.aprovar(self.moderador))
+        self.assertFalse(copia.aprovar(self.moderador))
+        self.assertEqual(AprovacaoEmLoteService().aprovar([acao.pk], self.moderador), 0)
+        self.assertEqual(TokenLedger.objects.count(), 1)
+
+    def test_mesmos_pontos_com_estrategia_trocada(self):
+        individual, em_lote = UserAction.objects.bulk_create(
+            [UserAction(user=self.alunos[0], action_type=self.plantio) for _ in range(2)]
+        )
+        servico = TokenService()
+        servico.trocar_estrategia(ActionType.PLANTIO_ARVORE, PlantioArvoreStrategy(40))
+        try:
+            individual.aprovar(self.moderador)
+            AprovacaoEmLoteService().aprovar([em_lote.pk], self.moderador)
+        finally:
+            servico.restaurar_estrategia(ActionType.PLANTIO_ARVORE)
+
+        self.assertEqual(list(TokenLedger.objects.values_list('amount', flat=True)), [40, 40])
+        self.assertEqual(set(UserAction.objects.values_list('points_awarded', flat=True)), {40})
+
+    def test_aprovacao_individual_lanca_o_mesmo_credito(self):
+        individual, em_lote = self.criar_acoes(2)
+
+        individual.aprovar(self.moderador)
+        individual.aprovar(self.moderador)  # a segunda não credita de novo
+        AprovacaoEmLoteService().aprovar([em_lote.pk], self.moderador)
+
+        lancamentos = TokenLedger.objects.order_by('pk').values_list('reference_id', 'amount', 'source', 'description')
+        self.assertEqual(list(lancamentos), [
+            (individual.pk, 25, TokenLedger.SOURCE_ACTION, "Recompensa por ação sustentável: PlantioArvore"),
+            (em_lote.pk, 10, TokenLedger.SOURCE_ACTION, "Recompensa por ação sustentável: Reciclagem"),
+        ])
+        self.assertEqual(User.objects.get(pk=self.alunos[0].pk).total_points, 25)
+        self.assertEqual(User.objects.get(pk=self.alunos[1].pk).total_points, 10)
+
+
+class RegistrarAcaoArquivoTests(TestCase):
+    """Testes do modo em lote (--from-file) do comando registrar_acao."""
+
+    def setUp(self):
+        AcaoProxy._acoes_cache.limpar()
+        User.objects.bulk_create([User(username=f'aluno{i}') for i in range(3)])
+
+    def criar_arquivo(self, sufixo, conteudo):
+        arquivo = tempfile.NamedTemporaryFile('w', suffix=sufixo, delete=False, encoding='utf-8')
+        arquivo.write(conteudo)
+        arquivo.close()
+        self.addCleanup(os.remove, arquivo.name)
+        return arquivo.name
+
+    def executar(self, caminho, **opcoes):
+        saida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('registrar_acao', from_file=caminho, stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_csv_registra_e_resume(self):
+        caminho = self.criar_arquivo('.csv', (
+            "username,tipo,descricao,impacto,tokens\n"
+            "aluno0,Reciclagem,Garrafas,0.5,10\n"
+            "aluno1,Transporte,Ônibus,1.0,15\n"
+            "aluno0,Reciclagem,Garrafas,0.5,10\n"
+            "fantasma,Reciclagem,Papel,0.5,10\n"
+            "aluno2,Reciclagem,Papel,abc,10\n"
+        ))
+
+        saida = self.executar(caminho, tamanho_lote=2)
+
+        self.assertIn('5 linhas', saida)
+        self.assertIn('2 registradas, 1 duplicadas', saida)
+        self.assertIn('1 com usuário não encontrado, 1 inválidas', saida)
+        self.assertEqual(User.objects.get(username='aluno0').total_points, 10)
+        self.assertEqual(User.objects.get(username='aluno1').total_points, 15)
+
+    def test_jsonl_reimportado_nao_credita_de_novo(self):
+        linhas = [
+            {"username": f"aluno{i % 3}", "tipo": "PlantioArvore",
+             "descricao": f"Muda {i}", "impacto": 2.0, "tokens": 25}
+            for i in range(30)
+        ]
+        caminho = self.criar_arquivo('.jsonl', "\n".join(json.dumps(l) for l in linhas))
+
+        self.assertIn('30 registradas', self.executar(caminho, tamanho_lote=7))
+        AcaoProxy._acoes_cache.limpar()
+        self.assertIn('0 registradas, 30 duplicadas', self.executar(caminho))
+        self.assertEqual(TokenLedger.objects.count(), 30)
+        self.assertEqual(User.objects.get(username='aluno0').total_points, 250)
+
+    def test_mesma_chave_que_o_registro_individual(self):
+        usuario = User.objects.get(username='aluno0')
+        AcaoProxy(usuario, 'Reciclagem', 'Latas', 0.5, 10).registrarAcao()
+        caminho = self.criar_arquivo('.csv', (
+            "username,tipo,descricao,impacto,tokens\n"
+            "aluno0,Reciclagem,Latas,0.5,10\n"
+        ))
+
+        self.assertIn('0 registradas, 1 duplicadas', self.executar(caminho))
+
+    @benchmark
+    def test_throughput_do_lote(self):
+        usuarios = User.objects.bulk_create([User(username=f'escola{i}') for i in range(500)])
+        linhas = "".join(
+            f"{usuarios[i % 500].username},Reciclagem,Campanha {i},0.5,10\n" for i in range(10000)
+        )
+        caminho = self.criar_arquivo('.csv', "username,tipo,descricao,impacto,tokens\n" + linhas)
+
+        inicio = time.perf_counter()
+        saida = self.executar(caminho)
+        duracao = time.perf_counter() - inicio
+
+        self.assertIn('10000 registradas', saida)
+        relatar(f"[registrar_acao --from-file] 10000 linhas em {duracao:.2f}s "
+                f"({10000 / duracao:.0f} linhas/s)")
+
+
+class MediaConsumoTests(TestCase):
+    """Testes do histórico de consumo mantido a cada conta e da média usada na análise."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='bia', email='bia@exemplo.com')
+
+    def conta(self, mes, valor, ano=2025, tipo=BillRecord.BILL_TYPE_WATER):
+        return BillRecord.objects.create(
+            user=self.usuario, type=tipo, consumption_value=valor, value_rs=100, month=mes, year=ano,
+        )
+
+    def historico(self, tipo=BillRecord.BILL_TYPE_WATER):
+        return BillBaseline.objects.get(user=self.usuario, type=tipo)
+
+    def test_media_acompanha_criacao_correcao_e_remocao(self):
+        self.conta(1, 10)
+        fevereiro = self.conta(2, 20)
+        self.conta(3, 30, tipo=BillRecord.BILL_TYPE_ENERGY)
+
+        self.assertEqual(self.historico().media(), 15)
+        fevereiro.consumption_value = 40
+        fevereiro.save()
+        self.assertEqual(self.historico().media(), 25)
+        fevereiro.delete()
+        self.assertEqual(self.historico().media(), 10)
+        self.assertEqual(self.historico(BillRecord.BILL_TYPE_ENERGY).media(), 30)
+
+    def test_janela_guarda_so_os_meses_mais_recentes(self):
+        for mes in range(1, 13):
+            self.conta(mes, mes, ano=2024)
+        self.conta(1, 100, ano=2025)
+        self.conta(6, 1000, ano=2023)  # mais antigo que a janela: ignorado
+
+        historico = self.historico()
+        self.assertEqual(historico.count, MediaConsumoService.MESES)
+        self.assertNotIn('2024-01', historico.monthly_values)
+        self.assertEqual(historico.total, sum(range(2, 13)) + 100)
+
+    def assert_igual_a_reconstrucao(self, tipo=BillRecord.BILL_TYPE_WATER):
+        incremental = self.historico(tipo)
+        MediaConsumoService().reconstruir()
+        reconstruido = self.historico(tipo)
+        self.assertEqual(incremental.monthly_values, reconstruido.monthly_values)
+        self.assertEqual((incremental.total, incremental.count), (reconstruido.total, reconstruido.count))
+
+    def test_conta_que_muda_de_mes_sai_do_mes_antigo(self):
+        janeiro = self.conta(1, 10)
+        self.conta(2, 20)
+
+        janeiro.month = 3
+        janeiro.save()
+
+        self.assertEqual(sorted(self.historico().monthly_values), ['2025-02', '2025-03'])
+        self.assertEqual(self.historico().count, 2)
+        self.assert_igual_a_reconstrucao()
+
+    def test_conta_que_muda_de_tipo_sai_do_historico_antigo(self):
+        conta = self.conta(1, 10)
+        self.conta(2, 20)
+
+        conta.type = BillRecord.BILL_TYPE_ENERGY
+        conta.save()
+
+        self.assertEqual(self.historico().media(), 20)
+        self.assertEqual(self.historico(BillRecord.BILL_TYPE_ENERGY).media(), 10)
+
+    def test_remocao_na_janela_cheia_traz_o_mes_mais_antigo(self):
+        self.conta(12, 1, ano=2023)
+        contas = [self.conta(mes, mes * 10, ano=2024) for mes in range(1, 13)]
+
+        contas[5].delete()
+
+        historico = self.historico()
+        self.assertEqual(historico.count, MediaConsumoService.MESES)
+        self.assertIn('2023-12', historico.monthly_values)
+        self.assert_igual_a_reconstrucao()
+
+    def test_salvar_sem_campos_do_consumo_nao_toca_o_historico(self):
+        conta = self.conta(1, 10)
+        conta.value_rs = 150
+
+        with self.assertNumQueries(1):
+            conta.save(update_fields=['value_rs'])  # só o UPDATE da conta
+
+    def test_reconstruir_igual_ao_incremental(self):
+
+        for indice in range(15):
+            self.conta(indice % 12 + 1, indice * 3, ano=2024 + indice // 12)
+        incremental = self.historico()
+
+        self.assertEqual(MediaConsumoService().reconstruir(), 1)
+        reconstruido = self.historico()
+        self.assertEqual(reconstruido.monthly_values, incremental.monthly_values)
+        self.assertEqual((reconstruido.total, reconstruido.count), (incremental.total, incremental.count))
+
+    def test_analise_usa_media_do_usuario(self):
+        self.conta(1, 12)
+        self.conta(2, 14)
+        self.conta(1, 200, tipo=BillRecord.BILL_TYPE_ENERGY)
+
+        agua = ConsumoAgua(self.usuario.email, usuario_id=self.usuario.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(agua.obter_media(), 13000.0)  # m³ -> litros
+            agua.obter_media()
+        resultado = ConsumoEnergia(self.usuario.email).analisar_consumo({"consumo_energia_kwh": 220.0})
+        self.assertEqual(resultado["media_historica"], 200.0)
+        self.assertTrue(resultado["alerta_necessario"])
+
+    def test_sem_historico_usa_media_padrao(self):
+        self.assertEqual(ConsumoAgua('ninguem@exemplo.com').obter_media(), 15000.0)
+        self.assertEqual(ConsumoEnergia(self.usuario.email, usuario_id=self.usuario.pk).obter_media(), 300.0)
+
+    def test_analise_em_lote_com_medias_de_cada_usuario(self):
+        outro = User.objects.create(username='caio', email='caio@exemplo.com')
+        self.conta(1, 10)
+        BillRecord.objects.create(user=outro, type=BillRecord.BILL_TYPE_WATER, consumption_value=20,
+                                  value_rs=100, month=1, year=2025)
+        analisador = ConsumoAgua('lote@exemplo.com')
+
+        with self.assertNumQueries(1):
+            medias = analisador.medias_em_lote([self.usuario.pk, outro.pk, outro.pk + 1])
+        lote = analisador.analisar_lote([12000.0, 19000.0, 15000.0], medias)
+
+        self.assertEqual(medias.tolist(), [10000.0, 20000.0, 15000.0])
+        self.assertEqual(lote.alerta.tolist(), [True, False, False])
+        self.assertEqual(lote.tokens.tolist(), [0, 10000, 0])
+
+
+class EconomiaContasTests(TestCase):
+    """Testes da economia mensal calculada com LAG em uma única consulta."""
+
+    def setUp(self):
+        self.ana = User.objects.create(username='ana')
+        self.bia = User.objects.create(username='bia')
+
+    def conta(self, usuario, ano, mes, valor, tipo=BillRecord.BILL_TYPE_WATER):
+        return BillRecord.objects.create(
+            user=usuario, type=tipo, consumption_value=valor, value_rs=100, month=mes, year=ano,
+        )
+
+    def criar_historico(self):
+        self.conta(self.ana, 2024, 11, 30)
+        self.conta(self.ana, 2024, 12, 25)
+        self.conta(self.ana, 2025, 1, 28)  # consumo subiu: sem economia
+        self.conta(self.ana, 2025, 3, 10)  # fevereiro sem conta: sem economia
+        self.conta(self.ana, 2025, 1, 400, tipo=BillRecord.BILL_TYPE_ENERGY)
+        self.conta(self.ana, 2024, 12, 500, tipo=BillRecord.BILL_TYPE_ENERGY)
+        self.conta(self.bia, 2024, 12, 20)
+        self.conta(self.bia, 2025, 1, 12.5)
+
+    def test_anotacao_igual_a_calcular_economia(self):
+        self.criar_historico()
+        esperado = {conta.pk: conta.calcular_economia() for conta in BillRecord.objects.all()}
+
+        with self.assertNumQueries(1):
+            calculado = {conta.pk: conta.calcular_economia() for conta in BillRecord.objects.com_economia()}
+
+        self.assertEqual(calculado, esperado)
+        self.assertEqual(sorted(valor for valor in calculado.values() if valor), [5, 7.5, 100])
+
+    def test_mes_inclui_mes_anterior_na_janela(self):
+        self.criar_historico()
+
+        with self.assertNumQueries(1):
+            contas = {(conta.user_id, conta.type): conta for conta in BillRecord.objects.do_mes_com_economia(2025, 1)}
+
+        self.assertEqual(len(contas), 3)
+        self.assertEqual(contas[(self.ana.pk, BillRecord.BILL_TYPE_WATER)].consumo_anterior, 25)
+        self.assertEqual(contas[(self.ana.pk, BillRecord.BILL_TYPE_WATER)].economia_mensal, 0)
+        self.assertEqual(contas[(self.ana.pk, BillRecord.BILL_TYPE_ENERGY)].economia_mensal, 100)
+        self.assertEqual(contas[(self.bia.pk, BillRecord.BILL_TYPE_WATER)].economia_mensal, 7.5)
+
+    def test_comando_resume_o_mes(self):
+        self.criar_historico()
+        saida = StringIO()
+
+        call_command('calcular_economia_contas', mes='2025-01', detalhes=True, stdout=saida)
+
+        saida = saida.getvalue()
+        self.assertIn('Água: 2 conta(s), 1 com economia, 7.50 m³ economizados', saida)
+        self.assertIn('Energia: 1 conta(s), 1 com economia, 100.00 kWh economizados', saida)
+        self.assertIn('3 conta(s) de 01/2025', saida)
+        self.assertIn('bia - Água 1/2025: 7.50 m³', saida)
+
+    def test_comando_rejeita_mes_invalido(self):
+        with self.assertRaises(CommandError):
+            call_command('calcular_economia_contas', mes='2025-13', stdout=StringIO())
+
+
+class ImportarContasTests(TestCase):
+    """Testes da importação de contas em lote (comando importar_contas)."""
+
+    CABECALHO = "username,tipo,mes,ano,consumo,valor\n"
+
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'morador{i}') for i in range(3)])
+        self.morador0 = User.objects.get(username='morador0')
+
+    def criar_arquivo(self, conteudo):
+        arquivo = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        arquivo.write(conteudo)
+        arquivo.close()
+        self.addCleanup(os.remove, arquivo.name)
+        return arquivo.name
+
+    def executar(self, caminho, **opcoes):
+        saida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('importar_contas', caminho, stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_importa_valida_e_atualiza_na_reimportacao(self):
+        caminho = self.criar_arquivo(self.CABECALHO + (
+            "morador0,Água,1,2025,12.5,80.00\n"
+            "morador0,agua,2,2025,10,70\n"
+            "morador1,ENERGIA,1,2025,\"210,5\",150\n"
+            "morador0,Água,2,2025,9,65\n"  # repetida no arquivo: vale a última
+            "fantasma,Água,1,2025,10,50\n"
+            "morador2,Gás,1,2025,10,50\n"
+            "morador2,Água,13,2025,10,50\n"
+            "morador2,Água,1,2025,-3,50\n"
+        ))
+
+        saida = self.executar(caminho, tamanho_lote=4)
+
+        self.assertIn('8 linhas', saida)
+        self.assertIn('3 criadas, 0 atualizadas, 1 com usuário não encontrado, 3 inválidas', saida)
+        fevereiro = BillRecord.objects.get(user=self.morador0, month=2)
+        self.assertEqual((fevereiro.consumption_value, fevereiro.value_rs), (9, 65))
+        self.assertEqual(BillRecord.objects.get(user__username='morador1').consumption_value, Decimal('210.50'))
+        self.assertEqual(BillBaseline.objects.get(user=self.morador0, type=BillRecord.BILL_TYPE_WATER).media(),
+                         Decimal('10.75'))
+
+        saida = self.executar(self.criar_arquivo(self.CABECALHO + "morador0,Água,2,2025,7.5,60\n"))
+
+        self.assertIn('0 criadas, 1 atualizadas', saida)
+        self.assertEqual(BillRecord.objects.count(), 3)
+        self.assertEqual(BillBaseline.objects.get(user=self.morador0, type=BillRecord.BILL_TYPE_WATER).media(), 10)
+
+    def test_criadas_chegam_com_economia_do_mes_anterior(self):
+        BillRecord.objects.create(user=self.morador0, type=BillRecord.BILL_TYPE_WATER,
+                                  consumption_value=20, value_rs=90, month=12, year=2024)
+        recebidas = []
+
+        def receber(sender, criadas, **kwargs):
+            recebidas.extend(criadas)
+        contas_importadas.connect(receber)
+        self.addCleanup(contas_importadas.disconnect, receber)
+
+        self.executar(self.criar_arquivo(self.CABECALHO + (
+            "morador0,Água,1,2025,12,80\n"
+            "morador0,Água,12,2024,18,85\n"
+        )))
+
+        self.assertEqual([(conta.month, conta.economia_mensal) for conta in recebidas], [(1, 6)])
+
+    def test_retoma_do_checkpoint_apos_falha(self):
+        linhas = "".join(f"morador{i % 3},Energia,{i % 12 + 1},{2000 + i // 12},{100 + i},50\n" for i in range(10))
+        caminho = self.criar_arquivo(self.CABECALHO + linhas)
+        checkpoint = caminho + '.checkpoint'
+        importar_lote = ImportacaoContasService.importar_lote
+        chamadas = []
+
+        def falhar_no_terceiro_lote(servico, lote):
+            chamadas.append(len(lote))
+            if len(chamadas) == 3:
+                raise RuntimeError('queda no meio da importação')
+            return importar_lote(servico, lote)
+
+        with mock.patch.object(ImportacaoContasService, 'importar_lote', falhar_no_terceiro_lote):
+            with self.assertRaises(RuntimeError):
+                self.executar(caminho, tamanho_lote=3, checkpoint=checkpoint)
+        self.assertEqual(BillRecord.objects.count(), 6)
+        with open(checkpoint, encoding='utf-8') as arquivo:
+            self.assertEqual(json.load(arquivo)['linhas'], 6)
+
+        saida = self.executar(caminho, tamanho_lote=3, checkpoint=checkpoint)
+
+        self.assertIn('Retomando após 6 linha(s)', saida)
+        self.assertIn('4 linhas', saida)
+        self.assertIn('4 criadas, 0 atualizadas', saida)
+        self.assertEqual(BillRecord.objects.count(), 10)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_checkpoint_de_outro_arquivo_e_recusado(self):
+        caminho = self.criar_arquivo(self.CABECALHO + "morador0,Água,1,2025,10,50\n")
+        checkpoint = caminho + '.checkpoint'
+        with open(checkpoint, 'w', encoding='utf-8') as arquivo:
+            json.dump({'arquivo': '/outro.csv', 'posicao': 0, 'linhas': 0}, arquivo)
+
+        with self.assertRaises(CommandError):
+            self.executar(caminho, checkpoint=checkpoint)
+        self.assertIn('1 criadas', self.executar(caminho, checkpoint=checkpoint, recomecar=True))
+
+    def test_cabecalho_sem_os_campos_e_recusado(self):
+        with self.assertRaises(CommandError):
+            self.executar(self.criar_arquivo("username,tipo,consumo\nmorador0,Água,10\n"))
+
+    @benchmark
+    def test_throughput_da_importacao(self):
+        usuarios = User.objects.bulk_create([User(username=f'cliente{i}') for i in range(500)])
+        linhas = "".join(
+            f"{usuarios[i % 500].username},{'Água' if i // 500 % 2 else 'Energia'},{i // 1000 % 12 + 1},"
+            f"{2020 + i // 12000},{10 + i % 90}.5,{50 + i % 40}\n"
+            for i in range(20000)
+        )
+        caminho = self.criar_arquivo(self.CABECALHO + linhas)
+
+        inicio = time.perf_counter()
+        saida = self.executar(caminho)
+        duracao = time.perf_counter() - inicio
 
-# Create your tests here.
+        self.assertIn('20000 linhas', saida)
+        self.assertEqual(BillRecord.objects.count(), 20000)
+        relatar(f"[importar_contas] 20000 linhas em {duracao:.2f}s ({20000 / duracao:.0f} linhas/s)")
@@ -50,6 +50,10 @@ class User(AbstractUser):
         verbose_name = 'Usuário'
         verbose_name_plural = 'Usuários'
         ordering = ['-date_joined']
+        indexes = [
+            # Ranking por pontos (consultas do ranking enquanto o placar em memória carrega)
+            models.Index(fields=['-total_points', 'id'], name='users_ranking_idx'),
+        ]
 
     def __str__(self):
         return f"{self.obter_nome_completo() or self.username} - {self.total_points} pontos"
@@ -0,0 +1,19 @@
+"""
+Benchmarks de tempo dos testes. Dependem da carga da máquina, então só rodam
+com a variável de ambiente BENCHMARK=1 (ex.: BENCHMARK=1 python manage.py test).
+"""
+
+import os
+import unittest
+
+ATIVO = bool(os.environ.get("BENCHMARK"))
+
+
+def benchmark(teste):
+    """Marca o teste como benchmark: pulado, a não ser com BENCHMARK=1."""
+    return unittest.skipUnless(ATIVO, "benchmark de tempo (rode com BENCHMARK=1)")(teste)
+
+
+def relatar(mensagem: str) -> None:
+    """Mostra o resultado de um benchmark (só roda com BENCHMARK=1)."""
+    print(f"\n{mensagem}")
@@ -1,5 +1,36 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+
+class AnaliseLote:
+    """
+    Resultado de `ConsumoTemplate.analisar_lote`: um array NumPy por coluna
+    (consumo, media, alerta, economia, tokens), na ordem dos usuários. As
+    mensagens de feedback só são montadas quando pedidas.
+    """
+
+    def __init__(self, analisador, consumo, media, alerta, economia, tokens):
+        self.analisador = analisador
+        self.consumo = consumo
+        self.media = media
+        self.alerta = alerta
+        self.economia = economia
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self.consumo)
+
+    def mensagem(self, indice: int) -> str:
+        return self.analisador.gerar_alerta(
+            bool(self.alerta[indice]), float(self.consumo[indice]), float(self.media[indice])
+        )
+
+    def mensagens(self, indices=None) -> list:
+        """Mensagens dos usuários em `indices` (padrão: todos)."""
+        if indices is None:
+            indices = range(len(self))
+        return [self.mensagem(indice) for indice in indices]
+
 
 class ConsumoTemplate(ABC):
     """
@@ -7,9 +38,22 @@ class ConsumoTemplate(ABC):
     Implementa o padrão de projeto Template Method.
     """
 
-    def __init__(self, email_usuario: str):
-        """Inicializa com o email do usuário."""
+    # Tipo de BillRecord do histórico, média usada sem histórico e fator que
+    # converte a unidade da conta para a unidade da análise
+    TIPO_CONTA: Optional[str] = None
+    MEDIA_PADRAO = 0.0
+    FATOR_UNIDADE = 1.0
+
+    # Alerta quando o consumo passa de LIMITE_ALERTA x média; tokens por
+    # unidade economizada abaixo da média
+    LIMITE_ALERTA = 1.0
+    TOKENS_POR_UNIDADE = 10
+
+    def __init__(self, email_usuario: str, usuario_id: Optional[int] = None):
+        """Inicializa com o email do usuário (e o id, que evita buscar pelo email)."""
         self.email_usuario = email_usuario
+        self.usuario_id = usuario_id
+        self._media = None
 
     def analisar_consumo(self, dados_usuario: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -47,15 +91,30 @@ class ConsumoTemplate(ABC):
         """Calcula o consumo específico (e.g., água ou energia) a partir dos dados do usuário."""
         pass
 
-    @abstractmethod
     def obter_media(self) -> float:
-        """Obtém a média histórica de consumo ou a meta de consumo para comparação."""
-        pass
-
-    @abstractmethod
-    def verificar_alerta(self, consumo: float, media: float) -> bool:
-        """Verifica se o consumo está acima da média ou meta, indicando a necessidade de alerta."""
-        pass
+        """
+        Média dos últimos meses de contas do usuário, lida do histórico mantido
+        a cada BillRecord gravado (uma consulta por chave, feita uma vez por
+        instância). Sem Django configurado ou sem histórico, usa MEDIA_PADRAO.
+        """
+        if self._media is None:
+            media = self._media_do_historico()
+            self._media = self.MEDIA_PADRAO if media is None else float(media) * self.FATOR_UNIDADE
+        return self._media
+
+    def _media_do_historico(self):
+        from django.apps import apps
+        if self.TIPO_CONTA is None or not apps.ready:
+            return None
+        from App.actions.servicos.media_consumo import MediaConsumoService
+        return MediaConsumoService().obter_media(self.TIPO_CONTA, user_id=self.usuario_id, email=self.email_usuario)
+
+    def verificar_alerta(self, consumo, media, limite=None):
+        """
+        Verifica se o consumo passou de `limite` vezes a média ou meta (padrão:
+        LIMITE_ALERTA). Funciona com números ou com arrays NumPy.
+        """
+        return consumo > media * (self.LIMITE_ALERTA if limite is None else limite)
 
     # --- Métodos Concretos (Hooks e Passos Padrão) ---
 
@@ -76,11 +135,63 @@ class ConsumoTemplate(ABC):
         Tokens são atribuídos apenas se o consumo for menor ou igual à média/meta.
         """
         if consumo <= media:
-            # Atribui 10 tokens por unidade economizada (exemplo)
+            # Atribui TOKENS_POR_UNIDADE tokens por unidade economizada
             economia = media - consumo
-            return int(economia * 10)
+            return int(economia * self.TOKENS_POR_UNIDADE)
         return 0
 
+    # --- Análise em Lote ---
+
+    def analisar_lote(self, consumos, medias=None, limites=None) -> AnaliseLote:
+        """
+        Analisa vários usuários de uma vez, com os mesmos passos de
+        `analisar_consumo` calculados sobre arrays NumPy em uma única passada.
+
+        `consumos` tem um valor por usuário; `medias` e `limites` podem ser um
+        array do mesmo tamanho ou um único valor (padrão: `obter_media()` e
+        LIMITE_ALERTA). Para as médias de cada usuário, veja `medias_em_lote`.
+        """
+        import numpy as np
+
+        consumo = np.asarray(consumos, dtype=np.float64)
+        media = np.broadcast_to(
+            np.asarray(self.obter_media() if medias is None else medias, dtype=np.float64), consumo.shape
+        )
+        alerta = np.asarray(self.verificar_alerta(consumo, media, limites), dtype=bool)
+        economia = np.maximum(media - consumo, 0.0)
+        tokens = self.atribuir_tokens_lote(consumo, media)
+        return AnaliseLote(self, consumo, media, alerta, economia, tokens)
+
+    def atribuir_tokens_lote(self, consumo, media):
+        """
+        Hook: versão vetorizada de `atribuir_tokens` (subclasses que alteram
+        uma devem alterar a outra). Retorna um array de inteiros.
+        """
+        import numpy as np
+
+        tokens = np.floor((media - consumo) * self.TOKENS_POR_UNIDADE)
+        return np.where(consumo <= media, tokens, 0).astype(np.int64)
+
+    def medias_em_lote(self, usuario_ids):
+        """
+        Médias do histórico de cada usuário em `usuario_ids`, já na unidade da
+        análise; quem não tem histórico fica com
+        MEDIA_PADRAO.
+        """
+        import numpy as np
+
+        medias = np.full(len(usuario_ids), self.MEDIA_PADRAO, dtype=np.float64)
+        from django.apps import apps
+        if self.TIPO_CONTA is None or not apps.ready:
+            return medias
+        from App.actions.servicos.media_consumo import MediaConsumoService
+        historico = MediaConsumoService().obter_medias(self.TIPO_CONTA, usuario_ids)
+        for indice, usuario_id in enumerate(usuario_ids):
+            media = historico.get(usuario_id)
+            if media is not None:
+                medias[indice] = float(media) * self.FATOR_UNIDADE
+        return medias
+
 # ----------------------------------------------------------------------
 # Implementações Concretas
 # ----------------------------------------------------------------------
@@ -88,39 +199,28 @@ class ConsumoTemplate(ABC):
 class ConsumoAgua(ConsumoTemplate):
     """Implementação concreta para a análise de consumo de Água."""
 
+    TIPO_CONTA = 'Água'
+    MEDIA_PADRAO = 15000.0  # litros
+    FATOR_UNIDADE = 1000.0  # contas em m³, análise em litros
+    LIMITE_ALERTA = 1.1  # alerta acima de 10% da média
+
     def calcular_consumo(self, dados_usuario: Dict[str, Any]) -> float:
         """Simula o cálculo do consumo de água (em litros)."""
         # Exemplo: Acessa o dado 'consumo_agua_litros' do dicionário
         return float(dados_usuario.get("consumo_agua_litros", 0.0))
 
-    def obter_media(self) -> float:
-        """Simula a obtenção da média histórica de consumo de água (em litros)."""
-        # Exemplo: Média histórica de 15000 litros
-        return 15000.0
-
-    def verificar_alerta(self, consumo: float, media: float) -> bool:
-        """Verifica se o consumo de água excedeu a média."""
-        # Alerta se o consumo for mais de 10% acima da média
-        return consumo > media * 1.1
-
 class ConsumoEnergia(ConsumoTemplate):
     """Implementação concreta para a análise de consumo de Energia."""
 
+    TIPO_CONTA = 'Energia'
+    MEDIA_PADRAO = 300.0  # kWh
+    LIMITE_ALERTA = 1.05  # alerta acima de 5% da média
+
     def calcular_consumo(self, dados_usuario: Dict[str, Any]) -> float:
         """Simula o cálculo do consumo de energia (em kWh)."""
         # Exemplo: Acessa o dado 'consumo_energia_kwh' do dicionário
         return float(dados_usuario.get("consumo_energia_kwh", 0.0))
 
-    def obter_media(self) -> float:
-        """Simula a obtenção da média histórica de consumo de energia (em kWh)."""
-        # Exemplo: Média histórica de 300 kWh
-        return 300.0
-
-    def verificar_alerta(self, consumo: float, media: float) -> bool:
-        """Verifica se o consumo de energia excedeu a média."""
-        # Alerta se o consumo for mais de 5% acima da média
-        return consumo > media * 1.05
-
 # ----------------------------------------------------------------------
 # Exemplo de Uso (Opcional, para testes)
 # ----------------------------------------------------------------------
@@ -1,5 +1,9 @@
+from App.logs import obter_logger, registrar_evento
+
 from .decorador_base import AcaoDecorator
 
+logger = obter_logger("decoradores.bonus")
+
 
 class BonusDecorator(AcaoDecorator):
     """Decorator que adiciona bônus de 5 tokens para ações com 20+ tokens."""
@@ -10,6 +14,10 @@ class BonusDecorator(AcaoDecorator):
 
         if tokens >= 20:
             usuario.saldoTokens += 5
-            print(f"[BONUS] {usuario.nome} ganhou 5 tokens extras!")
+            registrar_evento(
+                logger, "bonus.concedido",
+                "[BONUS] %s ganhou 5 tokens extras!", usuario.nome,
+                usuario=usuario.nome, tokens=5,
+            )
 
         return tokens
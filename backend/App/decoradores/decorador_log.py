@@ -1,10 +1,18 @@
+from App.logs import obter_logger, registrar_evento
+
 from .decorador_base import AcaoDecorator
 
+logger = obter_logger("decoradores.log")
+
 
 class LogDecorator(AcaoDecorator):
     """Decorator que adiciona logging ao registro de ações."""
 
     def registrar_acao(self, usuario, acao):
         """Registra ação com log."""
-        print(f"[LOG] Registrando ação '{acao.tipoAcao}' de {usuario.nome}")
+        registrar_evento(
+            logger, "acao.registrando",
+            "[LOG] Registrando ação '%s' de %s", acao.tipoAcao, usuario.nome,
+            usuario=usuario.nome, tipo=acao.tipoAcao,
+        )
         return super().registrar_acao(usuario, acao)
@@ -0,0 +1,8 @@
+"""Modulo de filas em memoria que agregam trabalho de varias threads, usado por varios apps."""
+
+from .agregada import FilaAgregada, esvaziar_filas
+
+__all__ = [
+    'FilaAgregada',
+    'esvaziar_filas'
+]
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Filas criadas no processo, para esvaziar_filas
+_filas = weakref.WeakSet()
+
+
+class FilaAgregada:
+    """
+    Fila em memória que junta trabalhos de várias threads do processo e os
+    aplica em lote, numa thread própria, com `aplicar(chave, itens)`
+    recebendo tudo que se acumulou para a mesma chave.
+
+    Serve para o trabalho que roda depois do commit de um lançamento: em vez
+    de uma escrita por lançamento, a thread da fila espera `intervalo`
+    segundos depois do primeiro item e faz uma escrita para o lote inteiro.
+    Se o processo cair com itens na fila, eles se perdem: o trabalho deve ser
+    refazível (por um comando de reconstrução, por exemplo).
+
+    Chamada dentro de uma transação (como nos testes, que não fazem commit),
+    a fila aplica o item na hora, na própria thread, para enxergar os dados
+    ainda não confirmados.
+    """
+
+    def __init__(self, aplicar, intervalo: float = 0.05):
+        self._aplicar = aplicar
+        self.intervalo = intervalo
+        self._pendentes = {}
+        self._aplicando = False
+        self._thread = None
+        self._condicao = threading.Condition()
+        _filas.add(self)
+
+    def adicionar(self, chave, item) -> None:
+        from django.db import connection
+        if connection.in_atomic_block:
+            self._aplicar(chave, [item])
+            return
+
+        with self._condicao:
+            self._pendentes.setdefault(chave, []).append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._trabalhar, name='FilaAgregada', daemon=True)
+                self._thread.start()
+            self._condicao.notify_all()
+
+    def esvaziar(self) -> None:
+        """Espera a fila aplicar todos os itens recebidos até aqui."""
+        with self._condicao:
+            while self._pendentes or self._aplicando:
+                self._condicao.wait()
+
+    def _trabalhar(self) -> None:
+        from django.db import close_old_connections
+
+        while True:
+            with self._condicao:
+                while not self._pendentes:
+                    self._condicao.wait()
+                self._aplicando = True
+            # Dá tempo para os lançamentos concorrentes entrarem no mesmo lote
+            time.sleep(self.intervalo)
+            with self._condicao:
+                pendentes, self._pendentes = self._pendentes, {}
+            try:
+                close_old_connections()
+                for chave, itens in pendentes.items():
+                    self._aplicar(chave, itens)
+            except Exception:
+                logger.exception("Falha ao aplicar %d lote(s) da fila", len(pendentes))
+            finally:
+                with self._condicao:
+                    self._aplicando = False
+                    self._condicao.notify_all()
+
+
+def esvaziar_filas() -> None:
+    """Espera todas as filas do processo aplicarem o que já receberam."""
+    for fila in list(_filas):
+        fila.esvaziar()
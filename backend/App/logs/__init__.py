@@ -0,0 +1,21 @@
+"""Modulo de logs estruturados e nao bloqueantes."""
+
+from .eventos import (
+    FiltroAmostragem,
+    FormatadorJSON,
+    HandlerFila,
+    iniciar_logs,
+    obter_logger,
+    parar_logs,
+    registrar_evento
+)
+
+__all__ = [
+    'FiltroAmostragem',
+    'FormatadorJSON',
+    'HandlerFila',
+    'iniciar_logs',
+    'obter_logger',
+    'parar_logs',
+    'registrar_evento'
+]
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class LogsConfig(AppConfig):
+    name = 'App.logs'
+
+    def ready(self):
+        from . import iniciar_logs
+        iniciar_logs()
@@ -0,0 +1,131 @@
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logger raiz de todos os eventos do sistema
+NOME_RAIZ = "sustentabilidadeja"
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata cada evento como uma linha JSON (fácil de filtrar e analisar)."""
+
+    def format(self, record):
+        dados = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "evento": getattr(record, "evento", None),
+            "mensagem": record.getMessage(),
+        }
+        dados.update(getattr(record, "campos", {}))
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Mantém apenas uma fração dos eventos abaixo de WARNING.
+    A taxa pode ser definida por nome de evento; avisos e erros nunca são descartados.
+    """
+
+    def __init__(self, taxa_padrao: float = 1.0, taxas_por_evento=None, aleatorio=random.random):
+        super().__init__()
+        self.taxa_padrao = taxa_padrao
+        self.taxas_por_evento = dict(taxas_por_evento or {})
+        self._aleatorio = aleatorio
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        taxa = self.taxas_por_evento.get(getattr(record, "evento", None), self.taxa_padrao)
+        return taxa >= 1.0 or self._aleatorio() < taxa
+
+
+class _EscritorFila(QueueListener):
+    """QueueListener que espera vaga para o sinal de parada se a fila estiver cheia."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class HandlerFila(QueueHandler):
+    """
+    Handler para o LOGGING do Django: quem registra o evento só o enfileira, e
+    uma thread (QueueListener) o escreve em `stream` com o formatter do handler.
+    A thread começa em `iniciar` (chamado por LogsConfig.ready) e para em
+    `close`, escrevendo antes os eventos pendentes.
+
+    A fila guarda até `capacidade` eventos; com ela cheia (escrita lenta ou
+    thread parada), os eventos novos são descartados e contados em
+    `descartados`, sem bloquear quem registra.
+    """
+
+    def __init__(self, stream=None, capacidade: int = 10000):
+        super().__init__(queue.Queue(maxsize=capacidade))
+        self.destino = logging.StreamHandler(stream or sys.stdout)
+        self.listener = _EscritorFila(self.queue, self.destino, respect_handler_level=True)
+        self.descartados = 0
+        self._iniciado = False
+        self._lock_listener = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # A formatação (JSON) fica com a thread de escrita
+        self.destino.setFormatter(fmt)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def iniciar(self) -> None:
+        with self._lock_listener:
+            if not self._iniciado:
+                self.listener.start()
+                self._iniciado = True
+
+    def parar(self) -> None:
+        """Escreve os eventos pendentes e encerra a thread de escrita."""
+        with self._lock_listener:
+            if self._iniciado:
+                self.listener.stop()
+                self._iniciado = False
+
+    def close(self):
+        self.parar()
+        super().close()
+
+
+def _handlers_fila():
+    return [handler for handler in logging.getLogger(NOME_RAIZ).handlers if isinstance(handler, HandlerFila)]
+
+
+def iniciar_logs() -> None:
+    """Inicia as threads de escrita dos HandlerFila configurados pelo LOGGING."""
+    for handler in _handlers_fila():
+        handler.iniciar()
+
+
+def parar_logs() -> None:
+    """Escreve os eventos pendentes e encerra as threads de escrita."""
+    for handler in _handlers_fila():
+        handler.parar()
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    """Retorna o logger do componente (a configuração vem do LOGGING do Django)."""
+    return logging.getLogger(f"{NOME_RAIZ}.{nome}")
+
+
+def registrar_evento(logger: logging.Logger, evento: str, mensagem: str, *args,
+                     nivel=logging.INFO, **campos) -> None:
+    """
+    Registra um evento estruturado; não faz nada se o nível estiver desligado.
+    `args` preenchem os %s da mensagem só quando o evento é formatado.
+    """
+    if logger.isEnabledFor(nivel):
+        logger.log(nivel, mensagem, *args, extra={"evento": evento, "campos": campos})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RewardsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'App.rewards'
+
+    def ready(self):
+        from . import signals  # noqa: F401
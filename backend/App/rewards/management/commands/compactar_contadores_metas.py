@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from App.rewards.servicos import ContadorGlobalService
+
+
+class Command(BaseCommand):
+    help = (
+        'Junta as fatias dos contadores das metas globais em uma única linha por meta e período. '
+        'Feito para rodar periodicamente (ex.: cron a cada hora); o total não muda.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meta', type=int, action='append',
+                            help='Compacta só o contador desta meta (pode repetir).')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        removidas = ContadorGlobalService().compactar(goal_ids=options['meta'])
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{removidas} fatia(s) compactada(s) em {duracao:.2f}s.'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from App.rewards.servicos import ReservaService
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove, em lotes, as reservas de recompensas já expiradas. '
+        'Com --intervalo, continua rodando e repete a varredura a cada N segundos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=ReservaService.TAMANHO_LOTE,
+                            help=f'Reservas removidas por transação (padrão: {ReservaService.TAMANHO_LOTE}).')
+        parser.add_argument('--intervalo', type=float,
+                            help='Segundos entre varreduras; sem esta opção, executa uma vez.')
+
+    def handle(self, *args, **options):
+        servico = ReservaService()
+        while True:
+            removidas = servico.liberar_expiradas(tamanho_lote=options['tamanho_lote'])
+            self.stdout.write(self.style.SUCCESS(f'{removidas} reserva(s) expirada(s) liberada(s).'))
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
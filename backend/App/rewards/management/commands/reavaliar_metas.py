@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from App.rewards.models import Goal
+from App.rewards.servicos import ReavaliacaoMetasService
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o progresso das metas ativas no período atual a partir das ações aprovadas, '
+        'do TokenLedger e das contas registradas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meta', type=int, action='append',
+                            help='Reavalia só esta meta (pode repetir).')
+        parser.add_argument('--data', help='Data de referência AAAA-MM-DD (padrão: hoje).')
+
+    def handle(self, *args, **options):
+        try:
+            data = date.fromisoformat(options['data']) if options['data'] else None
+        except ValueError:
+            raise CommandError('Data inválida; use o formato AAAA-MM-DD.')
+
+        metas = Goal.objects.filter(is_active=True).order_by('pk')
+        if options['meta']:
+            metas = metas.filter(pk__in=options['meta'])
+
+        servico = ReavaliacaoMetasService()
+        inicio = time.perf_counter()
+        for meta in metas:
+            usuarios = servico.reavaliar(meta, data=data)
+            self.stdout.write(f'  meta #{meta.pk}: {usuarios} usuário(s) com progresso')
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{len(metas)} meta(s) reavaliada(s) em {duracao:.2f}s.'))
@@ -0,0 +1,45 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from App.rewards.models import Goal
+from App.rewards.servicos import ViradaPeriodoService
+
+
+class Command(BaseCommand):
+    help = (
+        'Arquiva o progresso dos períodos encerrados das metas recorrentes e zera os contadores. '
+        'Feito para rodar no início de cada dia (ex.: cron); pode ser repetido com segurança '
+        'se for interrompido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Data de referência AAAA-MM-DD (padrão: hoje).')
+        parser.add_argument('--periodo', action='append', choices=[p for p, _ in Goal.PERIOD_CHOICES],
+                            help='Vira só metas deste período (pode repetir).')
+        parser.add_argument('--tamanho-lote', type=int, default=ViradaPeriodoService.TAMANHO_LOTE,
+                            help=f'Linhas por transação (padrão: {ViradaPeriodoService.TAMANHO_LOTE}).')
+
+    def handle(self, *args, **options):
+        try:
+            data = date.fromisoformat(options['data']) if options['data'] else None
+        except ValueError:
+            raise CommandError('Data inválida; use o formato AAAA-MM-DD.')
+
+        def informar(goal_id, linhas):
+            self.stdout.write(f'  meta #{goal_id}: {linhas} linha(s) virada(s)')
+
+        inicio = time.perf_counter()
+        viradas = ViradaPeriodoService().virar(
+            data=data,
+            periodos=options['periodo'],
+            tamanho_lote=options['tamanho_lote'],
+            ao_concluir_lote=informar,
+        )
+        duracao = time.perf_counter() - inicio
+        total = sum(viradas.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} progresso(s) de {len(viradas)} meta(s) virado(s) em {duracao:.2f}s '
+            f'({total / duracao if duracao else 0:.0f} linhas/s).'
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RewardReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(help_text='Após esta data a unidade volta ao estoque disponível', verbose_name='Expira em')),
+                ('reward', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='rewards.reward', verbose_name='Recompensa')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reward_reservations', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Recompensa',
+                'verbose_name_plural': 'Reservas de Recompensas',
+                'db_table': 'reward_reservations',
+                'indexes': [models.Index(fields=['reward', 'expires_at'], name='reward_rese_reward__349454_idx'), models.Index(fields=['expires_at'], name='reward_rese_expires_6a6adf_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0002_rewardreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalProgressArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Início do Período')),
+                ('final_value', models.IntegerField(verbose_name='Valor Final')),
+                ('completed', models.BooleanField(default=False, verbose_name='Completada')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Data de Conclusão')),
+                ('archived_at', models.DateTimeField(verbose_name='Arquivado em')),
+            ],
+            options={
+                'verbose_name': 'Histórico de Progresso de Meta',
+                'verbose_name_plural': 'Históricos de Progresso de Metas',
+                'db_table': 'goal_progress_archive',
+                'ordering': ['-period_start'],
+            },
+        ),
+        migrations.AddField(
+            model_name='usergoalprogress',
+            name='period_start',
+            field=models.DateField(blank=True, help_text='Período da meta a que o progresso se refere', null=True, verbose_name='Início do Período'),
+        ),
+        migrations.AddIndex(
+            model_name='usergoalprogress',
+            index=models.Index(fields=['goal', 'period_start'], name='user_goal_p_goal_id_197144_idx'),
+        ),
+        migrations.AddField(
+            model_name='goalprogressarchive',
+            name='goal',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_progress', to='rewards.goal', verbose_name='Meta'),
+        ),
+        migrations.AddField(
+            model_name='goalprogressarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='goal_progress_archive', to=settings.AUTH_USER_MODEL, verbose_name='Usuário'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='goalprogressarchive',
+            unique_together={('user', 'goal', 'period_start')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0003_periodo_e_historico_de_metas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Início do Período')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='Fatia')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Valor')),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='rewards.goal', verbose_name='Meta')),
+            ],
+            options={
+                'verbose_name': 'Fatia de Contador de Meta',
+                'verbose_name_plural': 'Fatias de Contadores de Metas',
+                'db_table': 'goal_counter_shards',
+                'unique_together': {('goal', 'period_start', 'slot')},
+            },
+        ),
+    ]
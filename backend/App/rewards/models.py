@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
 
@@ -103,6 +105,17 @@ class Reward(models.Model):
             return True
         return False
 
+    def estoque_disponivel(self):
+        """Estoque descontadas as reservas ativas (-1 para ilimitado)."""
+        if self.stock == -1:
+            return -1
+        reservadas = (
+            Reward.objects.filter(pk=self.pk)
+            .values_list(RewardReservation.contagem_ativas(), flat=True)
+            .get()
+        )
+        return max(0, self.stock - reservadas)
+
     def pode_ser_resgatada_por(self, usuario):
         """Verifica se a recompensa pode ser resgatada pelo usuário."""
         return (
@@ -116,6 +129,16 @@ class UserReward(models.Model):
     Registro de recompensas resgatadas pelos usuários.
     """
 
+    STATUS_PENDENTE = 'Pendente'
+    STATUS_ENTREGUE = 'Entregue'
+    STATUS_CANCELADO = 'Cancelado'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_ENTREGUE, 'Entregue'),
+        (STATUS_CANCELADO, 'Cancelado'),
+    ]
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -142,12 +165,8 @@ class UserReward(models.Model):
 
     status = models.CharField(
         max_length=20,
-        choices=[
-            ('Pendente', 'Pendente'),
-            ('Entregue', 'Entregue'),
-            ('Cancelado', 'Cancelado'),
-        ],
-        default='Pendente',
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDENTE,
         verbose_name="Status"
     )
 
@@ -167,25 +186,87 @@ class UserReward(models.Model):
 
     def esta_pendente(self):
         """Verifica se o resgate está pendente."""
-        return self.status == 'Pendente'
+        return self.status == self.STATUS_PENDENTE
 
     def esta_entregue(self):
         """Verifica se o resgate foi entregue."""
-        return self.status == 'Entregue'
+        return self.status == self.STATUS_ENTREGUE
 
     def marcar_como_entregue(self):
         """Marca o resgate como entregue."""
-        self.status = 'Entregue'
+        self.status = self.STATUS_ENTREGUE
         self.save()
 
-    def cancelar(self, motivo=""):
-        """Cancela o resgate e devolve os pontos ao usuário."""
-        if self.status != 'Cancelado':
-            self.status = 'Cancelado'
-            self.notes = f"Cancelado. {motivo}".strip()
-            # Devolve os pontos ao usuário
-            self.user.adicionar_pontos(self.points_spent)
-            self.save()
+    def cancelar(self, motivo="", devolver_estoque=False):
+        """Cancela o resgate e devolve os pontos ao usuário por crédito no TokenLedger."""
+        from App.rewards.servicos import CancelamentoService
+
+        if CancelamentoService().cancelar([self.pk], motivo, devolver_estoque):
+            self.refresh_from_db(fields=['status', 'notes'])
+            if self._meta.get_field('user').is_cached(self):
+                self.user.refresh_from_db(fields=['total_points'])
+
+
+class RewardReservation(models.Model):
+    """
+    Reserva temporária de uma unidade de recompensa (ex.: item no carrinho).
+    A reserva não altera Reward.stock: o estoque disponível é o estoque menos as
+    reservas ainda não expiradas, e reservas vencidas são removidas em lote.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='reward_reservations',
+        verbose_name="Usuário"
+    )
+
+    reward = models.ForeignKey(
+        Reward,
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        verbose_name="Recompensa"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    expires_at = models.DateTimeField(
+        verbose_name="Expira em",
+        help_text="Após esta data a unidade volta ao estoque disponível"
+    )
+
+    class Meta:
+        db_table = 'reward_reservations'
+        verbose_name = 'Reserva de Recompensa'
+        verbose_name_plural = 'Reservas de Recompensas'
+        indexes = [
+            # Contagem de reservas ativas por recompensa
+            models.Index(fields=['reward', 'expires_at']),
+            # Varredura das reservas vencidas
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.reward.name} (até {self.expires_at:%H:%M})"
+
+    @classmethod
+    def contagem_ativas(cls, agora=None):
+        """
+        Expressão com o número de reservas ativas da recompensa externa
+        (OuterRef('pk')), para anotar ou filtrar consultas de Reward.
+        """
+        from django.db.models import Count, OuterRef, Subquery
+        from django.db.models.functions import Coalesce
+        from django.utils import timezone
+
+        ativas = (
+            cls.objects.filter(reward=OuterRef('pk'), expires_at__gt=agora or timezone.now())
+            .order_by()
+            .values('reward')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(ativas), 0)
 
 
 class Goal(models.Model):
@@ -288,6 +369,22 @@ class Goal(models.Model):
         global_str = "Global" if self.is_global else "Individual"
         return f"{self.name} ({global_str}) - {self.target_value} {self.get_metric_display()}"
 
+    @classmethod
+    def calcular_inicio_periodo(cls, periodo, data):
+        """Primeiro dia do período (diário, semanal, mensal ou anual) que contém `data`."""
+        if periodo == cls.PERIOD_WEEKLY:
+            return data - timedelta(days=data.weekday())
+        if periodo == cls.PERIOD_MONTHLY:
+            return data.replace(day=1)
+        if periodo == cls.PERIOD_YEARLY:
+            return data.replace(month=1, day=1)
+        return data
+
+    def inicio_do_periodo(self, data=None):
+        """Primeiro dia do período atual da meta (ou do que contém `data`)."""
+        from django.utils import timezone
+        return self.calcular_inicio_periodo(self.period, data or timezone.localdate())
+
 
 class UserGoalProgress(models.Model):
     """
@@ -325,6 +422,13 @@ class UserGoalProgress(models.Model):
         verbose_name="Data de Conclusão"
     )
 
+    period_start = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Início do Período",
+        help_text="Período da meta a que o progresso se refere"
+    )
+
     updated_at = models.DateTimeField(
         auto_now=True,
         verbose_name="Última Atualização"
@@ -336,6 +440,9 @@ class UserGoalProgress(models.Model):
         verbose_name_plural = 'Progressos de Metas'
         unique_together = ['user', 'goal']
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['goal', 'period_start']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.goal.name}: {self.current_value}/{self.goal.target_value}"
@@ -369,3 +476,94 @@ class UserGoalProgress(models.Model):
             self.completed_at = timezone.now()
 
         self.save()
+
+
+class GoalProgressArchive(models.Model):
+    """
+    Progresso de um usuário em um período já encerrado de uma meta recorrente.
+    Preenchido pela virada de período, antes de zerar o UserGoalProgress.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='goal_progress_archive',
+        verbose_name="Usuário"
+    )
+
+    goal = models.ForeignKey(
+        Goal,
+        on_delete=models.CASCADE,
+        related_name='archived_progress',
+        verbose_name="Meta"
+    )
+
+    period_start = models.DateField(
+        verbose_name="Início do Período"
+    )
+
+    final_value = models.IntegerField(
+        verbose_name="Valor Final"
+    )
+
+    completed = models.BooleanField(
+        default=False,
+        verbose_name="Completada"
+    )
+
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Data de Conclusão"
+    )
+
+    archived_at = models.DateTimeField(
+        verbose_name="Arquivado em"
+    )
+
+    class Meta:
+        db_table = 'goal_progress_archive'
+        verbose_name = 'Histórico de Progresso de Meta'
+        verbose_name_plural = 'Históricos de Progresso de Metas'
+        unique_together = ['user', 'goal', 'period_start']
+        ordering = ['-period_start']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.goal.name} ({self.period_start}): {self.final_value}"
+
+
+class GoalCounterShard(models.Model):
+    """
+    Fatia do contador coletivo de uma meta global em um período. Cada escrita
+    soma em uma fatia sorteada, para que escritores concorrentes não disputem
+    a mesma linha; o total é a soma das fatias.
+    """
+
+    goal = models.ForeignKey(
+        Goal,
+        on_delete=models.CASCADE,
+        related_name='counter_shards',
+        verbose_name="Meta"
+    )
+
+    period_start = models.DateField(
+        verbose_name="Início do Período"
+    )
+
+    slot = models.PositiveSmallIntegerField(
+        verbose_name="Fatia"
+    )
+
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name="Valor"
+    )
+
+    class Meta:
+        db_table = 'goal_counter_shards'
+        verbose_name = 'Fatia de Contador de Meta'
+        verbose_name_plural = 'Fatias de Contadores de Metas'
+        unique_together = ['goal', 'period_start', 'slot']
+
+    def __str__(self):
+        return f"{self.goal.name} ({self.period_start}) #{self.slot}: {self.value}"
@@ -0,0 +1,11 @@
+class ResgateNegadoException(Exception):
+    """Exceção lançada quando um resgate de recompensa não pode ser feito."""
+
+    MOTIVO_INDISPONIVEL = 'indisponivel'
+    MOTIVO_SEM_ESTOQUE = 'sem_estoque'
+    MOTIVO_SALDO_INSUFICIENTE = 'saldo_insuficiente'
+    MOTIVO_RESERVA_EXPIRADA = 'reserva_expirada'
+
+    def __init__(self, mensagem: str, motivo: str):
+        super().__init__(mensagem)
+        self.motivo = motivo
@@ -0,0 +1,28 @@
+"""Modulo de servicos de recompensas."""
+
+from .cancelamento import CancelamentoService
+from .catalogo import Catalogo, RecompensaCatalogo, invalidar_catalogo, obter_catalogo
+from .contador_global import ContadorGlobalService
+from .progresso_metas import ProgressoMetasService, invalidar_indice, obter_indice
+from .reavaliacao_metas import ReavaliacaoMetasService
+from .ResgateNegadoException import ResgateNegadoException
+from .reserva import ReservaService
+from .resgate import ResgateService
+from .virada_periodo import ViradaPeriodoService
+
+__all__ = [
+    'CancelamentoService',
+    'Catalogo',
+    'RecompensaCatalogo',
+    'invalidar_catalogo',
+    'obter_catalogo',
+    'ContadorGlobalService',
+    'ProgressoMetasService',
+    'invalidar_indice',
+    'obter_indice',
+    'ReavaliacaoMetasService',
+    'ResgateNegadoException',
+    'ReservaService',
+    'ResgateService',
+    'ViradaPeriodoService',
+]
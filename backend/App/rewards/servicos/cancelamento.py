@@ -0,0 +1,84 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, QuerySet, When
+
+from App.rewards.models import Reward, UserReward
+from App.tokens.models import TokenLedger
+
+from .catalogo import invalidar_catalogo
+
+
+class CancelamentoService:
+    """
+    Cancela resgates em lote: um UPDATE por bloco de resgates, estornos lançados
+    no TokenLedger em lote (um UPDATE de saldo por usuário) e, opcionalmente, um
+    UPDATE de estoque por recompensa, tudo na mesma transação.
+    """
+
+    TAMANHO_BLOCO = 500
+
+    def cancelar(self, resgates, motivo="", devolver_estoque=False) -> int:
+        """
+        Cancela os resgates de `resgates` (queryset de UserReward ou lista de ids)
+        e devolve os pontos gastos. Resgates já cancelados são ignorados.
+        Retorna quantos foram cancelados.
+        """
+        if isinstance(resgates, QuerySet):
+            consultas = [resgates]
+        else:
+            ids = list(resgates)
+            consultas = [
+                UserReward.objects.filter(pk__in=ids[inicio:inicio + self.TAMANHO_BLOCO])
+                for inicio in range(0, len(ids), self.TAMANHO_BLOCO)
+            ]
+
+        notas = f"Cancelado. {motivo}".strip()
+        cancelados = 0
+        with transaction.atomic():
+            for consulta in consultas:
+                ativos = list(
+                    consulta.exclude(status=UserReward.STATUS_CANCELADO)
+                    .select_for_update(of=('self',))
+                    .order_by('pk')
+                    .values_list('pk', 'user_id', 'reward_id', 'points_spent')
+                )
+                for inicio in range(0, len(ativos), self.TAMANHO_BLOCO):
+                    bloco = ativos[inicio:inicio + self.TAMANHO_BLOCO]
+                    self._cancelar_bloco(bloco, notas, devolver_estoque)
+                    cancelados += len(bloco)
+        return cancelados
+
+    def _cancelar_bloco(self, ativos, notas, devolver_estoque):
+        """Marca um bloco de resgates já travados como cancelados e lança os estornos."""
+        UserReward.objects.filter(pk__in=[pk for pk, *_ in ativos]).update(
+            status=UserReward.STATUS_CANCELADO, notes=notas
+        )
+        TokenLedger.lancar_em_lote(
+            (
+                user_id,
+                pontos,
+                TokenLedger.TYPE_CREDIT,
+                TokenLedger.SOURCE_REWARD,
+                pk,
+                f"Estorno do resgate #{pk}",
+                # Um único estorno por resgate, mesmo com cancelamentos concorrentes
+                TokenLedger.gerar_chave_idempotencia('estorno', pk),
+            )
+            for pk, user_id, _, pontos in ativos
+        )
+        if devolver_estoque:
+            self._devolver_estoque(Counter(reward_id for _, _, reward_id, _ in ativos))
+
+    @staticmethod
+    def _devolver_estoque(unidades):
+        """
+        Devolve as unidades ({reward_id: quantidade}); estoque ilimitado não
+        muda. Recompensas esgotadas voltam ao catálogo.
+        """
+        reward_ids = sorted(unidades)
+        if Reward.objects.filter(pk__in=reward_ids).exclude(stock=-1).update(stock=Case(
+            *[When(pk=reward_id, then=F('stock') + unidades[reward_id]) for reward_id in reward_ids],
+            default=F('stock'),
+        )):
+            transaction.on_commit(invalidar_catalogo)
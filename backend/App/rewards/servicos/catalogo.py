@@ -0,0 +1,80 @@
+from bisect import bisect_right
+from typing import NamedTuple
+
+from App.versao import RetratoEmMemoria
+
+
+class RecompensaCatalogo(NamedTuple):
+    """
+    Valores de uma Reward no momento da carga do catálogo. É imutável: o
+    retrato é lido por todas as threads do processo, então não guarda as
+    instâncias do ORM, que qualquer uma delas poderia alterar ou salvar.
+    """
+
+    id: int
+    name: str
+    description: str
+    required_points: int
+    type: str
+    icon: object
+    stock: int
+
+
+class Catalogo(NamedTuple):
+    """
+    Retrato imutável das recompensas ativas e com estoque, ordenadas por
+    required_points.
+    `pontos` é a lista paralela de preços usada nas buscas binárias.
+    """
+
+    versao: object
+    recompensas: tuple
+    pontos: tuple
+
+    def acessiveis(self, saldo: int) -> tuple:
+        """Recompensas que o saldo já cobre (busca binária sobre os preços)."""
+        return self.recompensas[:bisect_right(self.pontos, saldo)]
+
+    def proximas(self, saldo: int, quantidade: int = 3) -> tuple:
+        """As `quantidade` recompensas mais baratas que o saldo ainda não cobre."""
+        inicio = bisect_right(self.pontos, saldo)
+        return self.recompensas[inicio:inicio + quantidade]
+
+
+def carregar_catalogo(versao=None) -> Catalogo:
+    """Carrega as recompensas ativas e não esgotadas do banco, já ordenadas por preço."""
+    from App.rewards.models import Reward
+
+    recompensas = tuple(
+        RecompensaCatalogo._make(linha)
+        for linha in Reward.objects.filter(is_active=True).exclude(stock=0)
+        .order_by('required_points', 'name').values_list(*RecompensaCatalogo._fields)
+    )
+    return Catalogo(
+        versao=versao,
+        recompensas=recompensas,
+        pontos=tuple(recompensa.required_points for recompensa in recompensas),
+    )
+
+
+# Com um cache compartilhado (CACHE_URL, ver Core/settings.py), alterações
+# feitas em outro worker aparecem neste processo em até um segundo; com o
+# LocMemCache padrão, só as do próprio processo são vistas
+_retrato = RetratoEmMemoria("rewards:catalogo:versao", carregar_catalogo)
+
+
+def obter_catalogo() -> Catalogo:
+    """
+    Catálogo em memória do processo, recarregado só quando a versão muda.
+
+    Recompensas esgotadas ficam de fora: o resgate que leva a última unidade
+    e o cancelamento que devolve estoque invalidam o catálogo. As demais
+    baixas do resgate (UPDATE direto) não o invalidam, e o resgate continua
+    sendo quem garante o estoque.
+    """
+    return _retrato.obter()
+
+
+def invalidar_catalogo() -> None:
+    """Faz todos os workers recarregarem o catálogo."""
+    _retrato.invalidar()
@@ -0,0 +1,113 @@
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+
+from App.rewards.models import Goal, GoalCounterShard
+
+
+class ContadorGlobalService:
+    """
+    Contador coletivo das metas globais (ex.: água economizada pela escola),
+    dividido em FATIAS linhas por meta e período. Cada incremento soma em uma
+    fatia sorteada, então escritas concorrentes raramente esperam pela mesma
+    linha. A leitura soma as fatias e guarda o total no cache por TTL_TOTAL
+    segundos; `compactar` junta periodicamente as fatias na fatia 0.
+    """
+
+    FATIAS = 16
+    TTL_TOTAL = 5
+    PREFIXO_CACHE = "rewards:contador_meta"
+
+    def __init__(self, fatias=None, sortear=random.randrange):
+        self.fatias = fatias or self.FATIAS
+        self._sortear = sortear
+
+    def incrementar(self, goal_id, period_start, valor) -> None:
+        """Soma `valor` ao contador da meta no período, em uma fatia sorteada."""
+        if not valor:
+            return
+        slot = self._sortear(self.fatias)
+        fatia = GoalCounterShard.objects.filter(goal_id=goal_id, period_start=period_start, slot=slot)
+        if fatia.update(value=F('value') + valor):
+            return
+        # Primeira escrita nesta fatia: cria a linha (ou aceita a criada por outro) e soma
+        GoalCounterShard.objects.bulk_create(
+            [GoalCounterShard(goal_id=goal_id, period_start=period_start, slot=slot)],
+            ignore_conflicts=True,
+        )
+        fatia.update(value=F('value') + valor)
+
+    def total(self, meta, data=None, usar_cache=True) -> int:
+        """Total coletivo da meta no período atual (ou no que contém `data`)."""
+        period_start = meta.inicio_do_periodo(data)
+        chave = self._chave(meta.pk, period_start)
+        if usar_cache:
+            total = cache.get(chave)
+            if total is not None:
+                return total
+        total = GoalCounterShard.objects.filter(
+            goal_id=meta.pk, period_start=period_start
+        ).aggregate(total=Sum('value'))['total'] or 0
+        cache.set(chave, total, timeout=self.TTL_TOTAL)
+        return total
+
+    def travar(self, goal_id, period_start) -> int:
+        """
+        Trava a meta e as fatias dela no período até o fim da transação atual
+        e retorna a soma das fatias. Incrementos concorrentes esperam o commit:
+        os das fatias existentes pela trava da fatia, e os que criariam uma
+        fatia nova pela trava da meta (a chave estrangeira da fatia a
+        referencia).
+        """
+        list(Goal.objects.select_for_update().filter(pk=goal_id).values_list('pk', flat=True))
+        return sum(
+            GoalCounterShard.objects.select_for_update()
+            .filter(goal_id=goal_id, period_start=period_start)
+            .order_by('slot')
+            .values_list('value', flat=True)
+        )
+
+    def redefinir(self, goal_id, period_start, valor) -> None:
+        """
+        Troca as fatias da meta no período por uma única fatia com `valor`.
+        Quem calcula `valor` a partir da origem deve chamar `travar` antes, na
+        mesma transação, para que nenhum incremento caia entre a leitura e a
+        troca.
+        """
+        with transaction.atomic():
+            GoalCounterShard.objects.filter(goal_id=goal_id, period_start=period_start).delete()
+            GoalCounterShard.objects.create(goal_id=goal_id, period_start=period_start, slot=0, value=valor)
+        transaction.on_commit(lambda: cache.delete(self._chave(goal_id, period_start)))
+
+    def _chave(self, goal_id, period_start) -> str:
+        return f"{self.PREFIXO_CACHE}:{goal_id}:{period_start.isoformat()}"
+
+    def compactar(self, goal_ids=None) -> int:
+        """
+        Junta as fatias de cada meta e período na fatia 0, uma transação curta
+        por contador. Retorna quantas fatias foram removidas.
+        """
+        contadores = GoalCounterShard.objects.filter(slot__gt=0)
+        if goal_ids is not None:
+            contadores = contadores.filter(goal_id__in=goal_ids)
+
+        removidas = 0
+        for goal_id, period_start in contadores.order_by().values_list('goal_id', 'period_start').distinct():
+            with transaction.atomic():
+                fatias = list(
+                    GoalCounterShard.objects.select_for_update()
+                    .filter(goal_id=goal_id, period_start=period_start, slot__gt=0)
+                    .values_list('pk', 'value')
+                )
+                if not fatias:
+                    continue
+                soma = sum(valor for _, valor in fatias)
+                removidas += GoalCounterShard.objects.filter(pk__in=[pk for pk, _ in fatias]).delete()[0]
+                principal = GoalCounterShard.objects.filter(goal_id=goal_id, period_start=period_start, slot=0)
+                if not principal.update(value=F('value') + soma):
+                    GoalCounterShard.objects.create(
+                        goal_id=goal_id, period_start=period_start, slot=0, value=soma
+                    )
+        return removidas
@@ -0,0 +1,189 @@
+from collections import defaultdict
+from datetime import timedelta
+from types import MappingProxyType
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from App.rewards.models import Goal, UserGoalProgress
+from App.versao import RetratoEmMemoria
+
+from .contador_global import ContadorGlobalService
+from .virada_periodo import ViradaPeriodoService
+
+
+class MetaIndexada(NamedTuple):
+    """Dados de uma meta ativa necessários para rotear eventos."""
+
+    id: int
+    is_global: bool
+    period: str
+    start_date: object
+    end_date: object
+
+    def vigente(self, data) -> bool:
+        return (self.start_date is None or self.start_date <= data) and (
+            self.end_date is None or data <= self.end_date
+        )
+
+
+def carregar_indice(versao=None):
+    """Índice {métrica: (metas ativas...)} montado com uma única consulta."""
+    indice = defaultdict(list)
+    for goal_id, metrica, is_global, periodo, inicio, fim in Goal.objects.filter(
+        is_active=True
+    ).order_by('pk').values_list('id', 'metric', 'is_global', 'period', 'start_date', 'end_date'):
+        indice[metrica].append(MetaIndexada(goal_id, is_global, periodo, inicio, fim))
+    return MappingProxyType({metrica: tuple(metas) for metrica, metas in indice.items()})
+
+
+_indice = RetratoEmMemoria("rewards:indice_metas:versao", carregar_indice)
+
+
+def obter_indice():
+    """Índice métrica → metas, em memória e recarregado quando as metas mudam."""
+    return _indice.obter()
+
+
+def invalidar_indice() -> None:
+    """Faz todos os workers recarregarem o índice de metas."""
+    _indice.invalidar()
+
+
+class ProgressoMetasService:
+    """
+    Atualiza o progresso das metas a partir de eventos (lançamentos no
+    TokenLedger, aprovações de ações e contas registradas).
+
+    Cada evento vira um incremento por (usuário, métrica); o índice em memória
+    diz quais metas usam a métrica, e o progresso é somado no banco com
+    F-expressions, um UPDATE por bloco de usuários. Metas globais ganham a
+    linha de progresso do usuário no primeiro evento, e o total coletivo delas
+    vai para o contador fatiado (ContadorGlobalService). As conclusões são
+    marcadas por outro UPDATE, sem carregar as linhas de progresso.
+    """
+
+    USUARIOS_POR_UPDATE = 300
+    LITROS_POR_M3 = 1000
+
+    def registrar(self, incrementos, data=None) -> int:
+        """
+        Aplica `incrementos` ({(user_id, metrica): valor}) às metas vigentes em
+        `data` (padrão: hoje). Retorna quantas linhas de progresso mudaram.
+        """
+        por_metrica = defaultdict(dict)
+        for (user_id, metrica), valor in incrementos.items():
+            if valor:
+                por_metrica[metrica][user_id] = valor
+        if not por_metrica:
+            return 0
+
+        data = data or timezone.localdate()
+        indice = obter_indice()
+        afetadas = []
+        for metrica, valores in por_metrica.items():
+            metas = [meta for meta in indice.get(metrica, ()) if meta.vigente(data)]
+            if metas:
+                afetadas.append((metas, valores))
+        if not afetadas:
+            return 0
+
+        agora = timezone.now()
+        with transaction.atomic():
+            return sum(self._aplicar(metas, valores, data, agora) for metas, valores in afetadas)
+
+    def _aplicar(self, metas, valores, data, agora) -> int:
+        periodos = {}
+        for meta in metas:
+            inicio = Goal.calcular_inicio_periodo(meta.period, data)
+            periodos[meta.id] = (inicio, Goal.calcular_inicio_periodo(meta.period, inicio - timedelta(days=1)))
+        globais = {meta.id: periodos[meta.id][0] for meta in metas if meta.is_global}
+        if globais:
+            # O índice pode estar até um segundo atrasado em relação a metas excluídas
+            globais = {
+                goal_id: globais[goal_id]
+                for goal_id in Goal.objects.filter(pk__in=globais).values_list('pk', flat=True)
+            }
+            contador = ContadorGlobalService()
+            soma = sum(valores.values())
+            for goal_id, period_start in globais.items():
+                contador.incrementar(goal_id, period_start, soma)
+
+        # Linhas de um período encerrado cuja virada ainda não rodou são
+        # arquivadas e zeradas aqui, para o evento contar no período novo
+        expirado = ViradaPeriodoService.expirado(periodos)
+        user_ids = sorted(valores)  # ordem fixa de travamento evita deadlocks
+        atualizadas = 0
+        for comeco in range(0, len(user_ids), self.USUARIOS_POR_UPDATE):
+            bloco = user_ids[comeco:comeco + self.USUARIOS_POR_UPDATE]
+            if globais:
+                UserGoalProgress.objects.bulk_create(
+                    [UserGoalProgress(user_id=user_id, goal_id=goal_id, period_start=period_start)
+                     for goal_id, period_start in globais.items() for user_id in bloco],
+                    ignore_conflicts=True,
+                )
+            ViradaPeriodoService.arquivar_usuarios(periodos, bloco, agora)
+            progresso = UserGoalProgress.objects.filter(goal_id__in=periodos, user_id__in=bloco)
+            atualizadas += progresso.update(
+                current_value=Case(
+                    When(expirado, then=Value(0)), default=F('current_value'), output_field=IntegerField()
+                ) + Case(
+                    *[When(user_id=user_id, then=Value(valores[user_id])) for user_id in bloco],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+                completed=Case(When(expirado, then=Value(False)), default=F('completed')),
+                completed_at=Case(When(expirado, then=Value(None)), default=F('completed_at')),
+                period_start=Case(
+                    *[When(goal_id=goal_id, then=Value(inicio)) for goal_id, (inicio, _) in periodos.items()],
+                    default=F('period_start'),
+                ),
+                updated_at=agora,
+            )
+            progresso.filter(
+                completed=False, current_value__gte=F('goal__target_value')
+            ).update(completed=True, completed_at=agora)
+        return atualizadas
+
+    def processar_lancamentos(self, transacoes) -> int:
+        return self.registrar(self.incrementos_dos_lancamentos(transacoes))
+
+    @staticmethod
+    def incrementos_dos_lancamentos(transacoes) -> dict:
+        """Créditos ganhos (não estornos de resgate) contam na métrica de pontos."""
+        from App.tokens.models import TokenLedger
+
+        incrementos = defaultdict(int)
+        for transacao in transacoes:
+            if transacao.type == TokenLedger.TYPE_CREDIT and transacao.source != TokenLedger.SOURCE_REWARD:
+                incrementos[(transacao.user_id, Goal.METRIC_POINTS)] += transacao.amount
+        return incrementos
+
+    def processar_aprovacoes(self, aprovacoes) -> int:
+        return self.registrar(self.incrementos_das_aprovacoes(aprovacoes))
+
+    @staticmethod
+    def incrementos_das_aprovacoes(aprovacoes) -> dict:
+        """Cada ação aprovada conta uma unidade na métrica de quantidade de ações."""
+        incrementos = defaultdict(int)
+        for _, user_id, _ in aprovacoes:
+            incrementos[(user_id, Goal.METRIC_ACTION_COUNT)] += 1
+        return incrementos
+
+    def processar_contas(self, contas) -> int:
+        """A economia de cada conta em relação ao mês anterior conta na métrica do seu tipo."""
+        from App.actions.models import BillRecord
+
+        metricas = {
+            BillRecord.BILL_TYPE_WATER: (Goal.METRIC_WATER_SAVE, self.LITROS_POR_M3),
+            BillRecord.BILL_TYPE_ENERGY: (Goal.METRIC_ENERGY_SAVE, 1),
+        }
+        incrementos = defaultdict(int)
+        indice = obter_indice()
+        for conta in contas:
+            metrica, fator = metricas[conta.type]
+            if metrica in indice:
+                incrementos[(conta.user_id, metrica)] += int(conta.calcular_economia() * fator)
+        return self.registrar(incrementos)
@@ -0,0 +1,152 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from App.rewards.models import Goal, UserGoalProgress
+
+from .contador_global import ContadorGlobalService
+from .progresso_metas import ProgressoMetasService
+
+
+class ReavaliacaoMetasService:
+    """
+    Recalcula do zero o progresso de uma meta no período atual, para quando ela
+    é criada ou editada no meio do período.
+
+    O valor de cada usuário sai de uma única consulta agrupada sobre a origem
+    da métrica (ações aprovadas, créditos no TokenLedger ou economia das
+    contas), com os mesmos critérios do ProgressoMetasService. O resultado é
+    gravado com INSERT ... ON CONFLICT em lotes e as conclusões são
+    reconciliadas com dois UPDATEs.
+    """
+
+    TAMANHO_LOTE = 1000
+
+    def reavaliar(self, meta, data=None) -> int:
+        """
+        Reavalia `meta` (instância ou id) no período que contém `data` (padrão:
+        hoje). Retorna quantos usuários ficaram com progresso diferente de zero.
+        """
+        if not isinstance(meta, Goal):
+            meta = Goal.objects.get(pk=meta)
+        data = data or timezone.localdate()
+        inicio = meta.inicio_do_periodo(data)
+
+        contador = ContadorGlobalService()
+        agora = timezone.now()
+        progresso = UserGoalProgress.objects.filter(goal=meta)
+
+        with transaction.atomic():
+            if meta.is_global:
+                # Incrementos que chegarem durante a agregação esperam a troca
+                # do contador e somam depois dela, em vez de serem sobrescritos
+                contador.travar(meta.pk, inicio)
+            valores = dict(self.agregar(meta, *self._janela(meta, inicio)))
+            progresso.update(current_value=0, period_start=inicio, updated_at=agora)
+            if not meta.is_global:
+                # Metas individuais só valem para quem já participa
+                participantes = set(progresso.values_list('user_id', flat=True))
+                valores = {user_id: valor for user_id, valor in valores.items() if user_id in participantes}
+            UserGoalProgress.objects.bulk_create(
+                [UserGoalProgress(user_id=user_id, goal=meta, current_value=valor,
+                                  period_start=inicio, updated_at=agora)
+                 for user_id, valor in valores.items()],
+                batch_size=self.TAMANHO_LOTE,
+                update_conflicts=True,
+                unique_fields=['user', 'goal'],
+                update_fields=['current_value', 'period_start', 'updated_at'],
+            )
+            # A meta pode ter mudado de alvo: conclui e reabre conforme o novo valor
+            progresso.filter(completed=False, current_value__gte=meta.target_value).update(
+                completed=True, completed_at=agora
+            )
+            progresso.filter(completed=True, current_value__lt=meta.target_value).update(
+                completed=False, completed_at=None
+            )
+            if meta.is_global:
+                contador.redefinir(meta.pk, inicio, sum(valores.values()))
+        return len(valores)
+
+    @staticmethod
+    def _janela(meta, inicio):
+        """Intervalo [de, ate) dos eventos que contam: o período cortado pela vigência."""
+        de = max(inicio, meta.start_date) if meta.start_date else inicio
+        de = timezone.make_aware(datetime.combine(de, time.min))
+        ate = None
+        if meta.end_date:
+            ate = timezone.make_aware(datetime.combine(meta.end_date + timedelta(days=1), time.min))
+        return de, ate
+
+    def agregar(self, meta, de, ate=None):
+        """Consulta agrupada (user_id, valor) da métrica da meta entre `de` e `ate`."""
+        agregadores = {
+            Goal.METRIC_ACTION_COUNT: self._acoes_aprovadas,
+            Goal.METRIC_POINTS: self._pontos,
+            Goal.METRIC_WATER_SAVE: self._economia_agua,
+            Goal.METRIC_ENERGY_SAVE: self._economia_energia,
+        }
+        return agregadores[meta.metric](de, ate)
+
+    @staticmethod
+    def _no_intervalo(consulta, campo, de, ate):
+        consulta = consulta.filter(**{f'{campo}__gte': de})
+        return consulta.filter(**{f'{campo}__lt': ate}) if ate else consulta
+
+    def _acoes_aprovadas(self, de, ate):
+        from App.actions.models import UserAction
+
+        acoes = UserAction.objects.filter(status=UserAction.STATUS_APROVADA)
+        return self._no_intervalo(acoes, 'approved_at', de, ate).order_by().values('user_id').annotate(
+            valor=Count('pk')
+        ).values_list('user_id', 'valor')
+
+    def _pontos(self, de, ate):
+        from App.tokens.models import TokenLedger
+
+        creditos = TokenLedger.objects.filter(type=TokenLedger.TYPE_CREDIT).exclude(
+            source=TokenLedger.SOURCE_REWARD
+        )
+        return self._no_intervalo(creditos, 'date', de, ate).order_by().values('user_id').annotate(
+            valor=Sum('amount')
+        ).values_list('user_id', 'valor')
+
+    def _economia_agua(self, de, ate):
+        from App.actions.models import BillRecord
+
+        return self._economia(BillRecord.BILL_TYPE_WATER, ProgressoMetasService.LITROS_POR_M3, de, ate)
+
+    def _economia_energia(self, de, ate):
+        from App.actions.models import BillRecord
+
+        return self._economia(BillRecord.BILL_TYPE_ENERGY, 1, de, ate)
+
+    def _economia(self, tipo, fator, de, ate):
+        """
+        Soma, por usuário, a economia de cada conta registrada no intervalo em
+        relação à conta do mês anterior (subconsulta correlacionada).
+        """
+        from App.actions.models import BillRecord
+
+        anterior = BillRecord.objects.annotate(
+            ordinal=F('year') * 12 + F('month')
+        ).filter(
+            user_id=OuterRef('user_id'),
+            type=tipo,
+            ordinal=OuterRef('year') * 12 + OuterRef('month') - 1,
+        ).values('consumption_value')[:1]
+        decimal = DecimalField(max_digits=12, decimal_places=2)
+        economia = Greatest(
+            Coalesce(Subquery(anterior), F('consumption_value')) - F('consumption_value'),
+            Value(0, output_field=decimal),
+            output_field=decimal,
+        )
+        contas = self._no_intervalo(BillRecord.objects.filter(type=tipo), 'created_at', de, ate)
+        for user_id, valor in contas.order_by().values('user_id').annotate(
+            valor=Sum(economia)
+        ).values_list('user_id', 'valor'):
+            valor = int(valor * fator)
+            if valor:
+                yield user_id, valor
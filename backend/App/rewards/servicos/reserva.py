@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from App.rewards.models import Reward, RewardReservation
+
+from .ResgateNegadoException import ResgateNegadoException
+
+
+class ReservaService:
+    """
+    Reservas temporárias de estoque. Reservar é um INSERT curto: a linha da
+    recompensa só fica travada durante a verificação do estoque disponível,
+    nunca durante o tempo da reserva. Reservas vencidas deixam de contar no
+    mesmo instante e são removidas depois, em lotes, por `liberar_expiradas`.
+    """
+
+    MINUTOS_RESERVA = 10
+    TAMANHO_LOTE = 500
+
+    def reservar(self, usuario, recompensa, minutos=None) -> RewardReservation:
+        """
+        Reserva uma unidade de `recompensa` (instância ou id) para `usuario`.
+        Lança ResgateNegadoException se a recompensa estiver inativa ou sem
+        unidades livres.
+        """
+        user_id = getattr(usuario, 'pk', usuario)
+        reward_id = getattr(recompensa, 'pk', recompensa)
+        agora = timezone.now()
+
+        with transaction.atomic():
+            disponivel = (
+                Reward.objects.select_for_update()
+                .filter(pk=reward_id, is_active=True)
+                .values_list(self.expressao_disponivel(agora), flat=True)
+                .first()
+            )
+            if disponivel is None:
+                raise ResgateNegadoException(
+                    "Recompensa indisponível.", ResgateNegadoException.MOTIVO_INDISPONIVEL
+                )
+            if disponivel == 0:
+                raise ResgateNegadoException(
+                    "Recompensa sem estoque.", ResgateNegadoException.MOTIVO_SEM_ESTOQUE
+                )
+            return RewardReservation.objects.create(
+                user_id=user_id,
+                reward_id=reward_id,
+                expires_at=agora + timedelta(minutes=minutos or self.MINUTOS_RESERVA),
+            )
+
+    def cancelar(self, reserva) -> bool:
+        """Cancela a reserva antes de expirar; retorna False se ela já não existia."""
+        return RewardReservation.objects.filter(pk=getattr(reserva, 'pk', reserva)).delete()[0] > 0
+
+    def liberar_expiradas(self, tamanho_lote=None, agora=None) -> int:
+        """
+        Remove as reservas vencidas em lotes (cada lote é uma transação curta,
+        guiada pelo índice de expires_at) e retorna quantas foram removidas.
+        """
+        tamanho_lote = tamanho_lote or self.TAMANHO_LOTE
+        agora = agora or timezone.now()
+        removidas = 0
+        while True:
+            ids = list(
+                RewardReservation.objects.filter(expires_at__lte=agora)
+                .order_by('expires_at')
+                .values_list('pk', flat=True)[:tamanho_lote]
+            )
+            if not ids:
+                return removidas
+            removidas += RewardReservation.objects.filter(pk__in=ids).delete()[0]
+
+    def estoque_disponivel(self, recompensas=None, agora=None) -> dict:
+        """
+        Retorna {reward_id: estoque disponível} (-1 para ilimitado), com as
+        reservas ativas descontadas numa única consulta agregada.
+        """
+        consulta = Reward.objects.all() if recompensas is None else recompensas
+        return dict(
+            consulta.order_by().values_list('pk', self.expressao_disponivel(agora))
+        )
+
+    @staticmethod
+    def expressao_disponivel(agora=None):
+        """Expressão do estoque disponível de cada Reward (-1 para ilimitado)."""
+        return Case(
+            When(stock=-1, then=-1),
+            default=Greatest(F('stock') - RewardReservation.contagem_ativas(agora), 0),
+        )
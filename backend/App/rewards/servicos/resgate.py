@@ -0,0 +1,114 @@
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from App.logs import obter_logger, registrar_evento
+from App.rewards.models import Reward, RewardReservation, UserReward
+from App.tokens.models import TokenLedger
+
+from .ResgateNegadoException import ResgateNegadoException
+from .catalogo import invalidar_catalogo
+
+logger = obter_logger("recompensas.resgate")
+
+
+class ResgateService:
+    """
+    Resgata recompensas em uma única transação, sem ler-alterar-gravar em Python:
+    o débito do saldo e a baixa do estoque são UPDATEs condicionais (só afetam a
+    linha se ainda houver saldo/estoque), seguidos da inserção do UserReward e
+    do débito no TokenLedger. Se qualquer passo falhar, nada é gravado.
+    """
+
+    def resgatar(self, usuario, recompensa, reserva=None) -> UserReward:
+        """
+        Resgata `recompensa` para `usuario` (instâncias ou ids).
+        Com `reserva`, usa a unidade reservada pelo usuário; sem ela, só resgata
+        unidades que não estejam reservadas por outros.
+        Lança ResgateNegadoException se a recompensa estiver inativa, sem estoque,
+        se a reserva tiver expirado ou se o saldo não cobrir o preço.
+        """
+        user_id = getattr(usuario, 'pk', usuario)
+        reward_id = getattr(recompensa, 'pk', recompensa)
+
+        agora = timezone.now()
+
+        with transaction.atomic():
+            preco = (
+                Reward.objects.filter(pk=reward_id, is_active=True)
+                .values_list('required_points', flat=True).first()
+            )
+            if preco is None:
+                raise ResgateNegadoException(
+                    "Recompensa indisponível.", ResgateNegadoException.MOTIVO_INDISPONIVEL
+                )
+
+            if reserva is not None and not self._consumir_reserva(reserva, user_id, reward_id, agora):
+                raise ResgateNegadoException(
+                    "Reserva expirada.", ResgateNegadoException.MOTIVO_RESERVA_EXPIRADA
+                )
+
+            # Usuário antes da recompensa: mesma ordem de travamento em todo resgate
+            saldo = TokenLedger.debitar_se_suficiente(user_id, preco)
+            if saldo is None:
+                raise ResgateNegadoException(
+                    "Saldo de tokens insuficiente.", ResgateNegadoException.MOTIVO_SALDO_INSUFICIENTE
+                )
+
+            if not self._baixar_estoque(reward_id, agora):
+                # Desfaz o débito junto com a transação
+                raise ResgateNegadoException(
+                    "Recompensa sem estoque.", ResgateNegadoException.MOTIVO_SEM_ESTOQUE
+                )
+
+            resgate = UserReward.objects.create(
+                user_id=user_id, reward_id=reward_id, points_spent=preco
+            )
+            # bulk_create não passa por TokenLedger.save(), que debitaria de novo
+            debito = TokenLedger(
+                user_id=user_id,
+                amount=preco,
+                type=TokenLedger.TYPE_DEBIT,
+                source=TokenLedger.SOURCE_REWARD,
+                reference_id=resgate.pk,
+                description=f"Troca por recompensa #{reward_id}",
+                balance_after=saldo,
+            )
+            TokenLedger.objects.bulk_create([debito])
+            TokenLedger.notificar([debito])
+
+        if isinstance(usuario, models.Model):
+            usuario.total_points = saldo
+        registrar_evento(
+            logger, "recompensa.resgatada",
+            "[Resgate] Usuário #%s resgatou a recompensa #%s por %s tokens.", user_id, reward_id, preco,
+            usuario=user_id, recompensa=reward_id, pontos=preco, saldo=saldo,
+        )
+        return resgate
+
+    @staticmethod
+    def _consumir_reserva(reserva, user_id, reward_id, agora) -> bool:
+        """Remove a reserva ativa do usuário, liberando a unidade para este resgate."""
+        return RewardReservation.objects.filter(
+            pk=getattr(reserva, 'pk', reserva),
+            user_id=user_id,
+            reward_id=reward_id,
+            expires_at__gt=agora,
+        ).delete()[0] > 0
+
+    @staticmethod
+    def _baixar_estoque(reward_id, agora) -> bool:
+        """
+        Decrementa o estoque se houver unidades não reservadas; recompensas
+        ilimitadas (-1) não são regravadas, para não disputar a linha em
+        campanhas concorridas. Esgotar a recompensa invalida o catálogo.
+        """
+        ativas = Reward.objects.filter(pk=reward_id, is_active=True)
+        if ativas.filter(stock__gt=RewardReservation.contagem_ativas(agora)).update(
+            stock=F('stock') - 1
+        ):
+            if ativas.filter(stock=0).exists():
+                # Última unidade: a recompensa sai do catálogo
+                transaction.on_commit(invalidar_catalogo)
+            return True
+        return ativas.filter(stock=-1).exists()
@@ -0,0 +1,172 @@
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from App.rewards.models import Goal, GoalProgressArchive, UserGoalProgress
+
+
+class ViradaPeriodoService:
+    """
+    Vira o período das metas recorrentes: o progresso de períodos encerrados é
+    copiado para GoalProgressArchive (INSERT ... SELECT) e zerado com um UPDATE,
+    em faixas de ids, cada faixa na sua própria transação.
+
+    A virada é retomável: linhas já viradas ficam com period_start no período
+    atual e deixam de ser selecionadas, então uma execução interrompida pode
+    simplesmente ser repetida.
+    """
+
+    TAMANHO_LOTE = 20000
+
+    def virar(self, data=None, periodos=None, tamanho_lote=None, ao_concluir_lote=None) -> dict:
+        """
+        Vira todas as metas ativas (ou só as dos `periodos` informados) para o
+        período que contém `data` (padrão: hoje). `ao_concluir_lote(goal_id,
+        linhas)` é chamado a cada faixa processada. Retorna {goal_id: linhas viradas}.
+        """
+        data = data or timezone.localdate()
+        metas = Goal.objects.filter(is_active=True)
+        if periodos:
+            metas = metas.filter(period__in=periodos)
+
+        viradas = {}
+        for goal_id, periodo in metas.order_by('pk').values_list('pk', 'period'):
+            inicio = Goal.calcular_inicio_periodo(periodo, data)
+            anterior = Goal.calcular_inicio_periodo(periodo, inicio - timedelta(days=1))
+            viradas[goal_id] = self.virar_meta(
+                goal_id, inicio, anterior, tamanho_lote or self.TAMANHO_LOTE, ao_concluir_lote
+            )
+        return viradas
+
+    def virar_meta(self, goal_id, inicio, anterior, tamanho_lote, ao_concluir_lote=None) -> int:
+        """
+        Arquiva e zera o progresso da meta anterior a `inicio`. Linhas sem
+        period_start (criadas antes desta coluna) são consideradas do período
+        `anterior` quando não foram atualizadas no período atual.
+        """
+        inicio_em = timezone.make_aware(datetime.combine(inicio, time.min))
+        expirando = Q(period_start__lt=inicio) | Q(period_start__isnull=True, updated_at__lt=inicio_em)
+        progresso = UserGoalProgress.objects.filter(goal_id=goal_id)
+
+        viradas = 0
+        ultimo = 0
+        while True:
+            # Limite da faixa pelo índice de goal_id, sem ordenar a tabela inteira
+            limite = list(
+                progresso.filter(pk__gt=ultimo).order_by('pk')
+                .values_list('pk', flat=True)[tamanho_lote - 1:tamanho_lote]
+            )
+            faixa = progresso.filter(pk__gt=ultimo)
+            if limite:
+                faixa = faixa.filter(pk__lte=limite[0])
+
+            agora = timezone.now()
+            with transaction.atomic():
+                self._arquivar({goal_id: (inicio, anterior)}, agora,
+                               ultimo=ultimo, limite=limite[0] if limite else None)
+                linhas = faixa.filter(expirando).update(
+                    current_value=0,
+                    completed=False,
+                    completed_at=None,
+                    period_start=inicio,
+                    updated_at=agora,
+                )
+            viradas += linhas
+            if ao_concluir_lote and linhas:
+                ao_concluir_lote(goal_id, linhas)
+            if not limite:
+                return viradas
+            ultimo = limite[0]
+
+    @staticmethod
+    def expirado(periodos) -> Q:
+        """
+        Condição das linhas de progresso de períodos já encerrados, para
+        `periodos` = {goal_id: (inicio, anterior)}, com a mesma regra de
+        `virar_meta` para linhas sem period_start.
+        """
+        condicao = Q(pk__in=[])
+        for goal_id, (inicio, _) in periodos.items():
+            inicio_em = timezone.make_aware(datetime.combine(inicio, time.min))
+            condicao |= Q(goal_id=goal_id) & (
+                Q(period_start__lt=inicio) | Q(period_start__isnull=True, updated_at__lt=inicio_em)
+            )
+        return condicao
+
+    @staticmethod
+    def arquivar_usuarios(periodos, user_ids, agora) -> None:
+        """
+        Copia para o histórico o progresso de períodos encerrados de
+        `user_ids` nas metas de `periodos` ({goal_id: (inicio, anterior)}),
+        antes que um evento do período novo o zere. Usado quando um evento
+        chega entre a troca de período e a execução da virada.
+        """
+        ViradaPeriodoService._arquivar(periodos, agora, user_ids=user_ids)
+
+    # Colunas do histórico que não têm o mesmo nome no progresso
+    ORIGEM_DO_HISTORICO = {'final_value': 'current_value'}
+
+    @staticmethod
+    def _arquivar(periodos, agora, ultimo=None, limite=None, user_ids=None) -> None:
+        """
+        Copia para o histórico, num único INSERT ... SELECT, o progresso com
+        algum valor de períodos encerrados nas metas de `periodos`
+        ({goal_id: (inicio, anterior)}), só na faixa de ids (`ultimo`,
+        `limite`] ou só dos `user_ids`. As colunas vêm do _meta dos dois
+        modelos. Linhas sem period_start vão para o período `anterior`.
+        Repetir a cópia não duplica o histórico (ON CONFLICT DO NOTHING sobre
+        user, goal e período).
+        """
+        ops = connection.ops
+        coluna = {campo.name: ops.quote_name(campo.column) for campo in UserGoalProgress._meta.concrete_fields}
+        id_progresso = ops.quote_name(UserGoalProgress._meta.pk.column)
+
+        anteriores = ' '.join(['WHEN %s THEN %s'] * len(periodos))
+        origem = {
+            'period_start': (
+                f"COALESCE({coluna['period_start']}, CASE {coluna['goal']} {anteriores} END)",
+                [parametro for goal_id, (_, anterior) in periodos.items()
+                 for parametro in (goal_id, ops.adapt_datefield_value(anterior))],
+            ),
+            'archived_at': ('%s', [ops.adapt_datetimefield_value(agora)]),
+        }
+        colunas, valores, parametros = [], [], []
+        for campo in GoalProgressArchive._meta.concrete_fields:
+            if campo.primary_key:
+                continue
+            nome = ViradaPeriodoService.ORIGEM_DO_HISTORICO.get(campo.name, campo.name)
+            valor, extras = origem[campo.name] if campo.name in origem else (coluna[nome], [])
+            colunas.append(ops.quote_name(campo.column))
+            valores.append(valor)
+            parametros += extras
+
+        condicoes = []
+        for goal_id, (inicio, _) in periodos.items():
+            inicio_em = timezone.make_aware(datetime.combine(inicio, time.min))
+            condicoes.append(
+                f"({coluna['goal']} = %s AND ({coluna['period_start']} < %s"
+                f" OR ({coluna['period_start']} IS NULL AND {coluna['updated_at']} < %s)))"
+            )
+            parametros += [goal_id, ops.adapt_datefield_value(inicio), ops.adapt_datetimefield_value(inicio_em)]
+        filtros = [f"({' OR '.join(condicoes)})", f"({coluna['current_value']} <> 0 OR {coluna['completed']})"]
+        if ultimo is not None:
+            filtros.append(f"{id_progresso} > %s")
+            parametros.append(ultimo)
+        if limite is not None:
+            filtros.append(f"{id_progresso} <= %s")
+            parametros.append(limite)
+        if user_ids is not None:
+            filtros.append(f"{coluna['user']} IN ({', '.join(['%s'] * len(user_ids))})")
+            parametros += user_ids
+
+        sql = f"""
+            INSERT INTO {ops.quote_name(GoalProgressArchive._meta.db_table)} ({', '.join(colunas)})
+            SELECT {', '.join(valores)}
+            FROM {ops.quote_name(UserGoalProgress._meta.db_table)}
+            WHERE {' AND '.join(filtros)}
+            ON CONFLICT DO NOTHING
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from App.actions.signals import acoes_aprovadas, contas_importadas
+from App.fila import FilaAgregada
+from App.tokens.signals import lancamentos_registrados
+
+from .servicos.catalogo import invalidar_catalogo
+from .servicos.progresso_metas import ProgressoMetasService, invalidar_indice
+from .servicos.reavaliacao_metas import ReavaliacaoMetasService
+
+
+@receiver(post_save, sender='rewards.Reward')
+@receiver(post_delete, sender='rewards.Reward')
+def invalidar_catalogo_recompensas(sender, **kwargs):
+    """Alterações em Reward invalidam o catálogo em memória."""
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender='rewards.Goal')
+@receiver(post_delete, sender='rewards.Goal')
+def invalidar_indice_metas(sender, **kwargs):
+    """Alterações em Goal invalidam o índice métrica → metas."""
+    invalidar_indice()
+
+
+# Campos da meta que mudam o progresso de quem participa
+CAMPOS_AVALIACAO = ('target_value', 'metric', 'period', 'is_global', 'start_date', 'end_date', 'is_active')
+
+
+def _dados_avaliacao(meta):
+    return {campo: getattr(meta, campo) for campo in CAMPOS_AVALIACAO}
+
+
+@receiver(post_init, sender='rewards.Goal')
+def guardar_avaliacao_carregada(sender, instance, **kwargs):
+    """Guarda os campos da avaliação como vieram do banco (sem consulta; campos adiados ficam de fora)."""
+    if instance.pk is not None and all(campo in instance.__dict__ for campo in CAMPOS_AVALIACAO):
+        instance._avaliacao_carregada = _dados_avaliacao(instance)
+
+
+@receiver(post_save, sender='rewards.Goal')
+def reavaliar_meta(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Meta criada, ou editada no meio do período em algum campo da avaliação,
+    tem o progresso recalculado depois do commit. Edições só de nome,
+    descrição ou recompensa não reavaliam.
+    """
+    if raw:
+        return
+    depois = _dados_avaliacao(instance)
+    antes = getattr(instance, '_avaliacao_carregada', None)
+    instance._avaliacao_carregada = depois
+    if not created:
+        if update_fields is not None and not set(update_fields) & set(CAMPOS_AVALIACAO):
+            return
+        if antes == depois:
+            return
+    if instance.is_active:
+        transaction.on_commit(lambda: ReavaliacaoMetasService().reavaliar(instance))
+
+
+def _somar_incrementos(data, lotes):
+    total = defaultdict(int)
+    for incrementos in lotes:
+        for chave, valor in incrementos.items():
+            total[chave] += valor
+    ProgressoMetasService().registrar(total, data)
+
+
+# Eventos concorrentes somam no progresso em lote, numa transação só
+_progresso = FilaAgregada(_somar_incrementos)
+
+
+def _registrar_depois_do_commit(incrementos) -> None:
+    """
+    Soma os incrementos às metas depois do commit, fora da transação do
+    lançamento, que mantém travada a linha de saldo do usuário. Se o processo
+    cair entre o commit e a soma, reavaliar_metas corrige o progresso.
+    """
+    if incrementos:
+        data = timezone.localdate()
+        transaction.on_commit(lambda: _progresso.adicionar(data, incrementos))
+
+
+@receiver(lancamentos_registrados)
+def progresso_por_lancamentos(sender, transacoes, **kwargs):
+    _registrar_depois_do_commit(ProgressoMetasService.incrementos_dos_lancamentos(transacoes))
+
+
+@receiver(acoes_aprovadas)
+def progresso_por_aprovacoes(sender, aprovacoes, **kwargs):
+    _registrar_depois_do_commit(ProgressoMetasService.incrementos_das_aprovacoes(aprovacoes))
+
+
+@receiver(post_save, sender='actions.BillRecord')
+def progresso_por_conta(sender, instance, created, **kwargs):
+    if created:
+        ProgressoMetasService().processar_contas([instance])
+
+
+@receiver(contas_importadas)
+def progresso_por_contas_importadas(sender, criadas, **kwargs):
+    ProgressoMetasService().processar_contas(criadas)
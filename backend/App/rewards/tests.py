@@ -1,3 +1,893 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from App.actions.models import ActionType, BillRecord, UserAction
+from App.actions.servicos.aprovacao_lote import AprovacaoEmLoteService
+from App.benchmark import benchmark, relatar
+from App.fila import esvaziar_filas
+from App.tokens.models import TokenLedger
+from .models import (
+    Goal, GoalCounterShard, GoalProgressArchive, Reward, RewardReservation, UserGoalProgress, UserReward
+)
+from .servicos import (
+    CancelamentoService, ContadorGlobalService, ProgressoMetasService, ReavaliacaoMetasService,
+    ReservaService, ResgateNegadoException,
+    ResgateService, ViradaPeriodoService, invalidar_catalogo, invalidar_indice, obter_catalogo,
+    obter_indice
+)
+
+User = get_user_model()
+
+
+def criar_recompensa(**campos):
+    dados = {
+        'name': 'Garrafa reutilizável', 'description': 'Garrafa de inox',
+        'required_points': 50, 'type': Reward.TYPE_PRIZE, 'stock': 10,
+    }
+    dados.update(campos)
+    return Reward.objects.create(**dados)
+
+
+class ResgateServiceTests(TestCase):
+    """Testes do resgate atômico de recompensas."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='ana', total_points=120)
+        self.recompensa = criar_recompensa()
+        self.servico = ResgateService()
+
+    def test_resgate_debita_saldo_estoque_e_registra(self):
+        resgate = self.servico.resgatar(self.usuario, self.recompensa)
+
+        self.usuario.refresh_from_db()
+        self.recompensa.refresh_from_db()
+        self.assertEqual(self.usuario.total_points, 70)
+        self.assertEqual(self.recompensa.stock, 9)
+        self.assertEqual(resgate.points_spent, 50)
+        debito = TokenLedger.objects.get(user=self.usuario)
+        self.assertEqual(debito.type, TokenLedger.TYPE_DEBIT)
+        self.assertEqual(debito.source, TokenLedger.SOURCE_REWARD)
+        self.assertEqual(debito.reference_id, resgate.pk)
+        self.assertEqual(debito.balance_after, 70)
+
+    def test_saldo_insuficiente_nao_altera_nada(self):
+        caro = criar_recompensa(required_points=500)
+
+        with self.assertRaises(ResgateNegadoException) as contexto:
+            self.servico.resgatar(self.usuario, caro)
+
+        self.assertEqual(contexto.exception.motivo, ResgateNegadoException.MOTIVO_SALDO_INSUFICIENTE)
+        caro.refresh_from_db()
+        self.assertEqual(caro.stock, 10)
+        self.assertFalse(UserReward.objects.exists())
+
+    def test_sem_estoque_desfaz_debito(self):
+        esgotada = criar_recompensa(stock=0)
+
+        with self.assertRaises(ResgateNegadoException) as contexto:
+            self.servico.resgatar(self.usuario.pk, esgotada.pk)
+
+        self.assertEqual(contexto.exception.motivo, ResgateNegadoException.MOTIVO_SEM_ESTOQUE)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.total_points, 120)
+        self.assertFalse(TokenLedger.objects.exists())
+
+    def test_inativa_e_ilimitada(self):
+        inativa = criar_recompensa(is_active=False)
+        with self.assertRaises(ResgateNegadoException) as contexto:
+            self.servico.resgatar(self.usuario, inativa)
+        self.assertEqual(contexto.exception.motivo, ResgateNegadoException.MOTIVO_INDISPONIVEL)
+
+        ilimitada = criar_recompensa(stock=-1)
+        self.servico.resgatar(self.usuario, ilimitada)
+        ilimitada.refresh_from_db()
+        self.assertEqual(ilimitada.stock, -1)
+        self.assertEqual(self.usuario.total_points, 70)
+
+
+class ReservaServiceTests(TestCase):
+    """Testes das reservas temporárias de estoque."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='bia', total_points=500)
+        self.recompensa = criar_recompensa(stock=2)
+        self.reservas = ReservaService()
+
+    def test_reservas_ativas_descontam_estoque_sem_alterar_reward(self):
+        self.reservas.reservar(self.usuario, self.recompensa)
+        outra = criar_recompensa(stock=-1)
+
+        self.assertEqual(
+            self.reservas.estoque_disponivel(),
+            {self.recompensa.pk: 1, outra.pk: -1},
+        )
+        self.assertEqual(self.recompensa.estoque_disponivel(), 1)
+        self.recompensa.refresh_from_db()
+        self.assertEqual(self.recompensa.stock, 2)
+
+    def test_nao_reserva_alem_do_estoque(self):
+        self.reservas.reservar(self.usuario, self.recompensa)
+        self.reservas.reservar(self.usuario, self.recompensa)
+
+        with self.assertRaises(ResgateNegadoException) as contexto:
+            self.reservas.reservar(self.usuario, self.recompensa)
+        self.assertEqual(contexto.exception.motivo, ResgateNegadoException.MOTIVO_SEM_ESTOQUE)
+
+    def test_reserva_expirada_volta_ao_estoque(self):
+        reserva = self.reservas.reservar(self.usuario, self.recompensa)
+        RewardReservation.objects.filter(pk=reserva.pk).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(self.recompensa.estoque_disponivel(), 2)
+        with self.assertRaises(ResgateNegadoException) as contexto:
+            ResgateService().resgatar(self.usuario, self.recompensa, reserva=reserva)
+        self.assertEqual(contexto.exception.motivo, ResgateNegadoException.MOTIVO_RESERVA_EXPIRADA)
+
+    def test_resgate_respeita_reservas_de_outros(self):
+        outro = User.objects.create(username='caio', total_points=500)
+        reserva = self.reservas.reservar(outro, self.recompensa)
+        self.reservas.reservar(outro, self.recompensa)
+        resgates = ResgateService()
+
+        with self.assertRaises(ResgateNegadoException):
+            resgates.resgatar(self.usuario, self.recompensa)
+
+        resgates.resgatar(outro, self.recompensa, reserva=reserva)
+        self.recompensa.refresh_from_db()
+        self.assertEqual(self.recompensa.stock, 1)
+        self.assertEqual(self.recompensa.estoque_disponivel(), 0)
+        self.assertFalse(RewardReservation.objects.filter(pk=reserva.pk).exists())
+
+    def test_varredura_remove_expiradas_em_lotes(self):
+        agora = timezone.now()
+        recompensa = criar_recompensa(stock=-1)
+        RewardReservation.objects.bulk_create(
+            [RewardReservation(user=self.usuario, reward=recompensa,
+                               expires_at=agora - timedelta(minutes=1)) for _ in range(25)]
+            + [RewardReservation(user=self.usuario, reward=recompensa,
+                                 expires_at=agora + timedelta(minutes=5)) for _ in range(3)]
+        )
+
+        self.assertEqual(self.reservas.liberar_expiradas(tamanho_lote=10), 25)
+        self.assertEqual(RewardReservation.objects.count(), 3)
+
+        saida = StringIO()
+        call_command('liberar_reservas', stdout=saida)
+        self.assertIn('0 reserva(s)', saida.getvalue())
+
+
+class CatalogoRecompensasTests(TestCase):
+    """Testes do catálogo em memória e das buscas por saldo."""
+
+    def setUp(self):
+        invalidar_catalogo()
+        for nome, pontos in [('Caneca', 30), ('Adesivo', 10), ('Mochila', 200), ('Boné', 80), ('Ecobag', 30)]:
+            criar_recompensa(name=nome, required_points=pontos)
+        criar_recompensa(name='Antiga', required_points=5, is_active=False)
+        criar_recompensa(name='Esgotada', required_points=20, stock=0)
+
+    def nomes(self, recompensas):
+        return [recompensa.name for recompensa in recompensas]
+
+    def test_acessiveis_e_proximas_por_saldo(self):
+        catalogo = obter_catalogo()
+
+        self.assertEqual(self.nomes(catalogo.acessiveis(30)), ['Adesivo', 'Caneca', 'Ecobag'])
+        self.assertEqual(self.nomes(catalogo.proximas(30, 1)), ['Boné'])
+        self.assertEqual(self.nomes(catalogo.acessiveis(5)), [])
+        self.assertEqual(self.nomes(catalogo.proximas(500)), [])
+
+    def test_mesmo_resultado_que_pode_ser_resgatada_por(self):
+        usuario = User.objects.create(username='lia', total_points=80)
+        esperado = [r.name for r in Reward.objects.all() if r.pode_ser_resgatada_por(usuario)]
+
+        self.assertEqual(self.nomes(obter_catalogo().acessiveis(usuario.total_points)), esperado)
+
+    def test_retrato_guarda_valores_imutaveis(self):
+        recompensa = obter_catalogo().acessiveis(10)[0]
+        self.assertNotIsInstance(recompensa, Reward)
+        with self.assertRaises(AttributeError):
+            recompensa.required_points = 0
+
+        self.assertEqual((recompensa.name, recompensa.required_points, recompensa.stock), ('Adesivo', 10, 10))
+
+    def test_leituras_sem_consultas_ao_banco(self):
+        obter_catalogo()
+        with self.assertNumQueries(0):
+            for saldo in range(0, 300, 7):
+                obter_catalogo().acessiveis(saldo)
+                obter_catalogo().proximas(saldo)
+
+    def test_sinais_de_reward_invalidam_catalogo(self):
+        obter_catalogo()
+        nova = criar_recompensa(name='Camiseta', required_points=50)
+        self.assertIn('Camiseta', self.nomes(obter_catalogo().acessiveis(50)))
+
+        nova.is_active = False
+        nova.save()
+        self.assertNotIn('Camiseta', self.nomes(obter_catalogo().acessiveis(50)))
+
+        Reward.objects.get(name='Boné').delete()
+        self.assertEqual(self.nomes(obter_catalogo().proximas(30, 1)), ['Mochila'])
+
+    def test_estoque_esgotado_e_devolvido_atualiza_catalogo(self):
+        usuario = User.objects.create(username='davi', total_points=100)
+        ultima = criar_recompensa(name='Última', required_points=15, stock=1)
+        self.assertIn('Última', self.nomes(obter_catalogo().acessiveis(15)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resgate = ResgateService().resgatar(usuario, ultima)
+        self.assertNotIn('Última', self.nomes(obter_catalogo().acessiveis(15)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CancelamentoService().cancelar([resgate.pk], devolver_estoque=True)
+        self.assertIn('Última', self.nomes(obter_catalogo().acessiveis(15)))
+
+
+class CancelamentoServiceTests(TestCase):
+    """Testes do cancelamento de resgates com estorno pelo TokenLedger."""
+
+    def setUp(self):
+        self.usuarios = [User.objects.create(username=f'c{i}', total_points=1000) for i in range(5)]
+        self.limitada = criar_recompensa(required_points=10, stock=500)
+        self.ilimitada = criar_recompensa(required_points=20, stock=-1)
+        servico = ResgateService()
+        self.resgates = [
+            servico.resgatar(usuario, recompensa)
+            for usuario in self.usuarios
+            for recompensa in (self.limitada, self.ilimitada)
+        ]
+
+    def test_cancelar_estorna_pelo_ledger(self):
+        usuario = self.usuarios[0]
+        resgate = UserReward.objects.select_related('user').get(pk=self.resgates[0].pk)
+
+        resgate.cancelar("Parceiro fora do ar")
+
+        self.assertEqual(resgate.status, UserReward.STATUS_CANCELADO)
+        self.assertEqual(resgate.notes, "Cancelado. Parceiro fora do ar")
+        self.assertEqual(resgate.user.total_points, 980)
+        estorno = TokenLedger.objects.get(type=TokenLedger.TYPE_CREDIT, user=usuario)
+        self.assertEqual(estorno.source, TokenLedger.SOURCE_REWARD)
+        self.assertEqual(estorno.reference_id, resgate.pk)
+        self.assertEqual(estorno.balance_after, 980)
+
+        # Cancelar de novo não estorna duas vezes
+        resgate.cancelar()
+        self.assertEqual(TokenLedger.objects.filter(type=TokenLedger.TYPE_CREDIT).count(), 1)
+
+    def test_cancelamento_em_lote_com_devolucao_de_estoque(self):
+        cancelados = CancelamentoService().cancelar(
+            UserReward.objects.all(), "Parceiro fora do ar", devolver_estoque=True
+        )
+
+        self.assertEqual(cancelados, 10)
+        self.assertEqual(
+            set(User.objects.values_list('total_points', flat=True)), {1000}
+        )
+        self.limitada.refresh_from_db()
+        self.ilimitada.refresh_from_db()
+        self.assertEqual(self.limitada.stock, 500)
+        self.assertEqual(self.ilimitada.stock, -1)
+        self.assertFalse(UserReward.objects.exclude(status=UserReward.STATUS_CANCELADO).exists())
+
+    def test_consultas_nao_crescem_com_o_lote(self):
+        usuario = self.usuarios[0]
+        UserReward.objects.bulk_create(
+            [UserReward(user=usuario, reward=self.limitada, points_spent=1) for _ in range(100)]
+        )
+        ids = list(UserReward.objects.values_list('pk', flat=True))
+
+        # SELECT travando, UPDATE dos resgates, UPDATE + SELECT dos saldos,
+        # INSERT dos estornos e UPDATE do estoque, mais 4 de savepoints (o
+        # ranking de grupos é somado depois do commit)
+        with self.assertNumQueries(10):
+            CancelamentoService().cancelar(ids, devolver_estoque=True)
+
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.total_points, 1000 + 100)
+        saldos = list(
+            TokenLedger.objects.filter(user=usuario, type=TokenLedger.TYPE_CREDIT)
+            .order_by('pk').values_list('balance_after', flat=True)
+        )
+        self.assertEqual(saldos[-1], usuario.total_points)
+
+
+def criar_meta(**campos):
+    dados = {
+        'name': 'Meta', 'target_value': 50, 'metric': Goal.METRIC_POINTS,
+        'period': Goal.PERIOD_MONTHLY,
+    }
+    dados.update(campos)
+    return Goal.objects.create(**dados)
+
+
+class ProgressoMetasTests(TestCase):
+    """Testes do progresso de metas dirigido por eventos."""
+
+    def setUp(self):
+        invalidar_indice()
+        self.usuario = User.objects.create(username='rui')
+
+    def tearDown(self):
+        # As metas somem no rollback do teste, sem disparar sinais
+        invalidar_indice()
+
+    def creditar(self, quantidade, origem=TokenLedger.SOURCE_ACTION, tipo=TokenLedger.TYPE_CREDIT):
+        # O progresso é somado depois do commit do lançamento
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.objects.create(user=self.usuario, amount=quantidade, type=tipo, source=origem)
+
+    def test_lancamentos_avancam_e_concluem_meta_global(self):
+        meta = criar_meta()
+
+        self.creditar(30)
+        progresso = UserGoalProgress.objects.get(user=self.usuario, goal=meta)
+        self.assertEqual(progresso.current_value, 30)
+        self.assertFalse(progresso.completed)
+
+        self.creditar(25)
+        progresso.refresh_from_db()
+        self.assertEqual(progresso.current_value, 55)
+        self.assertTrue(progresso.completed)
+        self.assertIsNotNone(progresso.completed_at)
+
+    def test_debitos_e_estornos_nao_contam(self):
+        meta = criar_meta()
+        self.creditar(40)
+        self.creditar(10, tipo=TokenLedger.TYPE_DEBIT, origem=TokenLedger.SOURCE_REWARD)
+        self.creditar(10, origem=TokenLedger.SOURCE_REWARD)
+
+        self.assertEqual(UserGoalProgress.objects.get(goal=meta).current_value, 40)
+
+    def test_meta_individual_so_para_quem_participa(self):
+        meta = criar_meta(is_global=False)
+        outro = User.objects.create(username='eva')
+        UserGoalProgress.objects.create(user=outro, goal=meta)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.lancar_em_lote([
+                (self.usuario, 20, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+                (outro, 70, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+            ])
+
+        self.assertEqual(
+            list(UserGoalProgress.objects.values_list('user__username', 'current_value', 'completed')),
+            [('eva', 70, True)],
+        )
+
+    def test_metas_fora_da_vigencia_e_outras_metricas_ignoradas(self):
+        hoje = timezone.localdate()
+        criar_meta(end_date=hoje - timedelta(days=1))
+        criar_meta(start_date=hoje + timedelta(days=1))
+        criar_meta(metric=Goal.METRIC_ACTION_COUNT)
+
+        self.creditar(30)
+        self.assertFalse(UserGoalProgress.objects.exists())
+
+    def test_aprovacoes_contam_acoes(self):
+        meta = criar_meta(metric=Goal.METRIC_ACTION_COUNT, target_value=3)
+        tipo = ActionType.objects.create(name=ActionType.RECICLAGEM, base_points=10)
+        acoes = [UserAction.objects.create(user=self.usuario, action_type=tipo) for _ in range(3)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            acoes[0].aprovar(self.usuario)
+            AprovacaoEmLoteService().aprovar([acao.pk for acao in acoes[1:]], self.usuario)
+
+        progresso = UserGoalProgress.objects.get(goal=meta)
+        self.assertEqual(progresso.current_value, 3)
+        self.assertTrue(progresso.completed)
+
+    def test_contas_contam_economia(self):
+        agua = criar_meta(metric=Goal.METRIC_WATER_SAVE, target_value=10000)
+        energia = criar_meta(metric=Goal.METRIC_ENERGY_SAVE, target_value=100)
+        for mes, m3, kwh in [(1, 20, 300), (2, 15, 320)]:
+            BillRecord.objects.create(user=self.usuario, type=BillRecord.BILL_TYPE_WATER,
+                                      consumption_value=m3, value_rs=50, month=mes, year=2026)
+            BillRecord.objects.create(user=self.usuario, type=BillRecord.BILL_TYPE_ENERGY,
+                                      consumption_value=kwh, value_rs=90, month=mes, year=2026)
+
+        self.assertEqual(UserGoalProgress.objects.get(goal=agua).current_value, 5000)
+        # Consumo de energia subiu: sem economia, sem progresso
+        self.assertFalse(UserGoalProgress.objects.filter(goal=energia).exists())
+
+    def test_evento_entre_a_troca_de_periodo_e_a_virada_conta_no_periodo_novo(self):
+        meta = criar_meta(period=Goal.PERIOD_MONTHLY, target_value=50)
+        servico = ProgressoMetasService()
+        servico.registrar({(self.usuario.pk, Goal.METRIC_POINTS): 60}, data=date(2026, 3, 31))
+        individual = criar_meta(period=Goal.PERIOD_MONTHLY, is_global=False)
+        UserGoalProgress.objects.create(user=self.usuario, goal=individual, period_start=date(2026, 3, 1),
+                                        current_value=7)
+        invalidar_indice()
+
+        # Primeiro evento de abril, antes de virar_periodo_metas rodar
+        servico.registrar({(self.usuario.pk, Goal.METRIC_POINTS): 20}, data=date(2026, 4, 1))
+
+        progresso = UserGoalProgress.objects.get(goal=meta)
+        self.assertEqual((progresso.current_value, progresso.completed, progresso.period_start),
+                         (20, False, date(2026, 4, 1)))
+        self.assertEqual(UserGoalProgress.objects.get(goal=individual).current_value, 20)
+        self.assertEqual(
+            sorted(GoalProgressArchive.objects.values_list('goal_id', 'final_value', 'completed', 'period_start')),
+            [(meta.pk, 60, True, date(2026, 3, 1)), (individual.pk, 7, False, date(2026, 3, 1))],
+        )
+
+        # A virada posterior não zera nem arquiva de novo o que já está no período atual
+        ViradaPeriodoService().virar(data=date(2026, 4, 1))
+        self.assertEqual(UserGoalProgress.objects.get(goal=meta).current_value, 20)
+        self.assertEqual(GoalProgressArchive.objects.count(), 2)
+
+    def test_lote_com_consultas_constantes(self):
+        metas = [criar_meta(target_value=15), criar_meta(target_value=1000)]
+        usuarios = User.objects.bulk_create([User(username=f'm{i}') for i in range(60)])
+        servico = ProgressoMetasService()
+        obter_indice()
+
+        # Metas existentes, INSERT das linhas globais, INSERT do arquivamento
+        # de períodos encerrados, UPDATE do progresso, UPDATE das conclusões e
+        # 2 de savepoint, mais UPDATE, INSERT e UPDATE da primeira escrita na
+        # fatia do contador de cada meta
+        with self.assertNumQueries(13):
+            servico.registrar({(u.pk, Goal.METRIC_POINTS): i % 30 for i, u in enumerate(usuarios)})
+
+        self.assertEqual(UserGoalProgress.objects.filter(goal=metas[0], completed=True).count(),
+                         sum(1 for i in range(60) if i % 30 >= 15))
+        self.assertFalse(UserGoalProgress.objects.filter(goal=metas[1], completed=True).exists())
+
+
+class ContadorGlobalTests(TestCase):
+    """Testes do contador fatiado das metas globais."""
+
+    def setUp(self):
+        invalidar_indice()
+        cache.clear()  # ids de metas se repetem entre testes
+        self.meta = criar_meta(target_value=10000)
+        self.inicio = self.meta.inicio_do_periodo()
+        self.servico = ContadorGlobalService(fatias=4)
+
+    def tearDown(self):
+        invalidar_indice()
+
+    def test_incrementos_espalhados_somam_no_total(self):
+        for i in range(40):
+            self.servico.incrementar(self.meta.pk, self.inicio, i)
+
+        self.assertEqual(self.servico.total(self.meta, usar_cache=False), sum(range(40)))
+        self.assertLessEqual(GoalCounterShard.objects.filter(goal=self.meta).count(), 4)
+
+    def test_total_em_cache_ate_expirar(self):
+        self.servico.incrementar(self.meta.pk, self.inicio, 10)
+        self.assertEqual(self.servico.total(self.meta), 10)
+
+        self.servico.incrementar(self.meta.pk, self.inicio, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.servico.total(self.meta), 10)
+        self.assertEqual(self.servico.total(self.meta, usar_cache=False), 15)
+
+    def test_periodos_tem_contadores_separados(self):
+        anterior = Goal.calcular_inicio_periodo(self.meta.period, self.inicio - timedelta(days=1))
+        self.servico.incrementar(self.meta.pk, anterior, 70)
+        self.servico.incrementar(self.meta.pk, self.inicio, 3)
+
+        self.assertEqual(self.servico.total(self.meta, usar_cache=False), 3)
+        self.assertEqual(self.servico.total(self.meta, data=anterior, usar_cache=False), 70)
+
+    def test_compactacao_preserva_total(self):
+        fatias = iter([0, 1, 2, 3, 1])
+        servico = ContadorGlobalService(fatias=4, sortear=lambda n: next(fatias))
+        for valor in (1, 2, 3, 4, 5):
+            servico.incrementar(self.meta.pk, self.inicio, valor)
+        self.assertEqual(GoalCounterShard.objects.count(), 4)
+
+        saida = StringIO()
+        call_command('compactar_contadores_metas', stdout=saida)
+
+        self.assertIn('3 fatia(s)', saida.getvalue())
+        self.assertEqual(
+            list(GoalCounterShard.objects.values_list('slot', 'value')), [(0, 15)]
+        )
+        self.assertEqual(self.servico.compactar(), 0)
+
+    def test_motor_de_metas_alimenta_o_contador(self):
+        individual = criar_meta(is_global=False)
+        usuarios = User.objects.bulk_create([User(username=f'c{i}') for i in range(5)])
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.lancar_em_lote([
+                (usuario, 10 * (i + 1), TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None)
+                for i, usuario in enumerate(usuarios)
+            ])
+
+        self.assertEqual(self.servico.total(self.meta, usar_cache=False), 150)
+        self.assertFalse(GoalCounterShard.objects.filter(goal=individual).exists())
+
+
+class ReavaliacaoMetasTests(TestCase):
+    """Testes da reavaliação de metas a partir dos agregados."""
+
+    def setUp(self):
+        invalidar_indice()
+        cache.clear()
+        self.usuarios = User.objects.bulk_create([User(username=f'r{i}') for i in range(3)])
+        self.servico = ReavaliacaoMetasService()
+
+    def tearDown(self):
+        invalidar_indice()
+
+    def lancar(self, *lancamentos):
+        TokenLedger.lancar_em_lote([
+            (self.usuarios[i], quantidade, tipo, origem, None) for i, quantidade, tipo, origem in lancamentos
+        ])
+
+    def test_meta_global_criada_no_meio_do_periodo(self):
+        credito, debito = TokenLedger.TYPE_CREDIT, TokenLedger.TYPE_DEBIT
+        self.lancar(
+            (0, 30, credito, TokenLedger.SOURCE_ACTION),
+            (0, 25, credito, TokenLedger.SOURCE_BONUS),
+            (1, 20, credito, TokenLedger.SOURCE_ACTION),
+            (1, 10, debito, TokenLedger.SOURCE_REWARD),
+            (1, 10, credito, TokenLedger.SOURCE_REWARD),
+        )
+        meta = criar_meta()
+
+        self.assertEqual(self.servico.reavaliar(meta), 2)
+
+        self.assertEqual(
+            sorted(UserGoalProgress.objects.filter(goal=meta).values_list('user__username', 'current_value', 'completed')),
+            [('r0', 55, True), ('r1', 20, False)],
+        )
+        self.assertEqual(UserGoalProgress.objects.get(goal=meta, completed=True).period_start,
+                         meta.inicio_do_periodo())
+        self.assertEqual(ContadorGlobalService().total(meta), 75)
+
+    def test_alvo_editado_reabre_e_conclui(self):
+        self.lancar((0, 30, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION),
+                    (1, 60, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION))
+        meta = criar_meta()
+        self.servico.reavaliar(meta)
+        concluida_em = UserGoalProgress.objects.get(goal=meta, user=self.usuarios[1]).completed_at
+
+        meta.target_value = 30
+        meta.save()
+        self.servico.reavaliar(meta)
+        self.assertEqual(UserGoalProgress.objects.filter(goal=meta, completed=True).count(), 2)
+        self.assertEqual(UserGoalProgress.objects.get(goal=meta, user=self.usuarios[1]).completed_at, concluida_em)
+
+        meta.target_value = 100
+        meta.save()
+        self.servico.reavaliar(meta)
+        self.assertFalse(UserGoalProgress.objects.filter(goal=meta, completed=True).exists())
+
+    def test_meta_individual_conta_acoes_so_de_participantes(self):
+        tipo = ActionType.objects.create(name=ActionType.RECICLAGEM, base_points=10)
+        for usuario in self.usuarios:
+            UserAction.objects.create(user=usuario, action_type=tipo).aprovar(usuario)
+        UserAction.objects.create(user=self.usuarios[0], action_type=tipo)  # pendente
+        meta = criar_meta(is_global=False, metric=Goal.METRIC_ACTION_COUNT, target_value=1)
+        UserGoalProgress.objects.create(user=self.usuarios[0], goal=meta)
+
+        self.assertEqual(self.servico.reavaliar(meta), 1)
+
+        self.assertEqual(
+            list(UserGoalProgress.objects.filter(goal=meta).values_list('user__username', 'current_value', 'completed')),
+            [('r0', 1, True)],
+        )
+
+    def test_economia_das_contas(self):
+        for mes, m3 in [(12, 30), (1, 20), (2, 25), (3, 19)]:
+            BillRecord.objects.create(user=self.usuarios[0], type=BillRecord.BILL_TYPE_WATER,
+                                      consumption_value=m3, value_rs=50, month=mes,
+                                      year=2025 if mes == 12 else 2026)
+        BillRecord.objects.create(user=self.usuarios[1], type=BillRecord.BILL_TYPE_ENERGY,
+                                  consumption_value=100, value_rs=50, month=1, year=2026)
+        meta = criar_meta(metric=Goal.METRIC_WATER_SAVE, target_value=100000)
+
+        self.servico.reavaliar(meta)
+
+        # 30→20 e 25→19; a alta de 20→25 não conta
+        self.assertEqual(list(UserGoalProgress.objects.filter(goal=meta).values_list('user_id', 'current_value')),
+                         [(self.usuarios[0].pk, 16000)])
+
+    def test_consultas_nao_crescem_com_os_usuarios(self):
+        usuarios = User.objects.bulk_create([User(username=f'q{i}') for i in range(100)])
+        TokenLedger.lancar_em_lote([
+            (usuario, 5, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None) for usuario in usuarios
+        ])
+        meta = criar_meta(target_value=5)
+
+        # Travas da meta e do contador, agregado, zerar, upsert, duas
+        # reconciliações de conclusão, DELETE e INSERT do contador, mais 4 de savepoint
+        with self.assertNumQueries(13):
+            self.servico.reavaliar(meta)
+        self.assertEqual(UserGoalProgress.objects.filter(goal=meta, completed=True).count(), 100)
+
+    def test_salvar_meta_dispara_reavaliacao(self):
+        self.lancar((2, 40, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION))
+        with self.captureOnCommitCallbacks(execute=True):
+            meta = criar_meta()
+
+        self.assertEqual(UserGoalProgress.objects.get(goal=meta).current_value, 40)
+
+        saida = StringIO()
+        call_command('reavaliar_metas', '--meta', str(meta.pk), stdout=saida)
+        self.assertIn('1 usuário(s)', saida.getvalue())
+
+    def test_so_campos_da_avaliacao_disparam_reavaliacao(self):
+        self.lancar((2, 40, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION))
+        with self.captureOnCommitCallbacks(execute=True):
+            meta = criar_meta()
+        progresso = UserGoalProgress.objects.filter(goal=meta)
+        progresso.update(current_value=99)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            meta.name = 'Renomeada'
+            meta.save()
+            Goal.objects.get(pk=meta.pk).save(update_fields=['description'])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(progresso.get().current_value, 99)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            meta.target_value = 30
+            meta.save()
+        self.assertEqual((progresso.get().current_value, progresso.get().completed), (40, True))
+
+
+class ViradaPeriodoTests(TestCase):
+    """Testes da virada de período das metas recorrentes."""
+
+    HOJE = date(2026, 3, 18)  # quarta-feira
+    MES_PASSADO = date(2026, 2, 1)
+
+    def setUp(self):
+        self.meta = criar_meta(period=Goal.PERIOD_MONTHLY)
+        self.usuarios = User.objects.bulk_create([User(username=f'v{i}') for i in range(10)])
+
+    def criar_progresso(self, valores, period_start=MES_PASSADO, meta=None):
+        UserGoalProgress.objects.bulk_create([
+            UserGoalProgress(user=usuario, goal=meta or self.meta, current_value=valor,
+                             completed=valor >= 50, period_start=period_start)
+            for usuario, valor in zip(self.usuarios, valores)
+        ])
+
+    def test_inicio_de_cada_periodo(self):
+        self.assertEqual(Goal.calcular_inicio_periodo(Goal.PERIOD_DAILY, self.HOJE), self.HOJE)
+        self.assertEqual(Goal.calcular_inicio_periodo(Goal.PERIOD_WEEKLY, self.HOJE), date(2026, 3, 16))
+        self.assertEqual(Goal.calcular_inicio_periodo(Goal.PERIOD_MONTHLY, self.HOJE), date(2026, 3, 1))
+        self.assertEqual(Goal.calcular_inicio_periodo(Goal.PERIOD_YEARLY, self.HOJE), date(2026, 1, 1))
+
+    def test_arquiva_e_zera_periodo_encerrado(self):
+        self.criar_progresso([10, 60, 0])
+        atual = criar_meta(period=Goal.PERIOD_YEARLY)
+        self.criar_progresso([5], period_start=date(2026, 1, 1), meta=atual)
+
+        viradas = ViradaPeriodoService().virar(data=self.HOJE)
+
+        self.assertEqual(viradas, {self.meta.pk: 3, atual.pk: 0})
+        self.assertEqual(
+            sorted(GoalProgressArchive.objects.values_list('final_value', 'completed', 'period_start')),
+            [(10, False, self.MES_PASSADO), (60, True, self.MES_PASSADO)],
+        )
+        self.assertEqual(
+            set(UserGoalProgress.objects.filter(goal=self.meta)
+                .values_list('current_value', 'completed', 'period_start')),
+            {(0, False, date(2026, 3, 1))},
+        )
+        self.assertEqual(UserGoalProgress.objects.get(goal=atual).current_value, 5)
+
+        # Repetir não vira de novo nem duplica o histórico
+        self.assertEqual(ViradaPeriodoService().virar(data=self.HOJE)[self.meta.pk], 0)
+        self.assertEqual(GoalProgressArchive.objects.count(), 2)
+
+    def test_linhas_sem_periodo_usam_data_de_atualizacao(self):
+        self.criar_progresso([30, 40], period_start=None)
+        UserGoalProgress.objects.filter(user=self.usuarios[0]).update(
+            updated_at=timezone.make_aware(timezone.datetime(2026, 2, 20))
+        )
+
+        ViradaPeriodoService().virar(data=self.HOJE)
+
+        self.assertEqual(
+            list(GoalProgressArchive.objects.values_list('final_value', 'period_start')),
+            [(30, self.MES_PASSADO)],
+        )
+        self.assertEqual(UserGoalProgress.objects.get(user=self.usuarios[1]).current_value, 40)
+
+    def test_retoma_apos_interrupcao(self):
+        self.criar_progresso(range(1, 11))
+
+        def interromper(goal_id, linhas):
+            raise RuntimeError("queda no meio da virada")
+
+        with self.assertRaises(RuntimeError):
+            ViradaPeriodoService().virar(data=self.HOJE, tamanho_lote=4, ao_concluir_lote=interromper)
+        self.assertEqual(GoalProgressArchive.objects.count(), 4)
+
+        saida = StringIO()
+        call_command('virar_periodo_metas', data='2026-03-18', tamanho_lote=4, stdout=saida)
+
+        self.assertIn('6 progresso(s)', saida.getvalue())
+        self.assertEqual(GoalProgressArchive.objects.count(), 10)
+        self.assertFalse(UserGoalProgress.objects.exclude(current_value=0).exists())
+
+    @benchmark
+    def test_benchmark_virada(self):
+        metas = [criar_meta(period=Goal.PERIOD_DAILY) for _ in range(10)]
+        usuarios = User.objects.bulk_create([User(username=f'bv{i}') for i in range(10000)])
+        UserGoalProgress.objects.bulk_create(
+            [UserGoalProgress(user=usuario, goal=meta, current_value=7, period_start=self.MES_PASSADO)
+             for meta in metas for usuario in usuarios],
+            batch_size=5000,
+        )
+
+        inicio = time.perf_counter()
+        viradas = ViradaPeriodoService().virar(data=self.HOJE, periodos=[Goal.PERIOD_DAILY])
+        duracao = time.perf_counter() - inicio
+
+        total = sum(viradas.values())
+        self.assertEqual(total, 100000)
+        self.assertEqual(GoalProgressArchive.objects.count(), 100000)
+        relatar(f"[Virada de período] {total} linhas em {duracao:.2f}s ({total / duracao:.0f}/s)")
+        # 1 milhão de linhas em menos de um minuto
+        self.assertLess(duracao, 6)
+
+
+class ResgateConcorrenciaTests(TransactionTestCase):
+    """Campanha relâmpago: resgates concorrentes não podem vender além do estoque."""
+
+    THREADS = 8
+    RESGATES_POR_THREAD = 50
+
+    def tearDown(self):
+        # Os débitos somam nos grupos pela fila, em outra thread
+        esvaziar_filas()
+
+    def executar(self, recompensa, usuarios):
+        servico = ResgateService()
+        negados = []
+        erros = []
+
+        def resgatar(usuario_id):
+            try:
+                for _ in range(self.RESGATES_POR_THREAD):
+                    try:
+                        servico.resgatar(usuario_id, recompensa.pk)
+                    except ResgateNegadoException as erro:
+                        negados.append(erro.motivo)
+            except Exception as erro:
+                erros.append(erro)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=resgatar, args=(usuario.pk,)) for usuario in usuarios]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+        self.assertEqual(erros, [])
+        return negados, duracao
+
+    def test_estoque_nao_e_vendido_alem_do_limite(self):
+        recompensa = criar_recompensa(required_points=1, stock=100)
+        usuarios = [User.objects.create(username=f'u{i}', total_points=1000) for i in range(self.THREADS)]
+
+        negados, _ = self.executar(recompensa, usuarios)
+
+        recompensa.refresh_from_db()
+        self.assertEqual(recompensa.stock, 0)
+        self.assertEqual(UserReward.objects.count(), 100)
+        self.assertEqual(len(negados), self.THREADS * self.RESGATES_POR_THREAD - 100)
+        self.assertEqual(set(negados), {ResgateNegadoException.MOTIVO_SEM_ESTOQUE})
+        # Débito só para resgates efetivados
+        gastos = sum(1000 - u.total_points for u in User.objects.all())
+        self.assertEqual(gastos, 100)
+
+    def test_saldo_nao_e_gasto_duas_vezes(self):
+        recompensa = criar_recompensa(required_points=10, stock=-1)
+        usuario = User.objects.create(username='ze', total_points=100)
+
+        self.executar(recompensa, [usuario] * self.THREADS)
+
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.total_points, 0)
+        self.assertEqual(UserReward.objects.count(), 10)
+        saldos = sorted(TokenLedger.objects.values_list('balance_after', flat=True))
+        self.assertEqual(saldos, list(range(0, 100, 10)))
+
+    @benchmark
+    def test_benchmark_resgates_por_segundo(self):
+        total = self.THREADS * self.RESGATES_POR_THREAD
+        recompensa = criar_recompensa(required_points=1, stock=total)
+        usuarios = [User.objects.create(username=f'b{i}', total_points=total) for i in range(self.THREADS)]
+
+        negados, duracao = self.executar(recompensa, usuarios)
+
+        self.assertEqual(negados, [])
+        recompensa.refresh_from_db()
+        self.assertEqual(recompensa.stock, 0)
+        relatar(f"[Resgate] {total} resgates da mesma recompensa em {duracao:.2f}s "
+                f"({total / duracao:.0f}/s)")
+
+
+class ContadorGlobalConcorrenciaTests(TransactionTestCase):
+    """Escritas simultâneas no contador de uma meta global não se perdem."""
+
+    THREADS = 8
+    INCREMENTOS_POR_THREAD = 50
+
+    def setUp(self):
+        invalidar_indice()
+
+    def tearDown(self):
+        esvaziar_filas()
+        invalidar_indice()
+
+    def test_incrementos_concorrentes(self):
+        meta = criar_meta()
+        inicio = meta.inicio_do_periodo()
+        servico = ContadorGlobalService()
+        erros = []
+
+        def incrementar():
+            try:
+                for _ in range(self.INCREMENTOS_POR_THREAD):
+                    servico.incrementar(meta.pk, inicio, 2)
+            except Exception as erro:
+                erros.append(erro)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=incrementar) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = self.THREADS * self.INCREMENTOS_POR_THREAD
+        self.assertEqual(erros, [])
+        self.assertEqual(servico.total(meta, usar_cache=False), 2 * total)
+        servico.compactar()
+        self.assertEqual(GoalCounterShard.objects.count(), 1)
+        self.assertEqual(servico.total(meta, usar_cache=False), 2 * total)
+
+    def test_reavaliacao_nao_sobrescreve_incremento_concorrente(self):
+        meta = criar_meta(target_value=10000)
+        inicio = meta.inicio_do_periodo()
+        usuario = User.objects.create(username='concorrente')
+        TokenLedger.lancar_em_lote([(usuario, 30, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None)])
+        esvaziar_filas()  # o progresso do lançamento é somado pela fila, em outra thread
+        contador = ContadorGlobalService()
+        servico = ReavaliacaoMetasService()
+        terminou = threading.Event()
+
+        def incrementar():
+            try:
+                contador.incrementar(meta.pk, inicio, 2)
+            finally:
+                terminou.set()
+                connection.close()
+
+        thread = threading.Thread(target=incrementar)
+        agregar = servico.agregar
+
+        def agregar_com_incremento_concorrente(*args):
+            # O incremento chega entre a leitura da origem e a troca das fatias
+            thread.start()
+            terminou.wait(0.5)
+            return agregar(*args)
+
+        servico.agregar = agregar_com_incremento_concorrente
+        servico.reavaliar(meta)
+        thread.join()
+
+        self.assertEqual(contador.total(meta, usar_cache=False), 32)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TokensConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'App.tokens'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from App.tokens.servicos import RankingPeriodo
+
+
+class Command(BaseCommand):
+    help = (
+        'Refaz os consolidados por hora e por dia do TokenLedger usados nos rankings por período. '
+        'Necessário na implantação; depois disso eles são mantidos a cada lançamento.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        linhas = RankingPeriodo().reconstruir()
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{linhas} consolidado(s) gerado(s) em {duracao:.2f}s.'))
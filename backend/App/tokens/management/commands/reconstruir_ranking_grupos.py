@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from App.tokens.servicos import RankingGrupos
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula do zero os totais de pontos por escola e por cidade a partir dos usuários. '
+        'Necessário na implantação e depois de alterações em massa (bulk_create/update) em users.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        linhas = RankingGrupos().reconstruir()
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{linhas[RankingGrupos.ESCOLA]} escola(s) e {linhas[RankingGrupos.CIDADE]} cidade(s) "
+            f"recalculada(s) em {duracao:.2f}s."
+        ))
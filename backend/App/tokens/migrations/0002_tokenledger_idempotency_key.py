@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tokens', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tokenledger',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Identifica a operação de origem para impedir lançamentos duplicados', max_length=64, null=True, unique=True, verbose_name='Chave de Idempotência'),
+        ),
+    ]
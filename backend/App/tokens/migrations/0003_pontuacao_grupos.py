@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tokens', '0002_tokenledger_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Nome')),
+                ('total_points', models.BigIntegerField(default=0, verbose_name='Total de Pontos')),
+                ('members', models.IntegerField(default=0, verbose_name='Membros')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Pontuação de Cidade',
+                'verbose_name_plural': 'Pontuações de Cidades',
+                'db_table': 'city_scores',
+                'ordering': ['-total_points', 'name'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['-total_points', 'name'], name='city_scores_ranking_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SchoolScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Nome')),
+                ('total_points', models.BigIntegerField(default=0, verbose_name='Total de Pontos')),
+                ('members', models.IntegerField(default=0, verbose_name='Membros')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Pontuação de Escola',
+                'verbose_name_plural': 'Pontuações de Escolas',
+                'db_table': 'school_scores',
+                'ordering': ['-total_points', 'name'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['-total_points', 'name'], name='school_scores_ranking_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tokens', '0003_pontuacao_grupos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Dia')], max_length=4, verbose_name='Granularidade')),
+                ('bucket_start', models.DateTimeField(verbose_name='Início do Intervalo')),
+                ('points', models.BigIntegerField(default=0, verbose_name='Pontos')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Consolidado do Ledger',
+                'verbose_name_plural': 'Consolidados do Ledger',
+                'db_table': 'ledger_rollups',
+                'unique_together': {('granularity', 'bucket_start', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tokens', '0004_consolidados_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tokenledger',
+            index=models.Index(fields=['date'], name='token_ledger_date_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+import hashlib
+
+from django.db import models, transaction
+from django.db.models import Case, F, When
 from django.conf import settings
+from django.contrib.auth import get_user_model
 
 
 class TokenLedger(models.Model):
@@ -28,6 +32,9 @@ class TokenLedger(models.Model):
         (SOURCE_ADMIN, 'Ajuste Administrativo'),
     ]
 
+    # Limite de usuários por UPDATE em lote (3 parâmetros SQL por usuário)
+    USUARIOS_POR_UPDATE = 300
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -77,6 +84,15 @@ class TokenLedger(models.Model):
         help_text="Saldo do usuário após esta transação"
     )
 
+    idempotency_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="Chave de Idempotência",
+        help_text="Identifica a operação de origem para impedir lançamentos duplicados"
+    )
+
     class Meta:
         db_table = 'token_ledger'
         verbose_name = 'Transação de Token'
@@ -85,24 +101,152 @@ class TokenLedger(models.Model):
         indexes = [
             models.Index(fields=['user', '-date']),
             models.Index(fields=['type', '-date']),
+            models.Index(fields=['date'], name='token_ledger_date_idx'),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.type} {self.amount} tokens ({self.source})"
 
     def save(self, *args, **kwargs):
-        """Atualiza o saldo do usuário ao salvar a transação."""
-        if not self.pk:  # Apenas em criação
-            # Atualiza o total_points do usuário
-            if self.type == self.TYPE_CREDIT:
-                self.user.total_points += self.amount
-            else:
-                self.user.total_points -= self.amount
+        """
+        Atualiza o saldo do usuário ao salvar a transação.
+
+        O saldo é alterado direto no banco (UPDATE com F-expression), que trava
+        a linha do usuário até o fim da transação, e o `balance_after` vem do
+        valor gravado. Assim créditos concorrentes não se perdem.
+        """
+        if self.pk:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic(using=kwargs.get('using')):
+            self.balance_after = self.atualizar_saldo(self.user_id, self.obter_delta())
+            super().save(*args, **kwargs)
+            self.notificar([self])
+
+        # Mantém a instância em memória coerente sem regravar o usuário
+        self.user.total_points = self.balance_after
+
+    @staticmethod
+    def atualizar_saldo(user_id, delta):
+        """
+        Soma `delta` ao saldo do usuário de forma atômica e retorna o novo saldo.
+        Deve ser chamado dentro de uma transação.
+        """
+        usuarios = get_user_model().objects.filter(pk=user_id)
+        usuarios.update(total_points=F('total_points') + delta)
+        return usuarios.values_list('total_points', flat=True).get()
+
+    @staticmethod
+    def debitar_se_suficiente(user_id, quantidade):
+        """
+        Debita `quantidade` só se o saldo cobrir o valor (UPDATE condicional) e
+        retorna o novo saldo, ou None se o saldo for insuficiente.
+        Deve ser chamado dentro de uma transação.
+        """
+        usuarios = get_user_model().objects.filter(pk=user_id)
+        if not usuarios.filter(total_points__gte=quantidade).update(
+            total_points=F('total_points') - quantidade
+        ):
+            return None
+        return usuarios.values_list('total_points', flat=True).get()
+
+    @classmethod
+    def notificar(cls, transacoes):
+        """
+        Avisa os interessados (metas, rankings) sobre novos lançamentos, na
+        mesma transação em que foram gravados.
+        """
+        from App.tokens.signals import lancamentos_registrados
+        lancamentos_registrados.send(sender=cls, transacoes=transacoes)
+
+    @staticmethod
+    def gerar_chave_idempotencia(*partes):
+        """Gera a chave de idempotência (SHA-256) a partir das partes da operação."""
+        conteudo = '|'.join(str(parte) for parte in partes)
+        return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+    def obter_delta(self):
+        """Retorna o efeito da transação no saldo (positivo ou negativo)."""
+        return self.amount if self.type == self.TYPE_CREDIT else -self.amount
+
+    @classmethod
+    def lancar_em_lote(cls, lancamentos, batch_size=1000):
+        """
+        Lança várias transações de uma vez.
+
+        `lancamentos` é um iterável de tuplas
+        (usuario, quantidade, tipo, origem, referencia[, descricao[, chave_idempotencia]]),
+        onde `usuario` pode ser a instância ou o id. As transações são agrupadas por
+        usuário, o saldo de cada um é atualizado com um único UPDATE agregado e
+        os `balance_after` são calculados como soma acumulada, na ordem recebida.
+        Retorna a lista de transações criadas.
+        """
+        transacoes = []
+        usuarios = {}
+        deltas = {}
+        for usuario, quantidade, tipo, origem, referencia, *extras in lancamentos:
+            descricao = extras[0] if extras else ''
+            chave_idempotencia = extras[1] if len(extras) > 1 else None
+            user_id = getattr(usuario, 'pk', usuario)
+            transacao = cls(
+                user_id=user_id,
+                amount=quantidade,
+                type=tipo,
+                source=origem,
+                reference_id=referencia,
+                description=descricao,
+                idempotency_key=chave_idempotencia,
+            )
+            transacoes.append(transacao)
+            deltas[user_id] = deltas.get(user_id, 0) + transacao.obter_delta()
+            if isinstance(usuario, models.Model):
+                usuarios[user_id] = usuario
+
+        if not transacoes:
+            return []
+
+        with transaction.atomic():
+            saldos_finais = cls.atualizar_saldos(deltas)
+
+            # Saldo antes do lote + soma acumulada de cada transação
+            saldos = {
+                user_id: saldo - deltas[user_id]
+                for user_id, saldo in saldos_finais.items()
+            }
+            for transacao in transacoes:
+                saldos[transacao.user_id] += transacao.obter_delta()
+                transacao.balance_after = saldos[transacao.user_id]
 
-            self.balance_after = self.user.total_points
-            self.user.save()
+            cls.objects.bulk_create(transacoes, batch_size=batch_size)
+            cls.notificar(transacoes)
 
-        super().save(*args, **kwargs)
+        for user_id, usuario in usuarios.items():
+            usuario.total_points = saldos_finais[user_id]
+
+        return transacoes
+
+    @classmethod
+    def atualizar_saldos(cls, deltas):
+        """
+        Aplica um delta por usuário ({user_id: delta}) com um UPDATE por bloco
+        de usuários e retorna {user_id: novo_saldo}.
+        Deve ser chamado dentro de uma transação.
+        """
+        User = get_user_model()
+        user_ids = sorted(deltas)  # ordem fixa de travamento evita deadlocks
+        saldos = {}
+        for inicio in range(0, len(user_ids), cls.USUARIOS_POR_UPDATE):
+            bloco = user_ids[inicio:inicio + cls.USUARIOS_POR_UPDATE]
+            usuarios = User.objects.filter(pk__in=bloco)
+            usuarios.update(total_points=Case(
+                *[When(pk=user_id, then=F('total_points') + deltas[user_id]) for user_id in bloco],
+                default=F('total_points'),
+            ))
+            saldos.update(usuarios.values_list('pk', 'total_points'))
+
+        if len(saldos) != len(user_ids):
+            raise User.DoesNotExist("Usuário do lançamento não encontrado.")
+        return saldos
 
     def eh_credito(self):
         """Verifica se a transação é um crédito."""
@@ -118,6 +262,112 @@ class TokenLedger(models.Model):
         return f"{tipo_texto} {abs(self.amount)} tokens - {self.get_source_display()}"
 
 
+class CohortScore(models.Model):
+    """
+    Total de pontos de um grupo de usuários (escola ou cidade), mantido
+    incrementalmente a cada lançamento no TokenLedger pelo RankingGrupos.
+    """
+
+    name = models.CharField(
+        max_length=200,
+        unique=True,
+        verbose_name="Nome"
+    )
+
+    total_points = models.BigIntegerField(
+        default=0,
+        verbose_name="Total de Pontos"
+    )
+
+    members = models.IntegerField(
+        default=0,
+        verbose_name="Membros"
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Atualizado em"
+    )
+
+    class Meta:
+        abstract = True
+        ordering = ['-total_points', 'name']
+
+    def __str__(self):
+        return f"{self.name} - {self.total_points} pontos ({self.members} membros)"
+
+
+class SchoolScore(CohortScore):
+    """Pontuação agregada por escola (User.school)."""
+
+    class Meta(CohortScore.Meta):
+        db_table = 'school_scores'
+        verbose_name = 'Pontuação de Escola'
+        verbose_name_plural = 'Pontuações de Escolas'
+        indexes = [
+            models.Index(fields=['-total_points', 'name'], name='school_scores_ranking_idx'),
+        ]
+
+
+class CityScore(CohortScore):
+    """Pontuação agregada por cidade (User.city)."""
+
+    class Meta(CohortScore.Meta):
+        db_table = 'city_scores'
+        verbose_name = 'Pontuação de Cidade'
+        verbose_name_plural = 'Pontuações de Cidades'
+        indexes = [
+            models.Index(fields=['-total_points', 'name'], name='city_scores_ranking_idx'),
+        ]
+
+
+class LedgerRollup(models.Model):
+    """
+    Pontos ganhos por um usuário em uma hora ou em um dia (créditos do
+    TokenLedger, sem estornos de resgate). Mantido a cada lançamento e usado
+    nos rankings por período.
+    """
+
+    GRANULARITY_HOUR = 'hora'
+    GRANULARITY_DAY = 'dia'
+
+    GRANULARITY_CHOICES = [
+        (GRANULARITY_HOUR, 'Hora'),
+        (GRANULARITY_DAY, 'Dia'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='ledger_rollups',
+        verbose_name="Usuário"
+    )
+
+    granularity = models.CharField(
+        max_length=4,
+        choices=GRANULARITY_CHOICES,
+        verbose_name="Granularidade"
+    )
+
+    bucket_start = models.DateTimeField(
+        verbose_name="Início do Intervalo"
+    )
+
+    points = models.BigIntegerField(
+        default=0,
+        verbose_name="Pontos"
+    )
+
+    class Meta:
+        db_table = 'ledger_rollups'
+        verbose_name = 'Consolidado do Ledger'
+        verbose_name_plural = 'Consolidados do Ledger'
+        unique_together = ['granularity', 'bucket_start', 'user']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}: {self.points}"
+
+
 # Mantém a classe Token original para compatibilidade com testes
 class Token:
     """Classe legada para compatibilidade com testes."""
@@ -1,5 +1,8 @@
 """Modulo de servicos de tokens."""
 
+from .ranking import Colocacao, Ranking, obter_ranking
+from .ranking_grupos import ColocacaoGrupo, RankingGrupos
+from .ranking_periodo import RankingPeriodo
 from .token_servico import TokenService
 from .token_strategy import (
     TokenStrategy,
@@ -11,6 +14,12 @@ from .token_strategy import (
 )
 
 __all__ = [
+    'Colocacao',
+    'Ranking',
+    'obter_ranking',
+    'ColocacaoGrupo',
+    'RankingGrupos',
+    'RankingPeriodo',
     'TokenService',
     'TokenStrategy',
     'ReciclagemStrategy',
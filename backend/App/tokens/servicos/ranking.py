@@ -0,0 +1,329 @@
+import math
+import random
+import threading
+import time
+from itertools import islice
+from typing import NamedTuple
+
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+class Colocacao(NamedTuple):
+    """Uma linha do ranking; empates dividem a mesma posição."""
+
+    posicao: int
+    user_id: int
+    pontos: int
+
+
+class _No:
+    __slots__ = ('chave', 'proximos', 'larguras')
+
+    def __init__(self, chave, niveis):
+        self.chave = chave
+        self.proximos = [None] * niveis
+        self.larguras = [1] * niveis
+
+
+class ListaIndexada:
+    """
+    Skip list ordenada em que cada ligação guarda quantas posições ela pula.
+    Inserir, remover, contar as chaves menores que uma dada e chegar a uma
+    posição custam O(log n) em média.
+    """
+
+    NIVEIS = 32
+
+    def __init__(self):
+        self._cabeca = _No(None, self.NIVEIS)
+        self._tamanho = 0
+
+    def __len__(self):
+        return self._tamanho
+
+    def _anteriores(self, chave):
+        """Último nó antes de `chave` em cada nível e a posição de cada um."""
+        anteriores = [None] * self.NIVEIS
+        posicoes = [0] * self.NIVEIS
+        no, posicao = self._cabeca, 0
+        for nivel in reversed(range(self.NIVEIS)):
+            while no.proximos[nivel] is not None and no.proximos[nivel].chave < chave:
+                posicao += no.larguras[nivel]
+                no = no.proximos[nivel]
+            anteriores[nivel], posicoes[nivel] = no, posicao
+        return anteriores, posicoes
+
+    def inserir(self, chave) -> None:
+        niveis = min(self.NIVEIS, 1 + int(math.log2(1.0 / (1.0 - random.random()))))
+        anteriores, posicoes = self._anteriores(chave)
+        posicao = posicoes[0]
+        novo = _No(chave, niveis)
+        for nivel in range(niveis):
+            anterior = anteriores[nivel]
+            saltados = posicao - posicoes[nivel]
+            novo.proximos[nivel] = anterior.proximos[nivel]
+            anterior.proximos[nivel] = novo
+            novo.larguras[nivel] = anterior.larguras[nivel] - saltados
+            anterior.larguras[nivel] = saltados + 1
+        for nivel in range(niveis, self.NIVEIS):
+            anteriores[nivel].larguras[nivel] += 1
+        self._tamanho += 1
+
+    def remover(self, chave) -> None:
+        anteriores, _ = self._anteriores(chave)
+        alvo = anteriores[0].proximos[0]
+        if alvo is None or alvo.chave != chave:
+            raise KeyError(chave)
+        for nivel in range(self.NIVEIS):
+            anterior = anteriores[nivel]
+            if anterior.proximos[nivel] is alvo:
+                anterior.larguras[nivel] += alvo.larguras[nivel] - 1
+                anterior.proximos[nivel] = alvo.proximos[nivel]
+            else:
+                anterior.larguras[nivel] -= 1
+        self._tamanho -= 1
+
+    def contar_menores(self, chave) -> int:
+        """Quantas chaves são menores que `chave`."""
+        return self._anteriores(chave)[1][0]
+
+    def a_partir(self, indice):
+        """Percorre as chaves em ordem a partir da posição `indice` (0 = primeira)."""
+        if indice >= self._tamanho:
+            return
+        no, posicao = self._cabeca, 0
+        for nivel in reversed(range(self.NIVEIS)):
+            while no.proximos[nivel] is not None and posicao + no.larguras[nivel] <= indice + 1:
+                posicao += no.larguras[nivel]
+                no = no.proximos[nivel]
+        while no is not None:
+            yield no.chave
+            no = no.proximos[0]
+
+
+class Placar:
+    """
+    Pontuações de todos os usuários ordenadas por (-pontos, user_id). A
+    posição de quem tem `p` pontos é 1 + quantos têm mais que `p`.
+    """
+
+    def __init__(self, pontuacoes=()):
+        self._lista = ListaIndexada()
+        self._pontos = {}
+        for user_id, pontos in pontuacoes:
+            self.atualizar(user_id, pontos)
+
+    def __len__(self):
+        return len(self._pontos)
+
+    def atualizar(self, user_id, pontos) -> None:
+        anteriores = self._pontos.get(user_id)
+        if anteriores == pontos:
+            return
+        if anteriores is not None:
+            self._lista.remover((-anteriores, user_id))
+        self._lista.inserir((-pontos, user_id))
+        self._pontos[user_id] = pontos
+
+    def posicao(self, user_id) -> int:
+        """Usuários fora do placar (recém-criados) contam com 0 pontos."""
+        return self._lista.contar_menores((-self._pontos.get(user_id, 0),)) + 1
+
+    def top(self, quantidade) -> list:
+        return self._colocacoes(0, quantidade)
+
+    def ao_redor(self, user_id, raio) -> list:
+        indice = self._lista.contar_menores((-self._pontos.get(user_id, 0), user_id))
+        inicio = max(0, indice - raio)
+        return self._colocacoes(inicio, indice - inicio + raio + 1)
+
+    def _colocacoes(self, inicio, quantidade) -> list:
+        colocacoes = []
+        for indice, (negativo, user_id) in enumerate(islice(self._lista.a_partir(inicio), quantidade), inicio):
+            if colocacoes and colocacoes[-1].pontos == -negativo:
+                posicao = colocacoes[-1].posicao
+            elif colocacoes:
+                posicao = indice + 1
+            else:
+                posicao = self._lista.contar_menores((negativo,)) + 1
+            colocacoes.append(Colocacao(posicao, user_id, -negativo))
+        return colocacoes
+
+
+class Ranking:
+    """
+    Ranking de pontos em memória do processo.
+
+    O placar é carregado em uma thread na primeira consulta e depois
+    acompanha o TokenLedger: os lançamentos deste processo entram no commit,
+    e os de outros workers são buscados no máximo uma vez por
+    INTERVALO_SINCRONIA, relendo os saldos de quem tem lançamento com data a
+    partir de JANELA_SOBREPOSICAO antes da sincronia anterior. A data é
+    gravada antes do commit, então a sobreposição cobre transações que
+    terminam fora de ordem (um corte por pk perderia as que commitam depois
+    de uma de pk maior).
+
+    Saldos alterados fora do TokenLedger (UPDATE direto, admin) e transações
+    mais longas que a janela só aparecem na recarga completa, feita em
+    segundo plano a cada INTERVALO_RECARGA. Limite de atraso: lançamentos em
+    até INTERVALO_SINCRONIA; o resto, em até INTERVALO_RECARGA mais o tempo
+    da carga. Enquanto o placar não está pronto, as consultas vão ao banco
+    usando o índice de total_points.
+    """
+
+    INTERVALO_SINCRONIA = 1.0
+    JANELA_SOBREPOSICAO = timedelta(seconds=30)
+    INTERVALO_RECARGA = 300.0
+
+    def __init__(self, carga_automatica=True):
+        self.carga_automatica = carga_automatica
+        self._placar = None
+        self._sincronizado_desde = None
+        self._proxima_sincronia = 0.0
+        self._proxima_recarga = 0.0
+        self._carregando = False
+        self._lock = threading.Lock()
+
+    @property
+    def pronto(self) -> bool:
+        return self._placar is not None
+
+    def carregar(self) -> None:
+        """Monta (ou remonta) o placar a partir de users.total_points."""
+        from django.contrib.auth import get_user_model
+
+        # Marcado antes da leitura: lançamentos no meio da carga são reaplicados depois
+        desde = timezone.now() - self.JANELA_SOBREPOSICAO
+        placar = Placar(
+            get_user_model().objects.values_list('pk', 'total_points').iterator(chunk_size=5000)
+        )
+        with self._lock:
+            self._placar = placar
+            self._sincronizado_desde = desde
+            self._proxima_sincronia = time.monotonic() + self.INTERVALO_SINCRONIA
+            self._proxima_recarga = time.monotonic() + self.INTERVALO_RECARGA
+
+    def iniciar_carga(self) -> None:
+        """Carrega o placar em segundo plano, uma vez por vez e só se ainda não há placar ou a recarga venceu."""
+        with self._lock:
+            if self._carregando or (self._placar is not None and time.monotonic() < self._proxima_recarga):
+                return
+            self._carregando = True
+
+        def carregar():
+            try:
+                self.carregar()
+            finally:
+                with self._lock:
+                    self._carregando = False
+                connection.close()
+
+        threading.Thread(target=carregar, name='carga-ranking', daemon=True).start()
+
+    def aplicar(self, saldos) -> None:
+        """Atualiza o placar com {user_id: total_points}."""
+        with self._lock:
+            if self._placar is not None:
+                for user_id, pontos in saldos.items():
+                    self._placar.atualizar(user_id, pontos)
+
+    def sincronizar(self, forcar=False) -> None:
+        """Aplica os saldos de quem teve lançamentos desde a última sincronia."""
+        if self._placar is None or (not forcar and time.monotonic() < self._proxima_sincronia):
+            return
+        from django.contrib.auth import get_user_model
+        from App.tokens.models import TokenLedger
+
+        self._proxima_sincronia = time.monotonic() + self.INTERVALO_SINCRONIA
+        agora = timezone.now()
+        usuarios = TokenLedger.objects.filter(date__gte=self._sincronizado_desde).values('user_id')
+        self.aplicar(dict(
+            get_user_model().objects.filter(pk__in=usuarios).values_list('pk', 'total_points')
+        ))
+        self._sincronizado_desde = agora - self.JANELA_SOBREPOSICAO
+
+    def _placar_atual(self):
+        if self.carga_automatica and (self._placar is None or time.monotonic() >= self._proxima_recarga):
+            self.iniciar_carga()
+        if self._placar is None:
+            return None
+        self.sincronizar()
+        return self._placar
+
+    def top(self, quantidade=10) -> list:
+        """As `quantidade` primeiras colocações."""
+        placar = self._placar_atual()
+        if placar is None:
+            return self._top_no_banco(quantidade)
+        with self._lock:
+            return placar.top(quantidade)
+
+    def posicao(self, user_id) -> int:
+        """Posição do usuário (1 = primeiro lugar)."""
+        placar = self._placar_atual()
+        if placar is None:
+            return self._posicao_no_banco(user_id)
+        with self._lock:
+            return placar.posicao(user_id)
+
+    def ao_redor(self, user_id, raio=5) -> list:
+        """O usuário e até `raio` colocações acima e abaixo dele."""
+        placar = self._placar_atual()
+        if placar is None:
+            return self._ao_redor_no_banco(user_id, raio)
+        with self._lock:
+            return placar.ao_redor(user_id, raio)
+
+    @staticmethod
+    def _usuarios():
+        from django.contrib.auth import get_user_model
+        return get_user_model().objects
+
+    def _top_no_banco(self, quantidade) -> list:
+        linhas = list(self._usuarios().order_by('-total_points', 'pk').values_list('pk', 'total_points')[:quantidade])
+        return self._numerar(linhas)
+
+    def _posicao_no_banco(self, user_id) -> int:
+        pontos = self._usuarios().filter(pk=user_id).values_list('total_points', flat=True).first() or 0
+        return self._usuarios().filter(total_points__gt=pontos).count() + 1
+
+    def _ao_redor_no_banco(self, user_id, raio) -> list:
+        usuarios = self._usuarios()
+        pontos = usuarios.filter(pk=user_id).values_list('total_points', flat=True).first() or 0
+        acima = Q(total_points__gt=pontos) | Q(total_points=pontos, pk__lt=user_id)
+        linhas = list(usuarios.filter(acima).order_by('total_points', '-pk').values_list('pk', 'total_points')[:raio])
+        linhas.reverse()
+        linhas += usuarios.exclude(acima).order_by('-total_points', 'pk').values_list('pk', 'total_points')[:raio + 1]
+        return self._numerar(linhas)
+
+    def _numerar(self, linhas) -> list:
+        """Numera linhas consecutivas do ranking a partir da contagem de quem está acima da primeira."""
+        if not linhas:
+            return []
+        user_id, pontos = linhas[0]
+        acima = self._usuarios().aggregate(
+            maiores=Count('pk', filter=Q(total_points__gt=pontos)),
+            empatados=Count('pk', filter=Q(total_points=pontos, pk__lt=user_id)),
+        )
+        colocacoes = []
+        for indice, (user_id, pontos) in enumerate(linhas, acima['maiores'] + acima['empatados']):
+            if colocacoes and colocacoes[-1].pontos == pontos:
+                posicao = colocacoes[-1].posicao
+            elif colocacoes:
+                posicao = indice + 1
+            else:
+                posicao = acima['maiores'] + 1
+            colocacoes.append(Colocacao(posicao, user_id, pontos))
+        return colocacoes
+
+
+_ranking = Ranking()
+
+
+def obter_ranking() -> Ranking:
+    """Ranking de pontos compartilhado pelo processo."""
+    return _ranking
@@ -0,0 +1,163 @@
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Now
+
+
+class ColocacaoGrupo(NamedTuple):
+    """Uma linha do ranking de escolas ou cidades; empates dividem a posição."""
+
+    posicao: int
+    nome: str
+    pontos: int
+    membros: int
+
+
+def normalizar_nome(nome):
+    """Nome do grupo com espaços normalizados; vazio vira None (sem grupo)."""
+    nome = ' '.join((nome or '').split())
+    return nome or None
+
+
+class RankingGrupos:
+    """
+    Ranking de escolas e cidades sobre as tabelas agregadas SchoolScore e
+    CityScore. Os totais são ajustados logo após o commit dos lançamentos
+    (um UPDATE com CASE por tabela, em transação própria, para não prender a
+    linha do grupo na transação do lançamento), então as consultas leem só as
+    linhas dos grupos, sem agrupar usuários.
+    """
+
+    ESCOLA = 'escola'
+    CIDADE = 'cidade'
+
+    # Grupos por UPDATE (2 parâmetros SQL por grupo em cada CASE)
+    GRUPOS_POR_UPDATE = 200
+
+    @staticmethod
+    def _grupos():
+        from App.tokens.models import CityScore, SchoolScore
+        return {RankingGrupos.ESCOLA: (SchoolScore, 'school'), RankingGrupos.CIDADE: (CityScore, 'city')}
+
+    def aplicar_deltas(self, deltas) -> None:
+        """
+        Soma a cada grupo a variação de saldo ({user_id: delta}) dos seus membros.
+        Os lançamentos a chamam depois do commit, em lote (FilaAgregada).
+        """
+        from django.contrib.auth import get_user_model
+
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        grupos = self._grupos()
+        usuarios = get_user_model().objects.filter(pk__in=deltas).order_by().values_list(
+            'pk', *(campo for _, campo in grupos.values())
+        )
+        somas = {grupo: defaultdict(int) for grupo in grupos}
+        for user_id, *nomes in usuarios:
+            for grupo, nome in zip(grupos, nomes):
+                nome = normalizar_nome(nome)
+                if nome:
+                    somas[grupo][nome] += deltas[user_id]
+        for grupo, (modelo, _) in grupos.items():
+            self._somar(modelo, somas[grupo])
+
+    @staticmethod
+    def deltas_dos_lancamentos(transacoes) -> dict:
+        """{user_id: variação de saldo} dos lançamentos, sem zeros."""
+        deltas = defaultdict(int)
+        for transacao in transacoes:
+            deltas[transacao.user_id] += transacao.obter_delta()
+        return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+    def aplicar_lancamentos(self, transacoes) -> None:
+        self.aplicar_deltas(self.deltas_dos_lancamentos(transacoes))
+
+    def mover_usuario(self, antes, depois) -> None:
+        """
+        Ajusta os grupos quando um usuário é criado, editado ou removido.
+        `antes` e `depois` são dicts com school, city e total_points (ou None).
+        """
+        for grupo, (modelo, campo) in self._grupos().items():
+            pontos, membros = defaultdict(int), defaultdict(int)
+            if antes and normalizar_nome(antes[campo]):
+                nome = normalizar_nome(antes[campo])
+                pontos[nome] -= antes['total_points']
+                membros[nome] -= 1
+            if depois and normalizar_nome(depois[campo]):
+                nome = normalizar_nome(depois[campo])
+                pontos[nome] += depois['total_points']
+                membros[nome] += 1
+            self._somar(modelo, pontos, membros)
+
+    def _somar(self, modelo, pontos, membros=None) -> None:
+        membros = membros or {}
+        nomes = sorted(nome for nome in set(pontos) | set(membros) if pontos.get(nome) or membros.get(nome))
+        if not nomes:
+            return
+        with transaction.atomic():
+            modelo.objects.bulk_create([modelo(name=nome) for nome in nomes], ignore_conflicts=True)
+            for inicio in range(0, len(nomes), self.GRUPOS_POR_UPDATE):
+                bloco = nomes[inicio:inicio + self.GRUPOS_POR_UPDATE]
+                campos = {'updated_at': Now()}
+                if any(pontos.get(nome) for nome in bloco):
+                    campos['total_points'] = F('total_points') + Case(
+                        *[When(name=nome, then=Value(pontos[nome])) for nome in bloco if pontos.get(nome)],
+                        default=Value(0),
+                    )
+                if any(membros.get(nome) for nome in bloco):
+                    campos['members'] = F('members') + Case(
+                        *[When(name=nome, then=Value(membros[nome])) for nome in bloco if membros.get(nome)],
+                        default=Value(0),
+                    )
+                modelo.objects.filter(name__in=bloco).update(**campos)
+
+    def reconstruir(self) -> dict:
+        """Recalcula as tabelas do zero com um GROUP BY em users. Retorna {grupo: linhas}."""
+        from django.contrib.auth import get_user_model
+
+        usuarios = get_user_model().objects.order_by()
+        linhas = {}
+        for grupo, (modelo, campo) in self._grupos().items():
+            totais = defaultdict(lambda: [0, 0])
+            for nome, pontos, membros in usuarios.exclude(**{f'{campo}__isnull': True}).values(campo).annotate(
+                pontos=Sum('total_points'), membros=Count('pk')
+            ).values_list(campo, 'pontos', 'membros'):
+                nome = normalizar_nome(nome)
+                if nome:
+                    totais[nome][0] += pontos
+                    totais[nome][1] += membros
+            with transaction.atomic():
+                modelo.objects.all().delete()
+                modelo.objects.bulk_create(
+                    [modelo(name=nome, total_points=pontos, members=membros)
+                     for nome, (pontos, membros) in totais.items()],
+                    batch_size=1000,
+                )
+            linhas[grupo] = len(totais)
+        return linhas
+
+    def top(self, grupo, quantidade=10) -> list:
+        """Os `quantidade` primeiros grupos por pontos."""
+        modelo, _ = self._grupos()[grupo]
+        colocacoes = []
+        for indice, (nome, pontos, membros) in enumerate(
+            modelo.objects.order_by('-total_points', 'name').values_list('name', 'total_points', 'members')[:quantidade]
+        ):
+            if colocacoes and colocacoes[-1].pontos == pontos:
+                posicao = colocacoes[-1].posicao
+            else:
+                posicao = indice + 1
+            colocacoes.append(ColocacaoGrupo(posicao, nome, pontos, membros))
+        return colocacoes
+
+    def posicao(self, grupo, nome):
+        """Colocação do grupo `nome`, ou None se ele não existe."""
+        modelo, _ = self._grupos()[grupo]
+        linha = modelo.objects.filter(name=normalizar_nome(nome)).values_list('name', 'total_points', 'members').first()
+        if linha is None:
+            return None
+        nome, pontos, membros = linha
+        return ColocacaoGrupo(modelo.objects.filter(total_points__gt=pontos).count() + 1, nome, pontos, membros)
@@ -0,0 +1,226 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .ranking import Colocacao
+
+
+def inicio_da_hora(momento):
+    return timezone.localtime(momento).replace(minute=0, second=0, microsecond=0)
+
+
+def inicio_do_dia(data):
+    """Meia-noite local do dia `data` (date)."""
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+class RankingPeriodo:
+    """
+    Rankings de pontos ganhos em um intervalo (semana, mês ou qualquer janela
+    em horas inteiras), montados a partir de LedgerRollup: os dias inteiros da
+    janela vêm dos consolidados diários e as pontas, dos horários. Cada
+    lançamento soma nos dois consolidados depois do commit, com um INSERT
+    ... ON CONFLICT DO UPDATE.
+
+    O resultado fica no cache até chegar um lançamento em algum dia da janela:
+    cada dia tem uma versão no cache, trocada no commit. Versão expirada ou
+    descartada pelo cache conta como falta: ganha um valor novo e o resultado
+    é recalculado.
+    """
+
+    CHAVE_VERSAO = "tokens:ranking_periodo:versao:{dia}"
+    CHAVE_GERACAO = "tokens:ranking_periodo:geracao"
+    CHAVE_RESULTADO = "tokens:ranking_periodo:{inicio}:{fim}:{quantidade}"
+    TTL_RESULTADO = 24 * 60 * 60
+    # Versões duram mais que os resultados guardados com elas
+    TTL_VERSAO = 2 * TTL_RESULTADO
+
+    # Limite de linhas por INSERT (4 parâmetros SQL por linha)
+    LINHAS_POR_INSERT = 200
+
+    @staticmethod
+    def contabiliza(transacao) -> bool:
+        """Só créditos ganhos contam; estornos de resgate não."""
+        from App.tokens.models import TokenLedger
+        return transacao.type == TokenLedger.TYPE_CREDIT and transacao.source != TokenLedger.SOURCE_REWARD
+
+    def registrar(self, transacoes) -> None:
+        """Soma os lançamentos aos consolidados, numa transação própria (ou na atual)."""
+        from App.tokens.models import LedgerRollup
+
+        por_intervalo = defaultdict(lambda: defaultdict(int))
+        # Intervalos de cada minuto já visto: um lote grande costuma caber em
+        # poucos minutos, e a conversão para a hora local é o passo caro
+        intervalos = {}
+        for transacao in transacoes:
+            if not self.contabiliza(transacao):
+                continue
+            minuto = (transacao.date or timezone.now()).replace(second=0, microsecond=0)
+            if minuto not in intervalos:
+                dia = timezone.localtime(minuto).date()
+                intervalos[minuto] = (
+                    dia,
+                    (LedgerRollup.GRANULARITY_HOUR, inicio_da_hora(minuto)),
+                    (LedgerRollup.GRANULARITY_DAY, inicio_do_dia(dia)),
+                )
+            _, hora, dia = intervalos[minuto]
+            por_intervalo[hora][transacao.user_id] += transacao.amount
+            por_intervalo[dia][transacao.user_id] += transacao.amount
+        if not por_intervalo:
+            return
+
+        linhas = sorted(
+            (granularidade, inicio, user_id, pontos)
+            for (granularidade, inicio), somas in por_intervalo.items()
+            for user_id, pontos in somas.items()
+        )  # ordem fixa de travamento evita deadlocks
+        with transaction.atomic():
+            for comeco in range(0, len(linhas), self.LINHAS_POR_INSERT):
+                self._somar(linhas[comeco:comeco + self.LINHAS_POR_INSERT])
+        dias = {dia for dia, _, _ in intervalos.values()}
+        transaction.on_commit(lambda: self._avancar_versoes(dias))
+
+    @staticmethod
+    def _somar(linhas) -> None:
+        """
+        Soma os pontos nos consolidados com um único INSERT ... ON CONFLICT DO
+        UPDATE: cria os que faltam e incrementa os existentes.
+        """
+        from App.tokens.models import LedgerRollup
+
+        ops = connection.ops
+        tabela = ops.quote_name(LedgerRollup._meta.db_table)
+        sql = f"""
+            INSERT INTO {tabela} (granularity, bucket_start, user_id, points)
+            VALUES {', '.join(['(%s, %s, %s, %s)'] * len(linhas))}
+            ON CONFLICT (granularity, bucket_start, user_id)
+            DO UPDATE SET points = {tabela}.points + excluded.points
+        """
+        parametros = []
+        for granularidade, inicio, user_id, pontos in linhas:
+            parametros += [granularidade, ops.adapt_datetimefield_value(inicio), user_id, pontos]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+
+    def _avancar_versoes(self, dias) -> None:
+        # Valor único (e não incremento), para não coincidir com uma versão
+        # antiga depois que a chave sai do cache
+        versao = time_ns()
+        cache.set_many(
+            {self.CHAVE_VERSAO.format(dia=dia.isoformat()): versao for dia in dias}, timeout=self.TTL_VERSAO
+        )
+
+    def _versoes(self, chaves):
+        """Versões atuais das chaves; as que faltam no cache são criadas com um valor novo."""
+        versoes = cache.get_many(chaves)
+        faltando = [chave for chave in chaves if chave not in versoes]
+        if faltando:
+            versao = time_ns()
+            for chave in faltando:
+                cache.add(chave, versao, timeout=self.TTL_VERSAO)
+            versoes.update(cache.get_many(faltando))
+        return tuple(versoes.get(chave) for chave in chaves)
+
+    def ranking(self, inicio, fim, quantidade=10) -> list:
+        """
+        As `quantidade` maiores somas de pontos ganhos em [inicio, fim). Os
+        limites são arredondados para o início da hora.
+        """
+        inicio, fim = inicio_da_hora(inicio), inicio_da_hora(fim)
+        if fim <= inicio:
+            return []
+
+        ultimo = (fim - timedelta(microseconds=1)).date()
+        dias = [inicio.date() + timedelta(days=n) for n in range((ultimo - inicio.date()).days + 1)]
+        chaves = [self.CHAVE_GERACAO] + [self.CHAVE_VERSAO.format(dia=dia.isoformat()) for dia in dias]
+        versoes = self._versoes(chaves)
+        if None in versoes:
+            # Cache sem espaço nem para as versões: calcula sem guardar
+            return self._calcular(inicio, fim, quantidade)
+
+        chave = self.CHAVE_RESULTADO.format(inicio=inicio.isoformat(), fim=fim.isoformat(), quantidade=quantidade)
+        guardado = cache.get(chave)
+        if guardado is not None and guardado[0] == versoes:
+            return guardado[1]
+
+        resultado = self._calcular(inicio, fim, quantidade)
+        cache.set(chave, (versoes, resultado), timeout=self.TTL_RESULTADO)
+        return resultado
+
+    def _calcular(self, inicio, fim, quantidade) -> list:
+        from App.tokens.models import LedgerRollup
+
+        hora, dia = LedgerRollup.GRANULARITY_HOUR, LedgerRollup.GRANULARITY_DAY
+        primeiro_dia = inicio_do_dia(inicio.date())
+        if primeiro_dia < inicio:
+            primeiro_dia = inicio_do_dia(inicio.date() + timedelta(days=1))
+        ultimo_dia = inicio_do_dia(fim.date())
+
+        if primeiro_dia >= ultimo_dia:
+            filtro = Q(granularity=hora, bucket_start__gte=inicio, bucket_start__lt=fim)
+        else:
+            filtro = (
+                Q(granularity=dia, bucket_start__gte=primeiro_dia, bucket_start__lt=ultimo_dia)
+                | Q(granularity=hora, bucket_start__gte=inicio, bucket_start__lt=primeiro_dia)
+                | Q(granularity=hora, bucket_start__gte=ultimo_dia, bucket_start__lt=fim)
+            )
+        linhas = LedgerRollup.objects.filter(filtro).values('user_id').annotate(
+            total=Sum('points')
+        ).filter(total__gt=0).order_by('-total', 'user_id').values_list('user_id', 'total')[:quantidade]
+
+        colocacoes = []
+        for indice, (user_id, pontos) in enumerate(linhas):
+            if colocacoes and colocacoes[-1].pontos == pontos:
+                posicao = colocacoes[-1].posicao
+            else:
+                posicao = indice + 1
+            colocacoes.append(Colocacao(posicao, user_id, pontos))
+        return colocacoes
+
+    def ranking_semanal(self, data=None, quantidade=10) -> list:
+        """Ranking da semana (segunda a domingo) que contém `data` (padrão: hoje)."""
+        data = data or timezone.localdate()
+        segunda = data - timedelta(days=data.weekday())
+        return self.ranking(inicio_do_dia(segunda), inicio_do_dia(segunda + timedelta(days=7)), quantidade)
+
+    def ranking_mensal(self, data=None, quantidade=10) -> list:
+        """Ranking do mês que contém `data` (padrão: hoje)."""
+        data = data or timezone.localdate()
+        primeiro = data.replace(day=1)
+        proximo = (primeiro + timedelta(days=32)).replace(day=1)
+        return self.ranking(inicio_do_dia(primeiro), inicio_do_dia(proximo), quantidade)
+
+    def reconstruir(self) -> int:
+        """Refaz todos os consolidados a partir do TokenLedger. Retorna quantas linhas gerou."""
+        from App.tokens.models import LedgerRollup, TokenLedger
+
+        creditos = TokenLedger.objects.filter(type=TokenLedger.TYPE_CREDIT).exclude(
+            source=TokenLedger.SOURCE_REWARD
+        ).order_by()
+        fuso = timezone.get_current_timezone()
+        linhas = 0
+        with transaction.atomic():
+            LedgerRollup.objects.all().delete()
+            for granularidade, truncar in (
+                (LedgerRollup.GRANULARITY_HOUR, TruncHour('date', tzinfo=fuso)),
+                (LedgerRollup.GRANULARITY_DAY, TruncDay('date', tzinfo=fuso)),
+            ):
+                consolidados = [
+                    LedgerRollup(granularity=granularidade, bucket_start=inicio, user_id=user_id, points=pontos)
+                    for user_id, inicio, pontos in creditos.annotate(inicio=truncar).values(
+                        'user_id', 'inicio'
+                    ).annotate(pontos=Sum('amount')).values_list('user_id', 'inicio', 'pontos').iterator()
+                ]
+                LedgerRollup.objects.bulk_create(consolidados, batch_size=1000)
+                linhas += len(consolidados)
+            transaction.on_commit(self._nova_geracao)
+        return linhas
+
+    def _nova_geracao(self) -> None:
+        cache.set(self.CHAVE_GERACAO, time_ns(), timeout=self.TTL_VERSAO)
@@ -0,0 +1,99 @@
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from App.versao import VersaoCompartilhada
+
+from .token_strategy import (
+    ReciclagemStrategy, TransporteStrategy,
+    EconomiaRecursosStrategy, DescarteCorretoStrategy,
+    PlantioArvoreStrategy
+)
+
+# Estratégia de cada tipo de ação (mesmos nomes de ActionType.TYPE_CHOICES)
+CLASSES_ESTRATEGIA = {
+    "Reciclagem": ReciclagemStrategy,
+    "Transporte": TransporteStrategy,
+    "EconomiaRecursos": EconomiaRecursosStrategy,
+    "DescarteCorreto": DescarteCorretoStrategy,
+    "PlantioArvore": PlantioArvoreStrategy,
+}
+
+# Chave, no cache do Django, do contador de versão compartilhado entre workers
+CHAVE_VERSAO = "tokens:tabela_estrategias:versao"
+
+# Intervalo (segundos) entre leituras do contador. Com um cache compartilhado
+# (CACHE_URL, ver Core/settings.py), alterações feitas em outro worker aparecem
+# neste processo em até esse tempo; com o LocMemCache padrão, só as do próprio
+# processo são vistas
+INTERVALO_VERIFICACAO = 1.0
+
+_versao = None
+
+
+class TabelaEstrategias(NamedTuple):
+    """Tabela imutável de estratégias compilada a partir de ActionType."""
+
+    versao: object
+    estrategias: Mapping
+    tipos_por_id: Mapping
+
+
+def django_pronto() -> bool:
+    """Indica se o Django está configurado (os scripts de teste avulsos não o configuram)."""
+    from django.apps import apps
+    return apps.ready
+
+
+def _versao_compartilhada():
+    """Contador de versão (VersaoCompartilhada), criado no primeiro uso com o Django pronto."""
+    global _versao
+    if _versao is None:
+        _versao = VersaoCompartilhada(CHAVE_VERSAO, INTERVALO_VERIFICACAO)
+    return _versao
+
+
+def obter_versao():
+    """
+    Versão atual da tabela, lida do cache (sem consulta ao banco) no máximo uma
+    vez por INTERVALO_VERIFICACAO; None sem Django configurado.
+    """
+    if not django_pronto():
+        return None
+    return _versao_compartilhada().obter()
+
+
+def invalidar_tabela() -> None:
+    """Incrementa a versão para que todos os workers recarreguem a tabela."""
+    _versao_compartilhada().invalidar()
+
+
+def compilar_tabela(versao=None, substituicoes=None) -> TabelaEstrategias:
+    """
+    Monta a tabela com os pontos de ActionType.base_points. Tipos sem cadastro
+    (ou sem banco disponível) usam os pontos padrão das estratégias, e
+    `substituicoes` ({tipo: estrategia}) prevalece sobre ambos.
+    """
+    pontos = {}
+    tipos_por_id = {}
+    if versao is not None:
+        from django.db import DatabaseError
+        from App.actions.models import ActionType
+
+        try:
+            for action_type_id, nome, base_points in ActionType.objects.order_by().values_list(
+                "id", "name", "base_points"
+            ):
+                pontos[nome] = base_points
+                tipos_por_id[action_type_id] = nome
+        except DatabaseError:
+            pontos, tipos_por_id = {}, {}
+
+    estrategias = {
+        nome: classe(pontos.get(nome)) for nome, classe in CLASSES_ESTRATEGIA.items()
+    }
+    estrategias.update(substituicoes or {})
+    return TabelaEstrategias(
+        versao=versao,
+        estrategias=MappingProxyType(estrategias),
+        tipos_por_id=MappingProxyType(tipos_por_id),
+    )
@@ -1,9 +1,6 @@
-from .token_strategy import (
-    ReciclagemStrategy, TransporteStrategy,
-    EconomiaRecursosStrategy, DescarteCorretoStrategy,
-    PlantioArvoreStrategy
-)
+from .tabela_estrategias import compilar_tabela, obter_versao
 import threading
+from types import MappingProxyType, SimpleNamespace
  
 class TokenService:
     """Serviço de gerenciamento de tokens usando padrões Singleton e Strategy."""
@@ -12,22 +9,71 @@ class TokenService:
     _lock = threading.Lock()
  
     def __new__(cls):
-        """Implementa padrão Singleton."""
+        """
+        Implementa padrão Singleton com verificação dupla: a instância só é
+        publicada em `_instance` depois de totalmente montada.
+        """
         if cls._instance is None:
-            cls._instance = super(TokenService, cls).__new__(cls)
+            with cls._lock:
+                if cls._instance is None:
+                    instancia = super(TokenService, cls).__new__(cls)
+                    instancia._substituicoes = MappingProxyType({})
+                    instancia._tabela = compilar_tabela(obter_versao())
+                    instancia._vetores = None
+                    cls._instance = instancia
         return cls._instance
  
     def __init__(self):
-        """Inicializa estratégias de cálculo de tokens."""
-        if not hasattr(self, "estrategias"):
-            self.estrategias = {
-                "Reciclagem": ReciclagemStrategy(),
-                "Transporte": TransporteStrategy(),
-                "EconomiaRecursos": EconomiaRecursosStrategy(),
-                "DescarteCorreto": DescarteCorretoStrategy(),
-                "PlantioArvore": PlantioArvoreStrategy()
-            }
-            self.strategies = self.estrategias
+        """Estratégias são inicializadas em __new__, uma única vez."""
+
+    @property
+    def tabela(self):
+        """
+        Tabela imutável de estratégias, carregada de ActionType uma vez por
+        processo e recarregada só quando a versão compartilhada muda.
+
+        A leitura não usa lock: a tabela nunca é alterada, só substituída por
+        inteiro (copy-on-write). Enquanto outra thread recarrega, a tabela
+        anterior continua sendo usada.
+        """
+        tabela = self._tabela
+        versao = obter_versao()
+        if versao != tabela.versao and self._lock.acquire(blocking=False):
+            try:
+                tabela = self._tabela
+                if versao != tabela.versao:
+                    tabela = compilar_tabela(versao, self._substituicoes)
+                    self._tabela = tabela
+            finally:
+                self._lock.release()
+        return tabela
+
+    def trocar_estrategia(self, tipo_acao, estrategia):
+        """Substitui a estratégia de um tipo de ação de forma atômica."""
+        with self._lock:
+            self._substituicoes = MappingProxyType({**self._substituicoes, tipo_acao: estrategia})
+            tabela = self._tabela
+            self._tabela = tabela._replace(
+                estrategias=MappingProxyType({**tabela.estrategias, tipo_acao: estrategia})
+            )
+
+    def restaurar_estrategia(self, tipo_acao):
+        """Desfaz a substituição feita por `trocar_estrategia` para o tipo de ação."""
+        with self._lock:
+            substituicoes = dict(self._substituicoes)
+            substituicoes.pop(tipo_acao, None)
+            self._substituicoes = MappingProxyType(substituicoes)
+            self._tabela = compilar_tabela(self._tabela.versao, self._substituicoes)
+
+    @property
+    def estrategias(self):
+        """Estratégias de cálculo por tipo de ação."""
+        return self.tabela.estrategias
+
+    @property
+    def strategies(self):
+        """Estratégias de cálculo por tipo de ação (compatibilidade)."""
+        return self.estrategias
  
     def registrar_tokens(self, usuario, acao):
         """Calcula e atribui tokens ao usuário baseado na ação."""
@@ -41,6 +87,71 @@ class TokenService:
  
         return tokens
  
+    def calcular_tokens_em_lote(self, tipos, quantidades=None):
+        """
+        Calcula os tokens de vários tipos de ação em uma única passada vetorizada.
+
+        `tipos` pode ter nomes de tipo de ação ou ids de ActionType. Nomes são
+        localizados com np.searchsorted no vetor ordenado dos tipos da tabela;
+        ids indexam direto um vetor denso id → tokens. Tipos sem estratégia
+        valem 0, como em `registrar_tokens`. Se `quantidades` for informado, os
+        tokens de cada ação são multiplicados por ele.
+        Retorna um array de inteiros do mesmo tamanho de `tipos`.
+        """
+        import numpy as np
+
+        tipos = np.asarray(tipos)
+        nomes, valores, por_id = self._tabela_vetorizada()
+        if tipos.size == 0:
+            tokens = np.zeros(tipos.shape, dtype=np.int64)
+        elif tipos.dtype.kind in 'iu':
+            # Último elemento de `por_id` é o 0 dos ids desconhecidos
+            dentro = (tipos >= 0) & (tipos < len(por_id) - 1)
+            tokens = por_id.take(np.where(dentro, tipos, len(por_id) - 1))
+        else:
+            posicoes = np.searchsorted(nomes, tipos).clip(max=len(nomes) - 1)
+            tokens = np.where(nomes.take(posicoes) == tipos, valores.take(posicoes), 0)
+
+        if quantidades is not None:
+            tokens = tokens * np.asarray(quantidades, dtype=np.int64)
+        return tokens
+
+    def _tabela_vetorizada(self):
+        """
+        Vetores da tabela atual: (nomes ordenados, tokens de cada nome, tokens
+        por id de ActionType com um 0 final), refeitos só quando a tabela muda.
+        """
+        import numpy as np
+
+        tabela = self.tabela
+        vetores = self._vetores
+        if vetores is None or vetores[0] is not tabela:
+            nomes = sorted(tabela.estrategias) or ['']
+            tokens = {
+                tipo: estrategia.calcular_tokens(SimpleNamespace(tipoAcao=tipo))
+                for tipo, estrategia in tabela.estrategias.items()
+            }
+            por_id = np.zeros(max(tabela.tipos_por_id, default=-1) + 2, dtype=np.int64)
+            for action_type_id, tipo in tabela.tipos_por_id.items():
+                if action_type_id >= 0:
+                    por_id[action_type_id] = tokens.get(tipo, 0)
+            vetores = (
+                tabela,
+                np.array(nomes),
+                np.array([tokens.get(tipo, 0) for tipo in nomes], dtype=np.int64),
+                por_id,
+            )
+            self._vetores = vetores
+        return vetores[1:]
+
+    def obter_pontos_por_tipo_id(self, action_type_id):
+        """Retorna os pontos de um ActionType pelo id, sem consultar o banco (None se não houver)."""
+        tabela = self.tabela
+        tipo = tabela.tipos_por_id.get(action_type_id)
+        if tipo is None:
+            return None
+        return tabela.estrategias[tipo].pontos
+
     def obter_estrategia(self, tipo_acao):
         """Retorna a estratégia de cálculo para um tipo de ação."""
         return self.estrategias.get(tipo_acao)
@@ -2,7 +2,16 @@ from abc import ABC, abstractmethod
 
 
 class TokenStrategy(ABC):
-    """Classe base para estratégias de cálculo de tokens."""
+    """
+    Classe base para estratégias de cálculo de tokens.
+    Os pontos vêm de ActionType.base_points; `pontos_padrao` é usado quando o
+    tipo de ação não está cadastrado no banco.
+    """
+
+    pontos_padrao = 0
+
+    def __init__(self, pontos=None):
+        self.pontos = self.pontos_padrao if pontos is None else pontos
 
     @abstractmethod
     def calcular_tokens(self, acao):
@@ -13,33 +22,43 @@ class TokenStrategy(ABC):
 class ReciclagemStrategy(TokenStrategy):
     """Estratégia para ações de reciclagem."""
 
+    pontos_padrao = 10
+
     def calcular_tokens(self, acao):
-        return 10
+        return self.pontos
 
 
 class TransporteStrategy(TokenStrategy):
     """Estratégia para transporte sustentável."""
 
+    pontos_padrao = 15
+
     def calcular_tokens(self, acao):
-        return 15
+        return self.pontos
 
 
 class EconomiaRecursosStrategy(TokenStrategy):
     """Estratégia para economia de recursos."""
 
+    pontos_padrao = 20
+
     def calcular_tokens(self, acao):
-        return 20
+        return self.pontos
 
 
 class DescarteCorretoStrategy(TokenStrategy):
     """Estratégia para descarte correto."""
 
+    pontos_padrao = 15
+
     def calcular_tokens(self, acao):
-        return 15
+        return self.pontos
 
 
 class PlantioArvoreStrategy(TokenStrategy):
     """Estratégia para plantio de árvores."""
 
+    pontos_padrao = 25
+
     def calcular_tokens(self, acao):
-        return 25
+        return self.pontos
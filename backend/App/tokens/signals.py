@@ -0,0 +1,123 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from App.fila import FilaAgregada
+
+from .servicos.ranking import obter_ranking
+from .servicos.ranking_grupos import RankingGrupos
+from .servicos.ranking_periodo import RankingPeriodo
+from .servicos.tabela_estrategias import invalidar_tabela
+
+# Enviado a cada lançamento no TokenLedger, inclusive os feitos em lote
+# (bulk_create não dispara post_save). Argumento: transacoes (lista).
+lancamentos_registrados = Signal()
+
+
+@receiver(post_save, sender='actions.ActionType')
+@receiver(post_delete, sender='actions.ActionType')
+def invalidar_tabela_estrategias(sender, **kwargs):
+    """Alterações em ActionType invalidam a tabela de estratégias do TokenService."""
+    invalidar_tabela()
+
+
+@receiver(lancamentos_registrados)
+def atualizar_ranking(sender, transacoes, **kwargs):
+    """Leva ao ranking em memória o saldo final de cada usuário, depois do commit."""
+    saldos = {transacao.user_id: transacao.balance_after for transacao in transacoes}
+    transaction.on_commit(lambda: obter_ranking().aplicar(saldos))
+
+
+def _somar_grupos(_, lotes):
+    total = defaultdict(int)
+    for deltas in lotes:
+        for user_id, delta in deltas.items():
+            total[user_id] += delta
+    RankingGrupos().aplicar_deltas(total)
+
+
+def _somar_consolidados(_, lotes):
+    RankingPeriodo().registrar([transacao for transacoes in lotes for transacao in transacoes])
+
+
+# Lançamentos concorrentes somam nos grupos e nos consolidados em lote, numa
+# escrita só, pela thread da fila
+_grupos = FilaAgregada(_somar_grupos)
+_consolidados = FilaAgregada(_somar_consolidados)
+
+
+@receiver(lancamentos_registrados)
+def atualizar_ranking_grupos(sender, transacoes, **kwargs):
+    """
+    Soma os lançamentos às escolas e cidades depois do commit, fora da
+    transação do lançamento: a linha de uma escola é disputada por todos os
+    seus alunos e não deve ficar travada enquanto o lançamento termina.
+    Se o processo cair antes da soma, reconstruir_ranking_grupos corrige os
+    totais.
+    """
+    deltas = RankingGrupos.deltas_dos_lancamentos(transacoes)
+    if deltas:
+        transaction.on_commit(lambda: _grupos.adicionar(None, deltas))
+
+
+@receiver(lancamentos_registrados)
+def atualizar_consolidados(sender, transacoes, **kwargs):
+    """
+    Soma os créditos aos consolidados por hora e por dia depois do commit,
+    fora da transação do lançamento. Se o processo cair antes da soma,
+    reconstruir_consolidados_ledger refaz os consolidados.
+    """
+    if any(RankingPeriodo.contabiliza(transacao) for transacao in transacoes):
+        transaction.on_commit(lambda: _consolidados.adicionar(None, transacoes))
+
+
+# Campos do usuário que definem a contribuição dele para os grupos
+CAMPOS_GRUPOS = ('school', 'city', 'total_points')
+
+
+def _dados_grupos(usuario):
+    return {campo: getattr(usuario, campo) for campo in CAMPOS_GRUPOS}
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def guardar_grupos_carregados(sender, instance, **kwargs):
+    """Guarda os campos dos grupos como vieram do banco (sem consulta; campos adiados ficam de fora)."""
+    if instance.pk is not None and all(campo in instance.__dict__ for campo in CAMPOS_GRUPOS):
+        instance._grupos_carregados = _dados_grupos(instance)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def guardar_grupos_anteriores(sender, instance, update_fields=None, raw=False, **kwargs):
+    """
+    Lê do banco a escola, a cidade e o saldo de antes da edição, só quando
+    algum deles mudou desde a carga do usuário (ou não se sabe).
+    """
+    instance._grupos_antes = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_GRUPOS):
+        instance._grupos_antes = False  # nada que afete os grupos
+        return
+    if getattr(instance, '_grupos_carregados', None) == _dados_grupos(instance):
+        instance._grupos_antes = False  # salvo sem mexer nos grupos
+        return
+    instance._grupos_antes = sender.objects.filter(pk=instance.pk).values(*CAMPOS_GRUPOS).first()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def atualizar_grupos_do_usuario(sender, instance, created, raw=False, **kwargs):
+    antes = getattr(instance, '_grupos_antes', None)
+    if raw or antes is False:
+        return
+    depois = _dados_grupos(instance)
+    instance._grupos_carregados = depois
+    if antes != depois:
+        RankingGrupos().mover_usuario(antes, depois)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def remover_usuario_dos_grupos(sender, instance, **kwargs):
+    RankingGrupos().mover_usuario(_dados_grupos(instance), None)
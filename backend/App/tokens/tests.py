@@ -1,3 +1,746 @@
-from django.test import TestCase
+import bisect
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from App.actions.models import AcaoSustentavel, ActionType, UserAction
+from App.authentication.models import Usuario
+from App.benchmark import benchmark, relatar
+from App.fila import esvaziar_filas
+from App.rewards.models import Goal, UserGoalProgress
+from App.rewards.servicos import invalidar_indice, obter_indice
+from .models import LedgerRollup, SchoolScore, TokenLedger
+from .servicos import TokenService, TokenStrategy
+from .servicos import ColocacaoGrupo, Ranking, RankingGrupos, RankingPeriodo, tabela_estrategias
+from .servicos.ranking import ListaIndexada
+from .servicos.tabela_estrategias import invalidar_tabela
+
+User = get_user_model()
+
+
+class TokenLedgerSaldoTests(TestCase):
+    """Testes do lançamento de transações no saldo do usuário."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='maria')
+
+    def test_credito_e_debito_atualizam_saldo(self):
+        credito = TokenLedger.objects.create(
+            user=self.usuario, amount=30,
+            type=TokenLedger.TYPE_CREDIT, source=TokenLedger.SOURCE_ACTION
+        )
+        debito = TokenLedger.objects.create(
+            user=self.usuario, amount=10,
+            type=TokenLedger.TYPE_DEBIT, source=TokenLedger.SOURCE_REWARD
+        )
+
+        self.assertEqual(credito.balance_after, 30)
+        self.assertEqual(debito.balance_after, 20)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.total_points, 20)
+
+    def test_nao_sobrescreve_saldo_com_instancia_desatualizada(self):
+        copia_antiga = User.objects.get(pk=self.usuario.pk)
+        TokenLedger.objects.create(
+            user=self.usuario, amount=50,
+            type=TokenLedger.TYPE_CREDIT, source=TokenLedger.SOURCE_ACTION
+        )
+
+        lancamento = TokenLedger.objects.create(
+            user=copia_antiga, amount=5,
+            type=TokenLedger.TYPE_CREDIT, source=TokenLedger.SOURCE_BONUS
+        )
+
+        self.assertEqual(lancamento.balance_after, 55)
+        self.assertEqual(copia_antiga.total_points, 55)
+
+
+class TokenLedgerLoteTests(TestCase):
+    """Testes do lançamento de transações em lote."""
+
+    def setUp(self):
+        self.maria = User.objects.create(username='maria', total_points=100)
+        self.joao = User.objects.create(username='joao')
+
+    def test_saldos_acumulados_por_usuario(self):
+        transacoes = TokenLedger.lancar_em_lote([
+            (self.maria, 10, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, 1),
+            (self.joao.pk, 20, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, 2),
+            (self.maria, 30, TokenLedger.TYPE_DEBIT, TokenLedger.SOURCE_REWARD, 3, 'Troca'),
+            (self.maria, 5, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_BONUS, None),
+        ])
+
+        self.assertEqual([t.balance_after for t in transacoes], [110, 20, 80, 85])
+        self.assertEqual(TokenLedger.objects.count(), 4)
+        self.assertEqual(TokenLedger.objects.get(reference_id=3).description, 'Troca')
+        self.assertEqual(self.maria.total_points, 85)
+        self.joao.refresh_from_db()
+        self.assertEqual(self.joao.total_points, 20)
+
+    def test_lote_vazio(self):
+        self.assertEqual(TokenLedger.lancar_em_lote([]), [])
+
+    def test_usuario_inexistente_desfaz_lote(self):
+        with self.assertRaises(User.DoesNotExist):
+            TokenLedger.lancar_em_lote([
+                (self.maria, 10, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+                (999999, 10, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+            ])
+
+        self.maria.refresh_from_db()
+        self.assertEqual(self.maria.total_points, 100)
+        self.assertFalse(TokenLedger.objects.exists())
+
+    REPETICOES = 5
+
+    @benchmark
+    def test_benchmark_lote_contra_create(self):
+        usuarios = User.objects.bulk_create(
+            [User(username=f'aluno{i}') for i in range(50)]
+        )
+        lancamentos = [
+            (usuarios[i % len(usuarios)], 1, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, i)
+            for i in range(2000)
+        ]
+
+        # Os dois lados rodam também o que os receivers deixam para o commit
+        # (consolidados, grupos, metas): é o trabalho por linha que o lote evita
+        inicio = time.perf_counter()
+        with self.captureOnCommitCallbacks(execute=True):
+            for usuario, quantidade, tipo, origem, referencia in lancamentos:
+                TokenLedger.objects.create(
+                    user=usuario, amount=quantidade, type=tipo,
+                    source=origem, reference_id=referencia
+                )
+        tempo_create = time.perf_counter() - inicio
+
+        # Melhor de REPETICOES lotes: o lote é curto e sensível a ruído do ambiente
+        tempos_lote = []
+        for _ in range(self.REPETICOES):
+            inicio = time.perf_counter()
+            with self.captureOnCommitCallbacks(execute=True):
+                TokenLedger.lancar_em_lote(lancamentos)
+            tempos_lote.append(time.perf_counter() - inicio)
+        tempo_lote = min(tempos_lote)
+
+        self.assertEqual(
+            sum(User.objects.filter(pk__in=[u.pk for u in usuarios])
+                .values_list('total_points', flat=True)),
+            (1 + self.REPETICOES) * len(lancamentos)
+        )
+        relatar(f"[TokenLedger] create(): {tempo_create:.3f}s | lote: {tempo_lote:.3f}s "
+                f"({tempo_create / tempo_lote:.0f}x)")
+        self.assertGreater(tempo_create / tempo_lote, 20)
+
+
+class TokenLedgerConcorrenciaTests(TransactionTestCase):
+    """Teste de estresse: lançamentos concorrentes não podem perder atualizações."""
+
+    THREADS = 8
+    LANCAMENTOS_POR_THREAD = 250
+
+    # Lançamentos por segundo exigidos no benchmark, com meta global ativa.
+    # O SQLite aceita um escritor por vez, então o piso é modesto; com as
+    # somas dentro da transação do lançamento ficava abaixo de 100/s
+    PISO_POR_SEGUNDO = 300
+
+    def tearDown(self):
+        # Consolidados e metas dos lançamentos são somados por uma fila em
+        # thread própria; ela termina antes do banco ser limpo
+        esvaziar_filas()
+
+    def lancar_em_paralelo(self, usuario):
+        """Lança de várias threads no mesmo saldo; devolve a duração."""
+        erros = []
+
+        def lancar():
+            try:
+                copia = User.objects.get(pk=usuario.pk)
+                for _ in range(self.LANCAMENTOS_POR_THREAD):
+                    TokenLedger.objects.create(
+                        user=copia, amount=1,
+                        type=TokenLedger.TYPE_CREDIT, source=TokenLedger.SOURCE_ACTION
+                    )
+            except Exception as erro:
+                erros.append(erro)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=lancar) for _ in range(self.THREADS)]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+        self.assertEqual(erros, [])
+        return duracao
+
+    def test_lancamentos_concorrentes_sem_perda(self):
+        usuario = User.objects.create(username='joao')
+        self.lancar_em_paralelo(usuario)
+
+        total = self.THREADS * self.LANCAMENTOS_POR_THREAD
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.total_points, total)
+
+        # Cada lançamento viu um saldo distinto: 1, 2, ..., total
+        saldos = sorted(TokenLedger.objects.values_list('balance_after', flat=True))
+        self.assertEqual(saldos, list(range(1, total + 1)))
+
+    @benchmark
+    def test_throughput_com_consolidados_e_metas(self):
+        # Com meta global ativa, cada lançamento também soma nos consolidados
+        # e no progresso, mas depois do commit, fora da trava do saldo
+        Goal.objects.create(name='Benchmark', target_value=10 ** 9, metric=Goal.METRIC_POINTS,
+                            period=Goal.PERIOD_MONTHLY)
+        invalidar_indice()
+        usuario = User.objects.create(username='bia')
+        duracao = self.lancar_em_paralelo(usuario)
+        esvaziar_filas()
+        invalidar_indice()
+
+        total = self.THREADS * self.LANCAMENTOS_POR_THREAD
+        relatar(f"[TokenLedger] {total} lançamentos em {duracao:.2f}s ({total / duracao:.0f}/s)")
+        self.assertGreater(total / duracao, self.PISO_POR_SEGUNDO)
+        self.assertEqual(UserGoalProgress.objects.get(user=usuario).current_value, total)
+
+
+class TokenServiceLoteTests(TestCase):
+    """Testes do cálculo vetorizado de tokens."""
+
+    def setUp(self):
+        self.servico = TokenService()
+        self.tipos = self.servico.listar_tipos_disponiveis() + ['Desconhecido']
+
+    def calcular_por_acao(self, tipos):
+        usuario = Usuario("Lote")
+        return [self.servico.registrar_tokens(usuario, AcaoSustentavel(tipo)) for tipo in tipos]
+
+    def test_resultado_igual_as_estrategias(self):
+        tipos = self.tipos * 3
+
+        tokens = self.servico.calcular_tokens_em_lote(tipos)
+
+        self.assertEqual(tokens.tolist(), self.calcular_por_acao(tipos))
+
+    def test_quantidades_multiplicam_tokens(self):
+        tokens = self.servico.calcular_tokens_em_lote(
+            ['Reciclagem', 'PlantioArvore', 'Desconhecido'], quantidades=[3, 2, 5]
+        )
+
+        self.assertEqual(tokens.tolist(), [30, 50, 0])
+
+    @benchmark
+    def test_benchmark_lote_contra_estrategia_por_acao(self):
+        tipos = [self.tipos[i % len(self.tipos)] for i in range(200000)]
+        self.servico.calcular_tokens_em_lote(self.tipos)  # aquece (import do NumPy)
+
+        inicio = time.perf_counter()
+        esperado = self.calcular_por_acao(tipos)
+        tempo_por_acao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        tokens = self.servico.calcular_tokens_em_lote(tipos)
+        tempo_lote = time.perf_counter() - inicio
+
+        self.assertEqual(tokens.tolist(), esperado)
+        relatar(f"[TokenService] por ação: {tempo_por_acao:.3f}s | lote: {tempo_lote:.3f}s "
+                f"({tempo_por_acao / tempo_lote:.0f}x)")
+        # Cerca de 8x neste ambiente, a maior parte gasta convertendo a lista de nomes
+        self.assertGreater(tempo_por_acao / tempo_lote, 3)
+
+
+class TabelaEstrategiasTests(TestCase):
+    """Testes da tabela de estratégias carregada de ActionType."""
+
+    def setUp(self):
+        self.servico = TokenService()
+        self.usuario = Usuario("Tabela")
+
+    def tearDown(self):
+        invalidar_tabela()  # o rollback do teste não dispara sinais
+
+    def test_pontos_vem_do_action_type(self):
+        ActionType.objects.create(name=ActionType.RECICLAGEM, base_points=40)
+
+        self.assertEqual(self.servico.registrar_tokens(self.usuario, AcaoSustentavel("Reciclagem")), 40)
+        self.assertEqual(self.servico.registrar_tokens(self.usuario, AcaoSustentavel("Transporte")), 15)
+
+    def test_edicao_e_exclusao_invalidam_tabela(self):
+        tipo = ActionType.objects.create(name=ActionType.PLANTIO_ARVORE, base_points=30)
+        self.assertEqual(self.servico.obter_estrategia("PlantioArvore").pontos, 30)
+
+        tipo.base_points = 50
+        tipo.save()
+        self.assertEqual(self.servico.obter_estrategia("PlantioArvore").pontos, 50)
+
+        tipo.delete()
+        self.assertEqual(self.servico.obter_estrategia("PlantioArvore").pontos, 25)
+
+    def test_lote_por_id_de_action_type(self):
+        reciclagem = ActionType.objects.create(name=ActionType.RECICLAGEM, base_points=40)
+        transporte = ActionType.objects.create(name=ActionType.TRANSPORTE, base_points=18)
+
+        tokens = self.servico.calcular_tokens_em_lote(
+            [transporte.pk, reciclagem.pk, transporte.pk + 100, -1], quantidades=[2, 1, 1, 1]
+        )
+
+        self.assertEqual(tokens.tolist(), [36, 40, 0, 0])
+        self.assertEqual(self.servico.calcular_tokens_em_lote(['Reciclagem', 'Transporte']).tolist(), [40, 18])
+
+    def test_calculo_sem_consultas_ao_banco(self):
+        ActionType.objects.create(name=ActionType.TRANSPORTE, base_points=18)
+        self.servico.registrar_tokens(self.usuario, AcaoSustentavel("Transporte"))
+
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                self.servico.registrar_tokens(self.usuario, AcaoSustentavel("Transporte"))
+
+    def test_versao_compartilhada_recarrega_tabela(self):
+        self.servico.registrar_tokens(self.usuario, AcaoSustentavel("Reciclagem"))
+        # Edição feita por outro worker: só o contador de versão muda
+        ActionType.objects.bulk_create([ActionType(name=ActionType.RECICLAGEM, base_points=12)])
+        self.assertEqual(self.servico.obter_estrategia("Reciclagem").pontos, 10)
+
+        cache.incr(tabela_estrategias.CHAVE_VERSAO)
+        self.assertEqual(self.servico.obter_estrategia("Reciclagem").pontos, 10)
+
+        depois_do_intervalo = time.monotonic() + tabela_estrategias.INTERVALO_VERIFICACAO
+        with mock.patch('App.versao.retrato.time.monotonic', return_value=depois_do_intervalo):
+            self.assertEqual(self.servico.obter_estrategia("Reciclagem").pontos, 12)
+
+    def test_aprovar_usa_tabela_em_memoria(self):
+        tipo = ActionType.objects.create(name=ActionType.DESCARTE_CORRETO, base_points=22)
+        aprovador = User.objects.create(username='moderador')
+        acao = UserAction.objects.create(user=aprovador, action_type=tipo)
+        acao = UserAction.objects.get(pk=acao.pk)
+        self.servico.tabela  # carrega a tabela uma vez por processo
+        obter_indice()  # e o índice de metas
+
+        # UPDATE da ação e o crédito (UPDATE + SELECT do saldo, INSERT no
+        # TokenLedger), mais 4 de savepoint; nenhuma consulta a ActionType.
+        # Consolidados e metas ficam para depois do commit
+        with self.assertNumQueries(8):
+            acao.aprovar(aprovador)
+        self.assertEqual(acao.points_awarded, 22)
+
+
+class ValorFixoStrategy(TokenStrategy):
+    """Estratégia de teste com valor fixo."""
+
+    def calcular_tokens(self, acao):
+        return self.pontos
+
+
+class TokenServiceConcorrenciaTests(TestCase):
+    """Testes do singleton e da troca de estratégias sob várias threads."""
+
+    THREADS = 16
+
+    def tearDown(self):
+        TokenService().restaurar_estrategia("Reciclagem")
+
+    def test_singleton_unico_entre_threads(self):
+        instancia_original = TokenService._instance
+        TokenService._instance = None
+        barreira = threading.Barrier(self.THREADS)
+        instancias = []
+
+        def criar():
+            barreira.wait()
+            instancias.append(TokenService())
+            connection.close()
+
+        try:
+            threads = [threading.Thread(target=criar) for _ in range(self.THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(instancias), self.THREADS)
+            self.assertEqual(len({id(instancia) for instancia in instancias}), 1)
+            self.assertEqual(len(instancias[0].estrategias), 5)
+        finally:
+            TokenService._instance = instancia_original
+
+    def test_registrar_tokens_durante_trocas_de_estrategia(self):
+        servico = TokenService()
+        servico.tabela  # carrega a tabela antes das threads
+        valores_validos = {10, 100, 200}
+        parar = threading.Event()
+        erros = []
+        resultados = []
+
+        def calcular():
+            usuario = Usuario("Thread")
+            vistos = set()
+            try:
+                for _ in range(2000):
+                    vistos.add(servico.registrar_tokens(usuario, AcaoSustentavel("Reciclagem")))
+            except Exception as erro:
+                erros.append(erro)
+            resultados.append(vistos)
+
+        def trocar():
+            while not parar.is_set():
+                servico.trocar_estrategia("Reciclagem", ValorFixoStrategy(100))
+                servico.trocar_estrategia("Reciclagem", ValorFixoStrategy(200))
+
+        trocador = threading.Thread(target=trocar)
+        trocador.start()
+        threads = [threading.Thread(target=calcular) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        parar.set()
+        trocador.join()
+
+        self.assertEqual(erros, [])
+        self.assertEqual(len(resultados), self.THREADS)
+        for vistos in resultados:
+            self.assertTrue(vistos <= valores_validos, vistos)
+
+        servico.restaurar_estrategia("Reciclagem")
+        self.assertEqual(servico.obter_estrategia("Reciclagem").pontos, 10)
+
+
+class ListaIndexadaTests(TestCase):
+    """A skip list indexada se comporta como uma lista ordenada."""
+
+    def test_operacoes_aleatorias_contra_lista_ordenada(self):
+        gerador = random.Random(7)
+        lista, referencia = ListaIndexada(), []
+        for _ in range(3000):
+            if referencia and gerador.random() < 0.4:
+                chave = referencia.pop(gerador.randrange(len(referencia)))
+                lista.remover(chave)
+            else:
+                chave = (gerador.randrange(100), gerador.randrange(10 ** 6))
+                lista.inserir(chave)
+                bisect.insort(referencia, chave)
+
+        self.assertEqual(len(lista), len(referencia))
+        self.assertEqual(list(lista.a_partir(0)), referencia)
+        for indice in (0, 1, len(referencia) // 2, len(referencia) - 1, len(referencia)):
+            self.assertEqual(list(lista.a_partir(indice)), referencia[indice:])
+        for valor in range(0, 101, 5):
+            self.assertEqual(lista.contar_menores((valor,)), bisect.bisect_left(referencia, (valor,)))
+        with self.assertRaises(KeyError):
+            lista.remover((-1, -1))
+
+
+class RankingTests(TestCase):
+    """Ranking em memória, sincronizado pelo TokenLedger, com consulta ao banco enquanto carrega."""
+
+    def setUp(self):
+        pontos = [50, 80, 80, 20, 0, 80, 50]
+        self.usuarios = User.objects.bulk_create(
+            [User(username=f'rk{i}', total_points=p) for i, p in enumerate(pontos)]
+        )
+        self.ids = [usuario.pk for usuario in self.usuarios]
+        self.ranking = Ranking(carga_automatica=False)
+
+    def esperado_top(self):
+        u = self.ids
+        return [(1, u[1], 80), (1, u[2], 80), (1, u[5], 80), (4, u[0], 50), (4, u[6], 50),
+                (6, u[3], 20), (7, u[4], 0)]
+
+    def test_banco_e_memoria_dao_o_mesmo_resultado(self):
+        self.assertFalse(self.ranking.pronto)
+        no_banco = (self.ranking.top(10), self.ranking.posicao(self.ids[6]), self.ranking.ao_redor(self.ids[0], 2))
+
+        self.ranking.carregar()
+        self.assertTrue(self.ranking.pronto)
+        with self.assertNumQueries(0):
+            em_memoria = (self.ranking.top(10), self.ranking.posicao(self.ids[6]),
+                          self.ranking.ao_redor(self.ids[0], 2))
+
+        self.assertEqual(no_banco, em_memoria)
+        self.assertEqual(em_memoria[0], self.esperado_top())
+        self.assertEqual(em_memoria[1], 4)
+        self.assertEqual(em_memoria[2], self.esperado_top()[1:6])
+
+    def test_lancamentos_do_processo_entram_no_commit(self):
+        self.ranking.carregar()
+        with mock.patch('App.tokens.signals.obter_ranking', return_value=self.ranking):
+            with self.captureOnCommitCallbacks(execute=True):
+                TokenLedger.lancar_em_lote([
+                    (self.usuarios[4], 100, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+                    (self.usuarios[1], 70, TokenLedger.TYPE_DEBIT, TokenLedger.SOURCE_REWARD, None),
+                ])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ranking.posicao(self.ids[4]), 1)
+            self.assertEqual(self.ranking.posicao(self.ids[1]), 7)
+
+    def test_sincroniza_lancamentos_de_outros_workers(self):
+        self.ranking.carregar()
+        # Sem executar o on_commit: só a leitura do ledger traz o lançamento
+        TokenLedger.objects.create(user=self.usuarios[3], amount=100, type=TokenLedger.TYPE_CREDIT,
+                                   source=TokenLedger.SOURCE_BONUS)
+        self.assertEqual(self.ranking.posicao(self.ids[3]), 6)
+
+        self.ranking.sincronizar(forcar=True)
+        self.assertEqual(self.ranking.top(1), [(1, self.ids[3], 120)])
+        with self.assertNumQueries(1):
+            self.ranking.sincronizar(forcar=True)
+
+    def test_lancamento_que_commita_fora_de_ordem_entra_na_sobreposicao(self):
+        self.ranking.carregar()
+        self.ranking.sincronizar(forcar=True)
+        # Lançamento com data anterior à última sincronia (transação mais lenta que commitou depois)
+        atrasado = TokenLedger.objects.create(user=self.usuarios[4], amount=200, type=TokenLedger.TYPE_CREDIT,
+                                              source=TokenLedger.SOURCE_BONUS)
+        TokenLedger.objects.filter(pk=atrasado.pk).update(date=timezone.now() - timedelta(seconds=10))
+
+        self.ranking.sincronizar(forcar=True)
+
+        self.assertEqual(self.ranking.top(1), [(1, self.ids[4], 200)])
+
+    def test_recarga_periodica_traz_saldos_alterados_fora_do_ledger(self):
+        self.ranking.carregar()
+        User.objects.filter(pk=self.ids[3]).update(total_points=500)
+        self.ranking.sincronizar(forcar=True)
+        self.assertEqual(self.ranking.posicao(self.ids[3]), 6)
+
+        ranking = Ranking()
+        ranking.carregar()
+        ranking._proxima_recarga = 0.0  # venceu o INTERVALO_RECARGA
+        with mock.patch.object(ranking, 'iniciar_carga', side_effect=ranking.carregar) as recarga:
+            self.assertEqual(ranking.posicao(self.ids[3]), 1)
+        recarga.assert_called_once()
+
+    def test_usuario_sem_pontos_fora_do_placar(self):
+        self.ranking.carregar()
+        novo = User.objects.create(username='novo')
+        self.assertEqual(self.ranking.posicao(novo.pk), 7)
+
+    @benchmark
+    def test_benchmark_posicao_memoria_contra_banco(self):
+        gerador = random.Random(3)
+        User.objects.bulk_create(
+            [User(username=f'bm{i}', total_points=gerador.randrange(5000)) for i in range(20000)],
+            batch_size=2000,
+        )
+        ids = list(User.objects.values_list('pk', flat=True))
+        consultas = [gerador.choice(ids) for _ in range(500)]
+
+        inicio = time.perf_counter()
+        no_banco = [self.ranking.posicao(user_id) for user_id in consultas]
+        tempo_banco = time.perf_counter() - inicio
+
+        self.ranking.carregar()
+        inicio = time.perf_counter()
+        em_memoria = [self.ranking.posicao(user_id) for user_id in consultas]
+        tempo_memoria = time.perf_counter() - inicio
+
+        self.assertEqual(no_banco, em_memoria)
+        relatar(f"[Ranking] {len(consultas)} posições entre {len(ids)} usuários: "
+                f"banco {tempo_banco:.3f}s | memória {tempo_memoria:.3f}s "
+                f"({tempo_banco / tempo_memoria:.0f}x)")
+
+
+class RankingGruposTests(TestCase):
+    """Totais por escola e cidade mantidos a cada lançamento."""
+
+    def setUp(self):
+        self.grupos = RankingGrupos()
+        self.ana = User.objects.create(username='ana', school='Escola Sol', city='Recife')
+        self.bia = User.objects.create(username='bia', school=' Escola  Sol ', city='Olinda')
+        self.caio = User.objects.create(username='caio', school='Escola Lua', city='Recife')
+        self.davi = User.objects.create(username='davi')
+
+    def creditar(self, *lancamentos):
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.lancar_em_lote([
+                (usuario, quantidade, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None)
+                for usuario, quantidade in lancamentos
+            ])
+
+    def test_lancamentos_somam_nos_grupos(self):
+        self.creditar((self.ana, 30), (self.bia, 20), (self.caio, 60), (self.davi, 500))
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.objects.create(user=self.caio, amount=15, type=TokenLedger.TYPE_DEBIT,
+                                       source=TokenLedger.SOURCE_REWARD)
+
+        self.assertEqual(self.grupos.top(RankingGrupos.ESCOLA), [
+            ColocacaoGrupo(1, 'Escola Sol', 50, 2), ColocacaoGrupo(2, 'Escola Lua', 45, 1),
+        ])
+        self.assertEqual(self.grupos.top(RankingGrupos.CIDADE), [
+            ColocacaoGrupo(1, 'Recife', 75, 2), ColocacaoGrupo(2, 'Olinda', 20, 1),
+        ])
+        self.assertEqual(self.grupos.posicao(RankingGrupos.ESCOLA, 'escola lua'), None)
+        self.assertEqual(self.grupos.posicao(RankingGrupos.CIDADE, 'Olinda').posicao, 2)
+
+    def test_troca_de_escola_e_remocao_movem_os_pontos(self):
+        self.creditar((self.ana, 30), (self.caio, 10))
+        self.ana.refresh_from_db()
+
+        self.ana.school = 'Escola Lua'
+        self.ana.save()
+        self.assertEqual(SchoolScore.objects.get(name='Escola Lua').total_points, 40)
+        self.assertEqual(SchoolScore.objects.get(name='Escola Sol').members, 1)
+
+        self.caio.delete()
+        self.assertEqual(
+            list(SchoolScore.objects.values_list('name', 'total_points', 'members')),
+            [('Escola Lua', 30, 1), ('Escola Sol', 0, 1)],
+        )
+        # Só o UPDATE: campos que não afetam os grupos não geram consulta extra
+        with self.assertNumQueries(1):
+            self.ana.save(update_fields=['last_login'])
+        self.ana.first_name = 'Ana'
+        with self.assertNumQueries(1):
+            self.ana.save()
+
+    def test_grupos_somam_fora_da_transacao_do_lancamento(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            TokenLedger.objects.create(user=self.ana, amount=30, type=TokenLedger.TYPE_CREDIT,
+                                       source=TokenLedger.SOURCE_ACTION)
+            self.assertEqual(SchoolScore.objects.get(name='Escola Sol').total_points, 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(SchoolScore.objects.get(name='Escola Sol').total_points, 30)
+
+    def test_empates_e_reconstrucao(self):
+        self.creditar((self.ana, 10), (self.caio, 10))
+        esperado = self.grupos.top(RankingGrupos.ESCOLA)
+        self.assertEqual([c.posicao for c in esperado], [1, 1])
+
+        SchoolScore.objects.all().delete()
+        saida = StringIO()
+        call_command('reconstruir_ranking_grupos', stdout=saida)
+
+        self.assertIn('2 escola(s) e 2 cidade(s)', saida.getvalue())
+        self.assertEqual(self.grupos.top(RankingGrupos.ESCOLA), esperado)
+
+    def test_consultas_independem_do_numero_de_usuarios(self):
+        User.objects.bulk_create(
+            [User(username=f'g{i}', school=f'Escola {i % 40}', total_points=i) for i in range(2000)]
+        )
+        self.grupos.reconstruir()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.grupos.top(RankingGrupos.ESCOLA, 10)), 10)
+        with self.assertNumQueries(2):
+            self.grupos.posicao(RankingGrupos.ESCOLA, 'Escola 7')
+
+
+class RankingPeriodoTests(TestCase):
+    """Rankings por período a partir dos consolidados por hora e por dia."""
+
+    def setUp(self):
+        cache.clear()
+        self.periodo = RankingPeriodo()
+        self.usuarios = User.objects.bulk_create([User(username=f'p{i}') for i in range(4)])
+
+    def lancamento(self, usuario, quantidade, momento, origem=TokenLedger.SOURCE_ACTION):
+        return TokenLedger(user=usuario, amount=quantidade, type=TokenLedger.TYPE_CREDIT,
+                           source=origem, date=momento)
+
+    def test_lancamentos_alimentam_consolidados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.lancar_em_lote([
+                (self.usuarios[0], 10, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+                (self.usuarios[0], 5, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_BONUS, None),
+                (self.usuarios[1], 30, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None),
+                (self.usuarios[1], 10, TokenLedger.TYPE_DEBIT, TokenLedger.SOURCE_REWARD, None),
+                (self.usuarios[2], 50, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_REWARD, None),
+            ])
+
+        self.assertEqual(LedgerRollup.objects.count(), 4)
+        esperado = [(1, self.usuarios[1].pk, 30), (2, self.usuarios[0].pk, 15)]
+        self.assertEqual(self.periodo.ranking_semanal(), esperado)
+        self.assertEqual(self.periodo.ranking_mensal(), esperado)
+
+    def test_janelas_combinam_dias_e_horas(self):
+        base = timezone.make_aware(datetime(2026, 3, 2))
+        gerador = random.Random(11)
+        lancamentos = [
+            self.lancamento(gerador.choice(self.usuarios), gerador.randrange(1, 20),
+                            base + timedelta(minutes=gerador.randrange(0, 20 * 24 * 60)))
+            for _ in range(600)
+        ]
+        self.periodo.registrar(lancamentos)
+        self.assertLess(LedgerRollup.objects.count(), len(lancamentos) * 2)
+
+        for inicio_h, fim_h in [(0, 24 * 20), (5, 29), (30, 31), (13, 24 * 9 + 7), (24 * 3, 24 * 10)]:
+            inicio, fim = base + timedelta(hours=inicio_h), base + timedelta(hours=fim_h)
+            totais = defaultdict(int)
+            for lancamento in lancamentos:
+                if inicio <= lancamento.date < fim:
+                    totais[lancamento.user_id] += lancamento.amount
+            esperado = sorted(totais.items(), key=lambda item: (-item[1], item[0]))
+            obtido = [(c.user_id, c.pontos) for c in self.periodo.ranking(inicio, fim, quantidade=10)]
+            self.assertEqual(obtido, esperado, (inicio_h, fim_h))
+
+    def test_cache_ate_o_proximo_lancamento_da_janela(self):
+        usuario = self.usuarios[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.objects.create(user=usuario, amount=10, type=TokenLedger.TYPE_CREDIT,
+                                       source=TokenLedger.SOURCE_ACTION)
+        self.assertEqual(self.periodo.ranking_semanal()[0].pontos, 10)
+        with self.assertNumQueries(0):
+            self.periodo.ranking_semanal()
+
+        # Lançamento em outro dia fora da semana não invalida
+        antigo = timezone.now() - timedelta(days=40)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.periodo.registrar([self.lancamento(usuario, 99, antigo)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.periodo.ranking_semanal()[0].pontos, 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.objects.create(user=usuario, amount=7, type=TokenLedger.TYPE_CREDIT,
+                                       source=TokenLedger.SOURCE_ACTION)
+        self.assertEqual(self.periodo.ranking_semanal()[0].pontos, 17)
+
+    def test_versao_descartada_pelo_cache_conta_como_falta(self):
+        usuario = self.usuarios[0]
+        versao_de_hoje = RankingPeriodo.CHAVE_VERSAO.format(dia=timezone.localdate().isoformat())
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.objects.create(user=usuario, amount=10, type=TokenLedger.TYPE_CREDIT,
+                                       source=TokenLedger.SOURCE_ACTION)
+        cache.delete(versao_de_hoje)
+        self.assertEqual(self.periodo.ranking_semanal()[0].pontos, 10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.objects.create(user=usuario, amount=7, type=TokenLedger.TYPE_CREDIT,
+                                       source=TokenLedger.SOURCE_ACTION)
+        cache.delete(versao_de_hoje)
+        self.assertEqual(self.periodo.ranking_semanal()[0].pontos, 17)
+        with self.assertNumQueries(0):
+            self.periodo.ranking_semanal()
+
+    def test_reconstrucao_igual_aos_incrementos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenLedger.lancar_em_lote([
+                (usuario, i + 1, TokenLedger.TYPE_CREDIT, TokenLedger.SOURCE_ACTION, None)
+                for i, usuario in enumerate(self.usuarios * 3)
+            ])
+        incrementais = sorted(LedgerRollup.objects.values_list('granularity', 'bucket_start', 'user_id', 'points'))
+
+        saida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconstruir_consolidados_ledger', stdout=saida)
+
+        self.assertIn(f'{len(incrementais)} consolidado(s)', saida.getvalue())
+        self.assertEqual(
+            sorted(LedgerRollup.objects.values_list('granularity', 'bucket_start', 'user_id', 'points')),
+            incrementais,
+        )
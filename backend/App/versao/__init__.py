@@ -0,0 +1,8 @@
+"""Modulo de versoes compartilhadas e retratos em memoria, usado por varios apps."""
+
+from .retrato import RetratoEmMemoria, VersaoCompartilhada
+
+__all__ = [
+    'RetratoEmMemoria',
+    'VersaoCompartilhada'
+]
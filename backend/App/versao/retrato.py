@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+class VersaoCompartilhada:
+    """
+    Contador de versão guardado no cache do Django. Cada processo relê o
+    contador no máximo uma vez por `intervalo` segundos; `invalidar` faz o
+    próprio processo reler na consulta seguinte. Só é compartilhado entre
+    workers se o backend de cache for (CACHE_URL em Core/settings.py).
+    """
+
+    def __init__(self, chave: str, intervalo: float = 1.0):
+        self.chave = chave
+        self.intervalo = intervalo
+        self._ultima_versao = None
+        self._proxima_verificacao = 0.0
+
+    def obter(self):
+        """Versão atual, lida do cache (sem consulta ao banco)."""
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return self._ultima_versao
+
+        from django.core.cache import cache
+        versao = cache.get(self.chave)
+        if versao is None:
+            # Valor inicial único, para não coincidir com uma versão antiga após remoção da chave
+            cache.add(self.chave, time.time_ns(), timeout=None)
+            versao = cache.get(self.chave)
+        self._ultima_versao = versao
+        self._proxima_verificacao = agora + self.intervalo
+        return versao
+
+    def invalidar(self) -> None:
+        """Incrementa a versão para que todos os workers recarreguem seus dados."""
+        from django.core.cache import cache
+        try:
+            cache.incr(self.chave)
+        except ValueError:
+            cache.add(self.chave, time.time_ns(), timeout=None)
+        self._proxima_verificacao = 0.0
+
+
+class RetratoEmMemoria:
+    """
+    Dados somente leitura mantidos em memória do processo e recarregados por
+    `carregar(versao)` quando a versão compartilhada muda.
+
+    A leitura não usa lock: o retrato nunca é alterado, só substituído por
+    inteiro. Enquanto uma thread recarrega, as demais seguem com o anterior.
+    """
+
+    def __init__(self, chave: str, carregar, intervalo: float = 1.0):
+        self.versao = VersaoCompartilhada(chave, intervalo)
+        self._carregar = carregar
+        self._retrato = None  # (versao, dados)
+        self._lock = threading.Lock()
+
+    def obter(self):
+        retrato = self._retrato
+        versao = self.versao.obter()
+        if retrato is None:
+            with self._lock:
+                if self._retrato is None:
+                    self._retrato = (versao, self._carregar(versao))
+                return self._retrato[1]
+        if versao != retrato[0] and self._lock.acquire(blocking=False):
+            try:
+                retrato = self._retrato
+                if versao != retrato[0]:
+                    retrato = (versao, self._carregar(versao))
+                    self._retrato = retrato
+            finally:
+                self._lock.release()
+        return retrato[1]
+
+    def invalidar(self) -> None:
+        self.versao.invalidar()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 
+    'App.logs.apps.LogsConfig',
     'App.authentication.apps.AuthenticationConfig',
     'App.actions.apps.ActionsConfig',
     'App.tokens.apps.TokensConfig',
@@ -84,6 +86,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL + IMMEDIATE: escritores concorrentes esperam na fila em vez de falhar
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Banco de teste em arquivo para permitir testes com várias conexões (threads)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -135,3 +147,55 @@ AUTH_USER_MODEL = 'authentication.User'
 # Media Files (Uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Cache
+# As versões do catálogo de recompensas e da tabela de estratégias de tokens
+# ficam no cache; com vários workers ele precisa ser compartilhado (Redis, via
+# CACHE_URL=redis://...). Sem CACHE_URL, o LocMemCache vale só para o próprio
+# processo: serve a desenvolvimento e testes, com um único worker.
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Eventos estruturados (App.logs): enfileirados por quem registra e escritos
+# em JSON por uma thread separada (HandlerFila, iniciada em LogsConfig.ready).
+# taxa_padrao é a fração mantida dos eventos abaixo de WARNING.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'App.logs.FormatadorJSON'},
+    },
+    'filters': {
+        'amostragem': {
+            '()': 'App.logs.FiltroAmostragem',
+            'taxa_padrao': 1.0,
+            'taxas_por_evento': {},
+        },
+    },
+    'handlers': {
+        'eventos': {
+            '()': 'App.logs.HandlerFila',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+            'filters': ['amostragem'],
+        },
+    },
+    'loggers': {
+        'sustentabilidadeja': {
+            'handlers': ['eventos'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
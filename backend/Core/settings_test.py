@@ -0,0 +1,17 @@
+"""
+Configuração dos testes, sobre a do projeto:
+
+    python manage.py test --settings=Core.settings_test
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import LOGGING
+
+# Os testes não escrevem eventos
+LOGGING = {
+    **LOGGING,
+    'loggers': {
+        **LOGGING['loggers'],
+        'sustentabilidadeja': {**LOGGING['loggers']['sustentabilidadeja'], 'level': 'CRITICAL'},
+    },
+}
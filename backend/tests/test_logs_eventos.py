@@ -0,0 +1,167 @@
+import io
+import json
+import logging
+import logging.config
+import threading
+import time
+import unittest
+
+from backend.App.logs.eventos import (
+    NOME_RAIZ, FiltroAmostragem, FormatadorJSON, HandlerFila, iniciar_logs, obter_logger, parar_logs,
+    registrar_evento
+)
+
+
+class SaidaLenta(io.StringIO):
+    """Stream que simula uma escrita lenta e guarda as threads que escreveram."""
+
+    def __init__(self, atraso: float = 0.0):
+        super().__init__()
+        self.atraso = atraso
+        self.threads = set()
+
+    def write(self, texto):
+        time.sleep(self.atraso)
+        self.threads.add(threading.get_ident())
+        return super().write(texto)
+
+
+class ContaFormatacoes:
+    """Argumento de mensagem que conta quantas vezes foi convertido em texto."""
+
+    def __init__(self):
+        self.vezes = 0
+
+    def __str__(self):
+        self.vezes += 1
+        return "valor"
+
+
+class TestLogsEventos(unittest.TestCase):
+    """Testes dos eventos estruturados emitidos pelo HandlerFila (fila + thread de escrita)."""
+
+    def setUp(self):
+        self.logger = obter_logger("testes")
+
+    def tearDown(self):
+        logging.config.dictConfig({"version": 1, "disable_existing_loggers": False})
+
+    def configurar(self, saida, nivel="INFO", taxas_por_evento=None, capacidade=10000, iniciar=True):
+        """Aplica um LOGGING como o de Core/settings.py, escrevendo em `saida`."""
+        logging.config.dictConfig({
+            "version": 1,
+            "disable_existing_loggers": False,
+            "formatters": {"json": {"()": FormatadorJSON}},
+            "filters": {
+                "amostragem": {"()": FiltroAmostragem, "taxas_por_evento": taxas_por_evento or {}},
+            },
+            "handlers": {
+                "eventos": {
+                    "()": HandlerFila, "stream": saida, "capacidade": capacidade,
+                    "formatter": "json", "filters": ["amostragem"],
+                },
+            },
+            "loggers": {NOME_RAIZ: {"handlers": ["eventos"], "level": nivel, "propagate": False}},
+        })
+        if iniciar:
+            iniciar_logs()
+        return logging.getLogger(NOME_RAIZ).handlers[0]
+
+    @staticmethod
+    def eventos(saida):
+        return [json.loads(linha) for linha in saida.getvalue().splitlines()]
+
+    def test_evento_formatado_em_json(self):
+        """O evento sai como uma linha JSON com nome do evento e campos extras."""
+        saida = io.StringIO()
+        self.configurar(saida)
+        registrar_evento(self.logger, "acao.registrada", "Ação de %s registrada", "ana", usuario="ana", tokens=10)
+        parar_logs()
+
+        dados = self.eventos(saida)[0]
+        self.assertEqual(dados["evento"], "acao.registrada")
+        self.assertEqual(dados["mensagem"], "Ação de ana registrada")
+        self.assertEqual(dados["nivel"], "INFO")
+        self.assertEqual(dados["logger"], "sustentabilidadeja.testes")
+        self.assertEqual(dados["usuario"], "ana")
+        self.assertEqual(dados["tokens"], 10)
+
+    def test_nivel_desligado_nao_emite_nem_formata(self):
+        """Eventos abaixo do nível são descartados antes da fila, sem montar a mensagem."""
+        saida = io.StringIO()
+        self.configurar(saida)
+        argumento = ContaFormatacoes()
+        registrar_evento(self.logger, "proxy.lazy_loading", "debug %s", argumento, nivel=logging.DEBUG)
+        registrar_evento(self.logger, "acao.registrada", "info")
+        parar_logs()
+
+        self.assertEqual([dados["evento"] for dados in self.eventos(saida)], ["acao.registrada"])
+        self.assertEqual(argumento.vezes, 0)
+
+    def test_amostragem_por_evento(self):
+        """A taxa por evento descarta eventos frequentes, mas mantém avisos."""
+        saida = io.StringIO()
+        self.configurar(saida, taxas_por_evento={"acao.duplicada": 0.0})
+        for _ in range(10):
+            registrar_evento(self.logger, "acao.duplicada", "duplicada")
+        registrar_evento(self.logger, "acao.duplicada", "aviso", nivel=logging.WARNING)
+        registrar_evento(self.logger, "acao.registrada", "registrada")
+        parar_logs()
+
+        self.assertEqual([dados["mensagem"] for dados in self.eventos(saida)], ["aviso", "registrada"])
+
+    def test_filtro_amostragem_usa_taxa(self):
+        """Com taxa 0.5, só passam os eventos cujo sorteio fica abaixo dela."""
+        sorteios = iter([0.1, 0.9, 0.4, 0.6])
+        filtro = FiltroAmostragem(0.5, aleatorio=lambda: next(sorteios))
+        registro = logging.makeLogRecord({"levelno": logging.INFO, "evento": "x"})
+
+        self.assertEqual([filtro.filter(registro) for _ in range(4)], [True, False, True, False])
+
+    def test_escrita_nao_bloqueia_quem_registra(self):
+        """Uma escrita lenta roda na thread do listener, não na de quem registra."""
+        saida = SaidaLenta(atraso=0.01)
+        self.configurar(saida)
+
+        inicio = time.perf_counter()
+        for i in range(50):
+            registrar_evento(self.logger, "acao.registrada", "evento %s", i)
+        duracao = time.perf_counter() - inicio
+        parar_logs()
+
+        self.assertLess(duracao, 0.25)
+        self.assertEqual(len(self.eventos(saida)), 50)
+        self.assertNotIn(threading.get_ident(), saida.threads)
+
+    def test_fila_cheia_descarta_eventos(self):
+        """Com a fila cheia, os eventos novos são descartados sem bloquear quem registra."""
+        saida = io.StringIO()
+        handler = self.configurar(saida, capacidade=5, iniciar=False)
+
+        for i in range(8):
+            registrar_evento(self.logger, "acao.registrada", "evento %s", i)
+        self.assertEqual(handler.descartados, 3)
+        iniciar_logs()
+        parar_logs()
+
+        self.assertEqual([dados["mensagem"] for dados in self.eventos(saida)],
+                         [f"evento {i}" for i in range(5)])
+
+    def test_handler_fila_so_cria_a_thread_em_iniciar_logs(self):
+        """Configurado pelo LOGGING, o HandlerFila só cria a thread em iniciar_logs."""
+        saida = io.StringIO()
+        handler = self.configurar(saida, iniciar=False)
+        self.assertIsInstance(handler, HandlerFila)
+        threads = threading.active_count()
+
+        registrar_evento(self.logger, "acao.registrada", "Ação registrada", tokens=10)
+        self.assertEqual(threading.active_count(), threads)
+        iniciar_logs()
+        handler.close()
+
+        dados = self.eventos(saida)[0]
+        self.assertEqual((dados["evento"], dados["tokens"]), ("acao.registrada", 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
+import random
+import time
 import unittest
+from backend.App.benchmark import benchmark, relatar
 from backend.App.consumo.servicos.consumo_template import ConsumoAgua, ConsumoEnergia
 
 class TestTemplateMethod(unittest.TestCase):
@@ -56,5 +59,68 @@ class TestTemplateMethod(unittest.TestCase):
         self.assertEqual(resultado["tokens_atribuidos"], 500)
         self.assertEqual(resultado["consumo_atual"], 250.0)
 
+
+class TestAnaliseLote(unittest.TestCase):
+    """Testes da análise de consumo em lote (vetorizada)."""
+
+    def analisar_um_a_um(self, analisador, consumos, medias):
+        resultados = []
+        for consumo, media in zip(consumos, medias):
+            analisador._media = media
+            resultados.append(analisador.analisar_consumo({"consumo_agua_litros": consumo}))
+        analisador._media = None
+        return resultados
+
+    def test_lote_igual_a_analise_individual(self):
+        analisador = ConsumoAgua("lote@exemplo.com")
+        consumos = [18000.0, 13000.0, 16500.0, 16501.0, 15000.0, 0.0, 14999.95]
+        medias = [15000.0, 15000.0, 15000.0, 15000.0, 15000.0, 15000.0, 12000.0]
+
+        lote = analisador.analisar_lote(consumos, medias)
+        individuais = self.analisar_um_a_um(analisador, consumos, medias)
+
+        self.assertEqual(lote.alerta.tolist(), [r["alerta_necessario"] for r in individuais])
+        self.assertEqual(lote.tokens.tolist(), [r["tokens_atribuidos"] for r in individuais])
+        self.assertEqual(lote.mensagens(), [r["mensagem_feedback"] for r in individuais])
+        self.assertEqual(lote.economia.tolist(), [max(m - c, 0.0) for c, m in zip(consumos, medias)])
+
+    def test_media_padrao_e_limites_por_usuario(self):
+        analisador = ConsumoEnergia("lote@exemplo.com")
+
+        padrao = analisador.analisar_lote([310.0, 320.0])
+        por_usuario = analisador.analisar_lote([310.0, 320.0], limites=[1.0, 1.1])
+
+        self.assertEqual(padrao.media.tolist(), [300.0, 300.0])
+        self.assertEqual(padrao.alerta.tolist(), [False, True])
+        self.assertEqual(por_usuario.alerta.tolist(), [True, False])
+
+    def test_mensagens_so_dos_indices_pedidos(self):
+        lote = ConsumoEnergia("lote@exemplo.com").analisar_lote([250.0, 320.0, 280.0])
+
+        alertas = lote.alerta.nonzero()[0]
+        self.assertEqual(len(lote.mensagens(alertas)), 1)
+        self.assertIn("ALERTA!", lote.mensagem(1))
+
+    @benchmark
+    def test_benchmark_lote_contra_analise_individual(self):
+        gerador = random.Random(7)
+        consumos = [gerador.uniform(5000.0, 25000.0) for _ in range(100000)]
+        medias = [gerador.uniform(10000.0, 20000.0) for _ in range(100000)]
+        analisador = ConsumoAgua("lote@exemplo.com")
+        analisador.analisar_lote(consumos[:10], medias[:10])  # aquece (import do NumPy)
+
+        inicio = time.perf_counter()
+        individuais = self.analisar_um_a_um(analisador, consumos, medias)
+        tempo_individual = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        lote = analisador.analisar_lote(consumos, medias)
+        tempo_lote = time.perf_counter() - inicio
+
+        self.assertEqual(lote.tokens.tolist(), [r["tokens_atribuidos"] for r in individuais])
+        relatar(f"[ConsumoTemplate] individual: {tempo_individual:.3f}s | lote: {tempo_lote:.3f}s "
+                f"({tempo_individual / tempo_lote:.0f}x)")
+
+
 if __name__ == '__main__':
     unittest.main()